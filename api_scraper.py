@@ -6,17 +6,23 @@
 # =======================================================================================
 
 import asyncio
+import logging
 import aiohttp
 import ssl
 import certifi
 import json
+import yarl
 import os
+import time
 from datetime import datetime, timedelta
 from urllib.parse import urlencode
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from pytz import timezone
 
 from utils import setup_logging, LOCAL_TIMEZONE
+from metrics_cache import MetricsCache, IntradayAccumulator, SUMMATION_ENDPOINT, DETAILED_ENDPOINT
+from store_metrics import StoreMetrics
+import codec
 
 app_logger = setup_logging()
 
@@ -33,18 +39,175 @@ DEFAULT_HEADERS = {
     'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
 }
 
+# Headers for top-level page navigation (used by the HTTP context switch)
+NAVIGATION_HEADERS = {
+    'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'accept-language': 'en-GB,en;q=0.9',
+    'upgrade-insecure-requests': '1',
+    'user-agent': DEFAULT_HEADERS['user-agent'],
+}
+
+DASHBOARD_URL_TEMPLATE = "https://sellercentral.amazon.co.uk/snowdash?ref_=mp_home_logo_xx&cor=mmp_EU&mons_sel_dir_mcid={merchant_id}&mons_sel_mkid={marketplace_id}"
+
+# Redirect targets that mean the session is no longer authenticated
+LOGIN_URL_MARKERS = ('/ap/signin', '/ap/mfa', '/ap/cvf')
+
+API_REQUEST_TIMEOUT = 15  # seconds per snowdash API call
+INTRADAY_SETTLE_MINUTES = 15  # an hour is only accumulated once it ended this long ago
+
+# Store-context fetches return (True, StoreMetrics) or (False, {'error': ...})
+RangeResult = Tuple[bool, Union[StoreMetrics, Dict]]
+
+
+class SellerCentralClient:
+    """Run-scoped keep-alive HTTP client for the snowdash APIs.
+
+    A single pooled aiohttp session is shared for the whole run so each store
+    visit reuses an open TLS connection to sellercentral instead of paying a
+    fresh handshake. The session uses a DummyCookieJar and cookies are sent per
+    request, because every worker's browser context holds its own store context
+    and refreshes its cookies after each navigation.
+
+    Connection counters are collected through an aiohttp TraceConfig and are
+    available from ``connection_stats()``. Observers added with ``add_observer()``
+    are called as ``observer(latency, status, error)`` after every API request,
+    which is how the AIMD concurrency controller sees latency and throttling.
+    """
+
+    def __init__(self, limit: int = 100, keepalive_timeout: float = 60.0):
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.stats = {'requests': 0, 'connections_created': 0, 'connections_reused': 0}
+        self.observers: List[Callable] = []
+
+    def add_observer(self, observer: Callable):
+        """Register ``observer(latency, status, error)`` for every API request."""
+        self.observers.append(observer)
+
+    def _notify(self, started: float, status: Optional[int] = None, error: Optional[str] = None):
+        latency = time.monotonic() - started
+        for observer in self.observers:
+            observer(latency, status, error)
+
+    async def _on_request_start(self, session, trace_config_ctx, params):
+        self.stats['requests'] += 1
+
+    async def _on_connection_create_end(self, session, trace_config_ctx, params):
+        self.stats['connections_created'] += 1
+
+    async def _on_connection_reuseconn(self, session, trace_config_ctx, params):
+        self.stats['connections_reused'] += 1
+
+    async def start(self):
+        """Create the pooled session (no-op if already open)."""
+        if self.session and not self.session.closed:
+            return
+        ssl_context = ssl.create_default_context(cafile=certifi.where())
+        connector = aiohttp.TCPConnector(ssl=ssl_context, limit=self.limit,
+                                         keepalive_timeout=self.keepalive_timeout)
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            trace_configs=[trace_config],
+        )
+
+    async def close(self):
+        """Close the pooled session."""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def get_json(self, url: str, cookies: Dict[str, str],
+                       timeout: float = API_REQUEST_TIMEOUT) -> Tuple[int, Optional[object]]:
+        """GET a snowdash API URL with the given cookies.
+
+        Returns:
+            Tuple of (status, parsed JSON). JSON is None for non-200 responses.
+        """
+        if not self.session or self.session.closed:
+            await self.start()
+        started = time.monotonic()
+        try:
+            async with self.session.get(url, headers=DEFAULT_HEADERS, cookies=cookies,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                if resp.status != 200:
+                    self._notify(started, resp.status)
+                    return resp.status, None
+                data = await codec.read_json(resp)
+                self._notify(started, resp.status)
+                return resp.status, data
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            self._notify(started, error=type(e).__name__)
+            raise
+
+    async def navigate(self, url: str, cookies: Dict[str, str], max_redirects: int = 10,
+                       timeout: float = 30) -> Tuple[int, str, Dict[str, str]]:
+        """Replay a top-level page navigation, following redirects by hand.
+
+        Set-Cookie headers from every hop are applied to a copy of ``cookies``
+        (expired cookies are removed), which is what the browser does when it
+        follows the same redirect chain.
+
+        Returns:
+            Tuple of (final status, final URL, updated cookies)
+        """
+        if not self.session or self.session.closed:
+            await self.start()
+        cookies = dict(cookies)
+        for _ in range(max_redirects + 1):
+            async with self.session.get(url, headers=NAVIGATION_HEADERS, cookies=cookies,
+                                        allow_redirects=False,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                for name, morsel in resp.cookies.items():
+                    if morsel['max-age'] == '0' or not morsel.value:
+                        cookies.pop(name, None)
+                    else:
+                        cookies[name] = morsel.value
+                location = resp.headers.get('Location')
+                if resp.status not in (301, 302, 303, 307, 308) or not location:
+                    # Drain the body so the connection goes back to the pool
+                    await resp.read()
+                    return resp.status, str(resp.url), cookies
+                url = str(resp.url.join(yarl.URL(location)))
+        return 310, url, cookies  # Too many redirects
+
+    def connection_stats(self) -> Dict[str, float]:
+        """Return request/connection counters and the connection reuse ratio."""
+        stats = dict(self.stats)
+        opened = stats['connections_created'] + stats['connections_reused']
+        stats['reuse_ratio'] = stats['connections_reused'] / opened if opened else 0.0
+        return stats
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+def cookies_from_storage_state(state: Dict) -> Dict[str, str]:
+    """Extract Amazon cookies from a Playwright storage state dict."""
+    cookies = {}
+    for cookie in state.get('cookies', []):
+        domain = cookie.get('domain', '')
+        if 'amazon.co.uk' in domain or 'amazon.com' in domain:
+            cookies[cookie['name']] = cookie['value']
+    return cookies
+
 
 def load_cookies_from_state(state_file: str = 'state.json') -> Dict[str, str]:
     """Load authentication cookies from Playwright state file."""
     try:
         with open(state_file, 'r') as f:
-            state = json.load(f)
+            state = codec.load(f)
         
-        cookies = {}
-        for cookie in state.get('cookies', []):
-            domain = cookie.get('domain', '')
-            if 'amazon.co.uk' in domain or 'amazon.com' in domain:
-                cookies[cookie['name']] = cookie['value']
+        cookies = cookies_from_storage_state(state)
         
         app_logger.debug(f"Loaded {len(cookies)} cookies from {state_file}")
         return cookies
@@ -56,17 +219,19 @@ def load_cookies_from_state(state_file: str = 'state.json') -> Dict[str, str]:
         return {}
 
 
-def build_metrics_url(merchant_id: str, start_date: datetime = None, end_date: datetime = None, base_url: str = None) -> str:
+def build_metrics_url(merchant_id: Union[str, List[str]], start_date: datetime = None, end_date: datetime = None, base_url: str = None) -> str:
     """Build the summationMetrics API URL with query parameters.
     
     Args:
-        merchant_id: The full merchant ID (e.g., amzn1.merchant.d.xxx)
+        merchant_id: The full merchant ID (e.g., amzn1.merchant.d.xxx), or a list
+            of IDs to send as repeated ``merchantIds[]`` values
         start_date: Start of date range (defaults to yesterday)
         end_date: End of date range (defaults to now)
         base_url: Optional base URL (defaults to SUMMATION_METRICS_URL)
     
     Returns:
-        Full API URL with query parameters
+        Full API URL with query parameters. Both hour bounds are inclusive,
+        so 09:00-11:59 covers hours 9, 10 and 11.
     """
     if not start_date:
         # Default to today at midnight (not yesterday)
@@ -84,14 +249,14 @@ def build_metrics_url(merchant_id: str, start_date: datetime = None, end_date: d
         'startRange[year]': start_date.year,
         'startRange[month]': start_date.month - 1,  # 0-indexed
         'startRange[day]': start_date.day,
-        'startRange[hour]': 0,
+        'startRange[hour]': start_date.hour,
         'endRange[year]': end_date.year,
         'endRange[month]': end_date.month - 1,  # 0-indexed
         'endRange[day]': end_date.day,
         'endRange[hour]': end_date.hour,
     }
     
-    return f"{base_url}?{urlencode(params)}"
+    return f"{base_url}?{urlencode(params, doseq=True)}"
 
 
 async def fetch_lates_from_detailed_metrics(
@@ -127,7 +292,7 @@ async def fetch_lates_from_detailed_metrics(
     try:
         async with session.get(api_url, headers=DEFAULT_HEADERS, timeout=15) as resp:
             if resp.status == 200:
-                data = await resp.json()
+                data = await codec.read_json(resp)
                 
                 if isinstance(data, list):
                     # Find MASTER record for this store (contains aggregated metrics)
@@ -150,17 +315,85 @@ async def fetch_lates_from_detailed_metrics(
             else:
                 return 0.0
     except Exception as e:
-        app_logger.debug(f"[{store_name}] Failed to fetch LatePicksRate: {e}")
+        app_logger.debug("[%s] Failed to fetch LatePicksRate: %s", store_name, e)
         return 0.0
 
 
+def _summation_form_data(store_name: str, api_data: Dict, lates_rate: float = 0.0) -> Dict:
+    """Parse a summationMetrics payload into form data (matching current scraper output).
+    
+    Args:
+        store_name: Store name to label the result with
+        api_data: Metrics dict for a single merchant
+        lates_rate: LatePicksRate to report, if known
+    
+    Returns:
+        Form data dict
+    """
+    form_data = StoreMetrics.from_summation(store_name, api_data, lates_rate).to_form_dict()
+    # Additional fields from API (for future use)
+    form_data['_api_data'].update({
+        'replacement_rate': api_data.get('ReplacementRate_V2', 0),
+        'availability_percent': api_data.get('AvailabilityPercent_V2', 0),
+        'utilized_percent': api_data.get('UtilizedPercent_V2', 0),
+        'abandonment_rate': api_data.get('AbandonmentRate_V2', 0),
+        'avg_order_time_sec': api_data.get('AverageOrderTime_V2', 0),
+        'pick_time_sec': api_data.get('PickTimeInSec_V2', 0),
+    })
+    return form_data
+
+
+def split_batched_summation(api_data, merchant_ids: List[str]) -> Optional[Dict[str, Dict]]:
+    """Split a multi-merchant summationMetrics response into per-merchant metrics.
+    
+    The endpoint accepts several ``merchantIds[]`` but may answer with a single
+    aggregate across all of them. Per-merchant breakdowns are recognised either
+    as a dict keyed by merchant ID or as a list of records carrying a
+    ``merchantId`` plus their metrics (inline or under ``metrics``).
+    
+    Args:
+        api_data: Decoded JSON response
+        merchant_ids: The merchant IDs that were requested
+    
+    Returns:
+        Dict of merchant_id -> metrics dict, or None if the response is an
+        aggregate (or otherwise unrecognised) and cannot be split
+    """
+    wanted = set(merchant_ids)
+    
+    if isinstance(api_data, dict):
+        keyed = {k: v for k, v in api_data.items() if k in wanted and isinstance(v, dict)}
+        if keyed:
+            return keyed
+        # A top-level metrics dict is the aggregate across every requested merchant
+        # (a single-merchant batch is trivially "split")
+        if len(merchant_ids) == 1 and 'OrdersShopped_V2' in api_data:
+            return {merchant_ids[0]: api_data}
+        return None
+    
+    if isinstance(api_data, list):
+        split = {}
+        for item in api_data:
+            if not isinstance(item, dict):
+                continue
+            mid = item.get('merchantId') or item.get('merchant_id')
+            if mid not in wanted:
+                continue
+            metrics = item.get('metrics')
+            split[mid] = metrics if isinstance(metrics, dict) else item
+        return split or None
+    
+    return None
+
+
 async def fetch_store_metrics(
     session: aiohttp.ClientSession,
     store_info: Dict[str, str],
     start_date: datetime = None,
     end_date: datetime = None,
     retry_count: int = 3,
-    include_lates: bool = False  # Disabled by default - /metrics endpoint requires browser session context
+    include_lates: bool = False,  # Disabled by default - /metrics endpoint requires browser session context
+    cache: Optional[MetricsCache] = None
 ) -> Tuple[bool, Dict]:
     """Fetch metrics for a single store via direct API call.
     
@@ -171,6 +404,7 @@ async def fetch_store_metrics(
         end_date: End of date range
         retry_count: Number of retries on failure
         include_lates: If True, attempt to fetch LatePicksRate (unreliable without browser context)
+        cache: Optional MetricsCache for summationMetrics responses
     
     Returns:
         Tuple of (success: bool, data: dict)
@@ -183,6 +417,18 @@ async def fetch_store_metrics(
     if not merchant_id:
         return False, {'error': 'Missing merchant_id', 'store': store_name}
     
+    if not start_date:
+        now = datetime.now(LOCAL_TIMEZONE)
+        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if not end_date:
+        end_date = datetime.now(LOCAL_TIMEZONE)
+    
+    cache_id = _api_merchant_id(store_info)  # same key as the StoreContext paths
+    if cache and not include_lates:
+        cached = cache.get(SUMMATION_ENDPOINT, cache_id, start_date, end_date)
+        if cached is not None:
+            return True, _summation_form_data(store_name, cached)
+    
     api_url = build_metrics_url(merchant_id, start_date, end_date)
     
     for attempt in range(retry_count):
@@ -191,14 +437,9 @@ async def fetch_store_metrics(
                 status = resp.status
                 
                 if status == 200:
-                    api_data = await resp.json()
-                    
-                    # Parse API response into form data format (matching current scraper output)
-                    milliseconds_from_api = float(api_data.get('TimeAvailable_V2', 0.0))
-                    total_seconds = int(milliseconds_from_api / 1000)
-                    total_minutes, _ = divmod(abs(total_seconds), 60)
-                    total_hours, remaining_minutes = divmod(total_minutes, 60)
-                    formatted_time_available = f"{total_hours}:{remaining_minutes:02d}"
+                    api_data = await codec.read_json(resp)
+                    if cache:
+                        cache.put(SUMMATION_ENDPOINT, cache_id, start_date, end_date, api_data)
                     
                     # Fetch LatePicksRate from detailed metrics if requested
                     lates_rate = 0.0
@@ -207,34 +448,10 @@ async def fetch_store_metrics(
                             session, store_name, merchant_id, start_date, end_date
                         )
                     
-                    form_data = {
-                        'store': store_name,
-                        'orders': str(int(api_data.get('OrdersShopped_V2', 0))),
-                        'units': str(int(api_data.get('RequestedQuantity_V2', 0))),
-                        'fulfilled': str(int(api_data.get('PickedUnits_V2', 0))),
-                        'uph': f"{api_data.get('AverageUPH_V2', 0.0):.0f}",
-                        'inf': f"{api_data.get('ItemNotFoundRate_V2', 0.0):.1f} %",
-                        'found': f"{api_data.get('ItemFoundRate_V2', 0.0):.1f} %",
-                        'cancelled': str(int(api_data.get('ShortedUnits_V2', 0))),
-                        'lates': f"{lates_rate:.1f} %",  # Now calculated from detailed metrics API
-                        'time_available': formatted_time_available,
-                        # Additional fields from API (for future use)
-                        '_api_data': {
-                            'time_available_ms': milliseconds_from_api,  # Raw ms for calculations
-                            'time_available_hours': milliseconds_from_api / 3600000.0,  # Hours
-                            'acceptance_rate': api_data.get('AcceptanceRate_V2', 0),
-                            'rejection_rate': api_data.get('RejectionRate_V2', 0),
-                            'replacement_rate': api_data.get('ReplacementRate_V2', 0),
-                            'availability_percent': api_data.get('AvailabilityPercent_V2', 0),
-                            'utilized_percent': api_data.get('UtilizedPercent_V2', 0),
-                            'abandonment_rate': api_data.get('AbandonmentRate_V2', 0),
-                            'avg_order_time_sec': api_data.get('AverageOrderTime_V2', 0),
-                            'pick_time_sec': api_data.get('PickTimeInSec_V2', 0),
-                            'late_picks_rate': lates_rate,
-                        }
-                    }
+                    form_data = _summation_form_data(store_name, api_data, lates_rate)
                     
-                    app_logger.debug(f"[{store_name}] API fetch successful: {form_data['orders']} orders, UPH: {form_data['uph']}, Lates: {lates_rate:.1f}%")
+                    app_logger.debug("[%s] API fetch successful: %s orders, UPH: %s, Lates: %.1f%%",
+                                     store_name, form_data['orders'], form_data['uph'], lates_rate)
                     return True, form_data
                 
                 elif status == 403:
@@ -268,12 +485,73 @@ async def fetch_store_metrics(
     return False, {'error': 'max_retries_exceeded', 'store': store_name}
 
 
+async def fetch_store_metrics_batch(
+    session: aiohttp.ClientSession,
+    stores: List[Dict[str, str]],
+    start_date: datetime = None,
+    end_date: datetime = None,
+    cache: Optional[MetricsCache] = None
+) -> Optional[Dict[str, Tuple[bool, Dict]]]:
+    """Fetch summationMetrics for several stores in one request.
+    
+    Args:
+        session: aiohttp session with cookies
+        stores: Store info dicts (each with a merchant_id)
+        start_date: Start of date range
+        end_date: End of date range
+        cache: Optional MetricsCache; cached merchants are left out of the request
+    
+    Returns:
+        Dict of merchant_id -> (success, data) for every merchant found in the
+        response, or None if the server only returned an aggregate (or the
+        batch call failed) and the caller should fall back to single requests.
+        Merchants missing from a split response are simply absent.
+    """
+    by_merchant = {s['merchant_id']: s for s in stores if s.get('merchant_id')}
+    if not by_merchant:
+        return None
+    
+    results = {}
+    if cache:
+        for mid, store in by_merchant.items():
+            cached = cache.get(SUMMATION_ENDPOINT, _api_merchant_id(store), start_date, end_date)
+            if cached is not None:
+                results[mid] = (True, _summation_form_data(store.get('store_name', 'Unknown'), cached))
+        if len(results) == len(by_merchant):
+            return results
+    
+    merchant_ids = [mid for mid in by_merchant if mid not in results]
+    api_url = build_metrics_url(merchant_ids, start_date, end_date)
+    
+    try:
+        async with session.get(api_url, headers=DEFAULT_HEADERS, timeout=API_REQUEST_TIMEOUT) as resp:
+            if resp.status != 200:
+                app_logger.warning(f"Batched summationMetrics for {len(merchant_ids)} merchants returned {resp.status}")
+                return None
+            api_data = await codec.read_json(resp)
+    except Exception as e:
+        app_logger.warning(f"Batched summationMetrics for {len(merchant_ids)} merchants failed: {e}")
+        return None
+    
+    split = split_batched_summation(api_data, merchant_ids)
+    if split is None:
+        return None
+    
+    for mid, metrics in split.items():
+        if cache:
+            cache.put(SUMMATION_ENDPOINT, _api_merchant_id(by_merchant[mid]), start_date, end_date, metrics)
+        results[mid] = (True, _summation_form_data(by_merchant[mid].get('store_name', 'Unknown'), metrics))
+    return results
+
+
 async def fetch_all_stores_api(
     stores: List[Dict[str, str]],
     cookies: Dict[str, str],
     start_date: datetime = None,
     end_date: datetime = None,
-    max_concurrency: int = 100
+    max_concurrency: int = 100,
+    batch_size: int = 1,
+    cache: Optional[MetricsCache] = None
 ) -> Tuple[List[Dict], List[Dict]]:
     """Fetch metrics for all stores using direct API calls.
     
@@ -283,6 +561,10 @@ async def fetch_all_stores_api(
         start_date: Start of date range
         end_date: End of date range
         max_concurrency: Maximum concurrent API requests
+        batch_size: Merchant IDs to pack into each summationMetrics call. If the
+            first batch comes back as an aggregate rather than per-merchant
+            breakdowns, batching is abandoned and every store is fetched singly.
+        cache: Optional MetricsCache for summationMetrics responses
     
     Returns:
         Tuple of (successful_results: list, failed_stores: list)
@@ -297,17 +579,49 @@ async def fetch_all_stores_api(
     successful = []
     failed = []
     
+    # Resolve the default range once so every request (and cache key) agrees
+    if not start_date:
+        start_date = datetime.now(LOCAL_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    if not end_date:
+        end_date = datetime.now(LOCAL_TIMEZONE)
+    
     semaphore = asyncio.Semaphore(max_concurrency)
     
     async def fetch_with_semaphore(store):
         async with semaphore:
-            return await fetch_store_metrics(session, store, start_date, end_date)
+            return await fetch_store_metrics(session, store, start_date, end_date, cache=cache)
+    
+    async def fetch_batch_with_semaphore(batch):
+        async with semaphore:
+            return await fetch_store_metrics_batch(session, batch, start_date, end_date, cache=cache)
     
     async with aiohttp.ClientSession(connector=connector, cookies=cookies) as session:
-        tasks = [fetch_with_semaphore(store) for store in stores]
+        batched_results = {}
+        if batch_size > 1 and len(stores) > 1:
+            batches = [stores[i:i + batch_size] for i in range(0, len(stores), batch_size)]
+            # Probe with the first batch so an aggregate-only server costs one request
+            first = await fetch_batch_with_semaphore(batches[0])
+            if first is None:
+                app_logger.info("Batched summationMetrics not split per merchant, using single requests")
+            else:
+                batched_results.update(first)
+                rest = await asyncio.gather(*(fetch_batch_with_semaphore(b) for b in batches[1:]))
+                for result in rest:
+                    if result:
+                        batched_results.update(result)
+                app_logger.info(f"Batched summationMetrics covered {len(batched_results)}/{len(stores)} stores "
+                                f"in {len(batches)} requests")
+        
+        # Anything a batch did not cover (or every store, when not batching) goes single
+        remaining = [store for store in stores if store.get('merchant_id') not in batched_results]
+        tasks = [fetch_with_semaphore(store) for store in remaining]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        for store, result in zip(stores, results):
+        for store in stores:
+            if store.get('merchant_id') in batched_results:
+                successful.append(batched_results[store['merchant_id']][1])
+        
+        for store, result in zip(remaining, results):
             if isinstance(result, Exception):
                 failed.append({'store': store.get('store_name', 'Unknown'), 'error': str(result)})
             elif result[0]:  # Success
@@ -364,128 +678,598 @@ class APIScraperWorker:
         await self.close()
 
 
-async def fetch_store_metrics_with_lates_browser(
-    page,
+def _weighted_late_rate(store_name: str, detailed_data: List[Dict]) -> float:
+    """Order-weighted LatePicksRate across the per-shopper /metrics records."""
+    total_orders = 0
+    weighted_lates = 0.0
+    debug = app_logger.isEnabledFor(logging.DEBUG)  # checked once, this runs per shopper
+    for item in detailed_data:
+        metrics = item.get('metrics', {})
+        orders = metrics.get('OrdersShopped_V2', 0) or metrics.get('OrdersShopped', 0)
+        late_rate = metrics.get('LatePicksRate', 0.0)
+        if orders > 0:
+            total_orders += orders
+            weighted_lates += late_rate * orders
+            if debug:
+                app_logger.debug("[%s] API late_rate: %s, orders: %s", store_name, late_rate, orders)
+    if total_orders > 0:
+        lates_rate = weighted_lates / total_orders
+        app_logger.debug("[%s] Final lates_rate: %s (from %s/%s)", store_name, lates_rate, weighted_lates, total_orders)
+        return lates_rate
+    return 0.0
+
+
+def _merchant_name_matches(store_name: str, detailed_data: List[Dict]) -> bool:
+    """Check the /metrics records belong to ``store_name``.
+
+    /metrics answers for the session's current merchant, not the merchantIds
+    parameter, so this is how we confirm a context switch actually took effect.
+    An empty list (no shoppers yet) cannot be checked and is accepted.
+    """
+    names = [item.get('merchantName', '') for item in detailed_data if item.get('merchantName')]
+    if not names:
+        return True
+    short_name = store_name.replace('Morrisons - ', '')
+    return any(short_name in name for name in names)
+
+
+async def _fetch_store_payloads(
+    client: SellerCentralClient,
+    cookies: Dict[str, str],
     store_info: Dict[str, str],
     start_date: datetime = None,
-    end_date: datetime = None
+    end_date: datetime = None,
+    verify_context: bool = False,
+    cache: Optional[MetricsCache] = None
 ) -> Tuple[bool, Dict]:
-    """Fetch store metrics WITH accurate Lates by using browser to set context.
+    """Fetch the raw summation + detailed payloads for a store whose context is already set.
     
-    This function:
-    1. Navigates to the store's dashboard (sets session context)
-    2. Fetches summationMetrics API for main data
-    3. Fetches /metrics API for LatePicksRate (now available due to context)
-    4. Combines both into the final result
+    Args:
+        client: SellerCentralClient to issue the calls on
+        cookies: Cookies carrying the store session context
+        store_info: Store info dict
+        start_date: Start of date range (defaults to today at midnight)
+        end_date: End of date range (defaults to now)
+        verify_context: If True, fail with 'context_mismatch' when the /metrics
+            records belong to a different store
+        cache: Optional MetricsCache; cached responses are used instead of
+            calling the API, and fresh 200 responses are stored. /metrics
+            answers for the session's current store, so its records are only
+            stored once they are checked to belong to this store.
+    
+    Returns:
+        Tuple of (success: bool, data: dict). On success data holds
+        'summation' (dict), 'detailed' (per-shopper list, or None when the
+        /metrics call failed and Lates is unknown) and 'context_ok' (False
+        when the detailed records failed the store check)
+    """
+    store_name = store_info.get('store_name', 'Unknown')
+    start_date, end_date = _resolve_range(start_date, end_date)
+    api_merchant_id = _api_merchant_id(store_info)
+    
+    cached_summation = cache.get(SUMMATION_ENDPOINT, api_merchant_id, start_date, end_date) if cache else None
+    cached_detailed = cache.get(DETAILED_ENDPOINT, api_merchant_id, start_date, end_date) if cache else None
+    
+    async def cached_or_fetch(cached, url):
+        if cached is not None:
+            return 200, cached
+        return await client.get_json(url, cookies)
+    
+    # Summation (main data) and detailed (LatePicksRate) calls are independent,
+    # so issue them together. A failed detailed call only loses Lates.
+    summation_url = build_metrics_url(api_merchant_id, start_date, end_date)
+    detailed_url = build_metrics_url(api_merchant_id, start_date, end_date, base_url=DETAILED_METRICS_URL)
+    summation_result, detailed_result = await asyncio.gather(
+        cached_or_fetch(cached_summation, summation_url),
+        cached_or_fetch(cached_detailed, detailed_url),
+        return_exceptions=True,
+    )
+    
+    if isinstance(summation_result, BaseException):
+        raise summation_result
+    status, api_data = summation_result
+    if status != 200:
+        return False, {'error': f'Summation API error: {status}', 'store': store_name}
+    if cache and cached_summation is None:
+        cache.put(SUMMATION_ENDPOINT, api_merchant_id, start_date, end_date, api_data)
+    
+    detailed_data = None
+    context_ok = True
+    if isinstance(detailed_result, BaseException):
+        app_logger.warning(f"[{store_name}] Detailed metrics call failed, Lates unknown: {detailed_result}")
+    elif detailed_result[0] != 200 or not isinstance(detailed_result[1], list):
+        app_logger.warning(f"[{store_name}] Detailed metrics returned {detailed_result[0]}, Lates unknown")
+    else:
+        context_ok = cached_detailed is not None or _merchant_name_matches(store_name, detailed_result[1])
+        if verify_context and not context_ok:
+            return False, {'error': 'context_mismatch', 'store': store_name}
+        if not context_ok:
+            # Browser path: keep the old behaviour for this run, but a wrong-store
+            # response must never reach the cache (closed ranges never expire)
+            app_logger.warning(f"[{store_name}] /metrics records don't match the store, not caching them")
+        elif cache and cached_detailed is None:
+            cache.put(DETAILED_ENDPOINT, api_merchant_id, start_date, end_date, detailed_result[1])
+        detailed_data = detailed_result[1]
+    
+    return True, {'summation': api_data, 'detailed': detailed_data, 'context_ok': context_ok}
+
+
+async def _fetch_store_range(
+    client: SellerCentralClient,
+    cookies: Dict[str, str],
+    store_info: Dict[str, str],
+    start_date: datetime = None,
+    end_date: datetime = None,
+    verify_context: bool = False,
+    cache: Optional[MetricsCache] = None
+) -> RangeResult:
+    """Fetch summation + detailed metrics for a store whose context is already set.
+    
+    Same arguments as ``_fetch_store_payloads``.
+    
+    Returns:
+        Tuple of (success: bool, data) with data a StoreMetrics on success
+    """
+    store_name = store_info.get('store_name', 'Unknown')
+    success, payloads = await _fetch_store_payloads(client, cookies, store_info, start_date, end_date,
+                                                    verify_context=verify_context, cache=cache)
+    if not success:
+        return False, payloads
+    
+    lates_rate = None
+    if payloads['detailed'] is not None:
+        lates_rate = _weighted_late_rate(store_name, payloads['detailed'])
+    
+    store_metrics = StoreMetrics.from_summation(store_name, payloads['summation'], lates_rate)
+    if app_logger.isEnabledFor(logging.DEBUG):
+        app_logger.debug("[%s] API fetch: Orders=%s, Lates=%s", store_name, store_metrics.orders,
+                         store_metrics.display('lates'))
+    return True, store_metrics
+
+
+def _resolve_range(start_date: datetime = None, end_date: datetime = None) -> Tuple[datetime, datetime]:
+    """Fill in the default range (today at midnight to now)."""
+    if not start_date:
+        now = datetime.now(LOCAL_TIMEZONE)
+        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if not end_date:
+        end_date = datetime.now(LOCAL_TIMEZONE)
+    return start_date, end_date
+
+
+def _api_merchant_id(store_info: Dict[str, str]) -> str:
+    """Merchant ID to query with - the short ``new_id`` format when known."""
+    return store_info.get('new_id') or store_info.get('merchant_id', '')
+
+
+def cached_range_results(
+    cache: Optional[MetricsCache],
+    store_info: Dict[str, str],
+    ranges: Dict[str, Tuple[datetime, datetime]]
+) -> Optional[Dict[str, RangeResult]]:
+    """Serve every range from the cache, so the store context need not be entered.
     
     Args:
-        page: Playwright page object
+        cache: MetricsCache (or None, which always misses)
         store_info: Store info dict
-        start_date: Start of date range
-        end_date: End of date range
+        ranges: Mapping of range key to (start, end), as for ``StoreContext.fetch_ranges``
+    
+    Returns:
+        Mapping of range key to (success, data), or None unless both the
+        summation and detailed responses are cached for every range
+    """
+    if not cache:
+        return None
+    store_name = store_info.get('store_name', 'Unknown')
+    api_merchant_id = _api_merchant_id(store_info)
+    results = {}
+    for key, (start_date, end_date) in ranges.items():
+        start_date, end_date = _resolve_range(start_date, end_date)
+        api_data = cache.get(SUMMATION_ENDPOINT, api_merchant_id, start_date, end_date)
+        if api_data is None:
+            return None
+        detailed_data = cache.get(DETAILED_ENDPOINT, api_merchant_id, start_date, end_date)
+        if detailed_data is None:
+            return None
+        results[key] = (True, StoreMetrics.from_summation(store_name, api_data, _weighted_late_rate(store_name, detailed_data)))
+    return results
+
+
+def _is_intraday_range(start_date: datetime, end_date: datetime, now: datetime = None) -> bool:
+    """True for a "today so far" range: midnight today up to some time today."""
+    now = now or datetime.now(LOCAL_TIMEZONE)
+    return start_date.hour == 0 and start_date.date() == now.date() and end_date.date() == now.date()
+
+
+async def _fetch_store_range_incremental(
+    client: SellerCentralClient,
+    cookies: Dict[str, str],
+    store_info: Dict[str, str],
+    start_date: datetime,
+    end_date: datetime,
+    accumulator: IntradayAccumulator,
+    verify_context: bool = False,
+    cache: Optional[MetricsCache] = None
+) -> RangeResult:
+    """Fetch today-so-far by topping up the day accumulator instead of refetching from midnight.
+    
+    Hours up to the last settled hour (ended at least INTRADAY_SETTLE_MINUTES
+    ago) are fetched once as a delta from the previous run's watermark and
+    persisted. The remaining open hours are fetched fresh every run. The
+    result is the composition of both, in the same shape as a live fetch.
+    
+    Args:
+        client: SellerCentralClient to issue the calls on
+        cookies: Cookies carrying the store session context
+        store_info: Store info dict
+        start_date: Midnight today
+        end_date: Now
+        accumulator: IntradayAccumulator holding today's settled hours
+        verify_context: As for ``_fetch_store_payloads``
+        cache: Optional MetricsCache; the combined result is stored under
+            (start_date, end_date) so WTD composition can use it
     
     Returns:
         Tuple of (success: bool, data: dict)
     """
     store_name = store_info.get('store_name', 'Unknown')
-    merchant_id = store_info.get('merchant_id', '')
-    marketplace_id = store_info.get('marketplace_id', '')
-    new_id = store_info.get('new_id', '')  # Short format for /metrics API
+    api_merchant_id = _api_merchant_id(store_info)
+    day = start_date.date()
+    watermark, blocks, records = accumulator.load(api_merchant_id, day)
     
-    try:
-        # Navigate to store dashboard to set context
-        dash_url = f"https://sellercentral.amazon.co.uk/snowdash?ref_=mp_home_logo_xx&cor=mmp_EU&mons_sel_dir_mcid={merchant_id}&mons_sel_mkid={marketplace_id}"
+    settled = end_date - timedelta(minutes=INTRADAY_SETTLE_MINUTES)
+    settled_hour = settled.hour - 1 if settled.date() == day else -1
+    open_from = max(watermark, settled_hour) + 1
+    
+    windows = {'open': (start_date.replace(hour=open_from), end_date)}
+    if settled_hour > watermark:
+        windows['delta'] = (start_date.replace(hour=watermark + 1),
+                            start_date.replace(hour=settled_hour, minute=59, second=59))
+    keys = list(windows)
+    fetched = dict(zip(keys, await asyncio.gather(*(
+        _fetch_store_payloads(client, cookies, store_info, *windows[key], verify_context=verify_context)
+        for key in keys
+    ))))
+    for success, data in fetched.values():
+        if not success:
+            return False, data
+    
+    lates_known = True
+    if 'delta' in fetched:
+        delta = fetched['delta'][1]
+        blocks = blocks + [delta['summation']]
+        if delta['detailed'] is None:
+            # Without the delta's shopper records Lates cannot be accumulated, so
+            # leave the watermark where it is and retry these hours next run
+            lates_known = False
+        else:
+            records = records + delta['detailed']
+            if delta['context_ok']:
+                accumulator.save(api_merchant_id, day, settled_hour, blocks, records)
+                watermark = settled_hour
+    
+    open_payloads = fetched['open'][1]
+    combined = compose_summation(blocks + [open_payloads['summation']])
+    lates_rate = None
+    if lates_known and open_payloads['detailed'] is not None:
+        records = records + open_payloads['detailed']
+        lates_rate = _weighted_late_rate(store_name, records)
+        if cache and all(payloads['context_ok'] for _, payloads in fetched.values()):
+            cache.put(DETAILED_ENDPOINT, api_merchant_id, start_date, end_date, records)
+    if cache:
+        cache.put(SUMMATION_ENDPOINT, api_merchant_id, start_date, end_date, combined)
+    
+    app_logger.debug("[%s] Intraday fetch: hours to %s accumulated, %s-%s fetched fresh",
+                     store_name, watermark, open_from, end_date.hour)
+    return True, StoreMetrics.from_summation(store_name, combined, lates_rate)
+
+
+# Summation fields that add up across days. Rates are recomputed as order-weighted averages.
+ADDITIVE_SUMMATION_FIELDS = ('OrdersShopped_V2', 'RequestedQuantity_V2', 'PickedUnits_V2',
+                             'ShortedUnits_V2', 'TimeAvailable_V2')
+RATE_SUMMATION_FIELDS = ('AverageUPH_V2', 'ItemNotFoundRate_V2', 'ItemFoundRate_V2',
+                         'AcceptanceRate_V2', 'RejectionRate_V2')
+
+
+def compose_summation(payloads: List[Dict]) -> Dict:
+    """Combine per-day summationMetrics payloads into one multi-day payload.
+    
+    Args:
+        payloads: Summation payloads for non-overlapping ranges
+    
+    Returns:
+        Payload with the additive fields summed and the rates weighted by each
+        range's OrdersShopped_V2
+    """
+    composed = {field: sum(float(p.get(field) or 0) for p in payloads) for field in ADDITIVE_SUMMATION_FIELDS}
+    total_orders = composed['OrdersShopped_V2']
+    for field in RATE_SUMMATION_FIELDS:
+        weighted = sum(float(p.get(field) or 0) * float(p.get('OrdersShopped_V2') or 0) for p in payloads)
+        composed[field] = weighted / total_orders if total_orders else 0.0
+    return composed
+
+
+def day_slices(start_date: datetime, end_date: datetime) -> List[Tuple[datetime, datetime]]:
+    """Whole-day ranges (midnight to 23:59:59) from ``start_date`` up to, not including, ``end_date``'s day."""
+    slices = []
+    day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day.date() < end_date.date():
+        slices.append((day, day.replace(hour=23, minute=59, second=59)))
+        day = (day + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return slices
+
+
+def missing_day_slices(
+    cache: MetricsCache,
+    store_info: Dict[str, str],
+    slices: List[Tuple[datetime, datetime]]
+) -> List[Tuple[datetime, datetime]]:
+    """Return the slices whose summation or detailed response is not cached."""
+    api_merchant_id = _api_merchant_id(store_info)
+    return [
+        (start_date, end_date) for start_date, end_date in slices
+        if cache.get(SUMMATION_ENDPOINT, api_merchant_id, start_date, end_date) is None
+        or cache.get(DETAILED_ENDPOINT, api_merchant_id, start_date, end_date) is None
+    ]
+
+
+def compose_range_from_cache(
+    cache: MetricsCache,
+    store_info: Dict[str, str],
+    slices: List[Tuple[datetime, datetime]]
+) -> Optional[RangeResult]:
+    """Build one result spanning several cached, non-overlapping ranges.
+    
+    Used for WTD: the closed days of the week plus the current day's range
+    (which has just been fetched, so is cached too). Lates is the
+    order-weighted rate across every day's per-shopper records.
+    
+    Args:
+        cache: MetricsCache holding every slice
+        store_info: Store info dict
+        slices: The (start, end) ranges that make up the composed range
+    
+    Returns:
+        (True, StoreMetrics) in the same shape as a live fetch, or None if any
+        slice is missing from the cache
+    """
+    store_name = store_info.get('store_name', 'Unknown')
+    api_merchant_id = _api_merchant_id(store_info)
+    payloads = []
+    detailed_records = []
+    for start_date, end_date in slices:
+        api_data = cache.get(SUMMATION_ENDPOINT, api_merchant_id, start_date, end_date)
+        detailed_data = cache.get(DETAILED_ENDPOINT, api_merchant_id, start_date, end_date)
+        if api_data is None or detailed_data is None:
+            return None
+        payloads.append(api_data)
+        detailed_records.extend(detailed_data)
+    
+    lates_rate = _weighted_late_rate(store_name, detailed_records)
+    return True, StoreMetrics.from_summation(store_name, compose_summation(payloads), lates_rate)
+
+
+class StoreContext:
+    """A store's session context, entered once and reused for many date ranges.
+    
+    Entering a context (browser navigation or the HTTP handshake) is the slow
+    part of a store visit; once it is set, the metrics APIs can be queried for
+    any number of ``(start, end)`` ranges with the same cookies.
+    
+    Usage:
+        store_ctx = await StoreContext.enter_browser(page, client, store_info)
+        results = await store_ctx.fetch_ranges({
+            'today': date_range_for('today'),
+            'wtd': date_range_for('wtd'),
+        })
+        success, form_data = results['today']
+    
+    With a MetricsCache, check ``cached_range_results`` first - a store whose
+    ranges are all cached does not need its context entered at all.
+    """
+    
+    def __init__(self, client: SellerCentralClient, store_info: Dict[str, str],
+                 cookies: Dict[str, str], via: str, cache: Optional[MetricsCache] = None,
+                 accumulator: Optional[IntradayAccumulator] = None):
+        self.client = client
+        self.store_info = store_info
+        self.store_name = store_info.get('store_name', 'Unknown')
+        self.cookies = cookies
+        self.via = via  # 'browser' or 'http'
+        self.cache = cache
+        self.accumulator = accumulator
+    
+    @classmethod
+    async def enter_browser(cls, page, client: SellerCentralClient, store_info: Dict[str, str],
+                            cache: Optional[MetricsCache] = None,
+                            accumulator: Optional[IntradayAccumulator] = None) -> 'StoreContext':
+        """Set the store context by navigating a Playwright page to its dashboard."""
+        dash_url = DASHBOARD_URL_TEMPLATE.format(merchant_id=store_info.get('merchant_id', ''),
+                                                 marketplace_id=store_info.get('marketplace_id', ''))
         await page.goto(dash_url, wait_until="domcontentloaded", timeout=30000)
         
         # Get cookies after navigation
-        context = page.context
-        cookies_list = await context.cookies()
+        cookies_list = await page.context.cookies()
         cookies = {c['name']: c['value'] for c in cookies_list if 'amazon' in c.get('domain', '')}
+        return cls(client, store_info, cookies, via='browser', cache=cache, accumulator=accumulator)
+    
+    @classmethod
+    async def enter_http(cls, client: SellerCentralClient, cookies: Dict[str, str],
+                         store_info: Dict[str, str],
+                         cache: Optional[MetricsCache] = None,
+                         accumulator: Optional[IntradayAccumulator] = None) -> Optional['StoreContext']:
+        """Set the store context with the browser-free handshake.
         
-        # Build date range params - default to today only
-        if not start_date:
-            now = datetime.now(LOCAL_TIMEZONE)
-            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        if not end_date:
-            end_date = datetime.now(LOCAL_TIMEZONE)
-        
-        params = {
-            'merchantIds[]': new_id if new_id else merchant_id,
-            'startRange[year]': start_date.year,
-            'startRange[month]': start_date.month - 1,
-            'startRange[day]': start_date.day,
-            'startRange[hour]': 0,
-            'endRange[year]': end_date.year,
-            'endRange[month]': end_date.month - 1,
-            'endRange[day]': end_date.day,
-            'endRange[hour]': end_date.hour,
-        }
-        
-        # Create aiohttp session with updated cookies
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        
-        async with aiohttp.ClientSession(connector=connector, cookies=cookies) as session:
-            # Fetch summation metrics (main data)
-            summation_url = f"{SUMMATION_METRICS_URL}?{urlencode(params)}"
-            async with session.get(summation_url, headers=DEFAULT_HEADERS, timeout=15) as resp:
-                if resp.status != 200:
-                    return False, {'error': f'Summation API error: {resp.status}', 'store': store_name}
-                api_data = await resp.json()
-            
-            # Fetch detailed metrics (for LatePicksRate)
-            detailed_url = f"{DETAILED_METRICS_URL}?{urlencode(params)}"
-            async with session.get(detailed_url, headers=DEFAULT_HEADERS, timeout=15) as resp:
-                lates_rate = 0.0
-                if resp.status == 200:
-                    detailed_data = await resp.json()
-                    if isinstance(detailed_data, list):
-                        # Calculate weighted average LatePicksRate
-                        total_orders = 0
-                        weighted_lates = 0.0
-                        for item in detailed_data:
-                            metrics = item.get('metrics', {})
-                            orders = metrics.get('OrdersShopped_V2', 0) or metrics.get('OrdersShopped', 0)
-                            late_rate = metrics.get('LatePicksRate', 0.0)
-                            if orders > 0:
-                                total_orders += orders
-                                weighted_lates += late_rate * orders
-                                app_logger.debug(f"[{store_name}] API late_rate: {late_rate}, orders: {orders}")
-                        if total_orders > 0:
-                            lates_rate = weighted_lates / total_orders
-                            app_logger.debug(f"[{store_name}] Final lates_rate: {lates_rate} (from {weighted_lates}/{total_orders})")
+        Returns:
+            StoreContext, or None if the handshake failed
+        """
+        new_cookies = await switch_store_context_http(client, cookies, store_info)
+        if new_cookies is None:
+            return None
+        return cls(client, store_info, new_cookies, via='http', cache=cache, accumulator=accumulator)
+    
+    async def fetch_range(self, start_date: datetime = None, end_date: datetime = None) -> RangeResult:
+        """Fetch metrics for one date range within this context.
         
-        # Build form data
-        milliseconds = float(api_data.get('TimeAvailable_V2', 0.0))
-        total_seconds = int(milliseconds / 1000)
-        total_minutes, _ = divmod(abs(total_seconds), 60)
-        total_hours, remaining_minutes = divmod(total_minutes, 60)
-        formatted_time = f"{total_hours}:{remaining_minutes:02d}"
+        HTTP-entered contexts verify the /metrics records belong to this store
+        and report 'context_mismatch' otherwise. With an IntradayAccumulator, a
+        today-so-far range only fetches the hours since the previous run.
+        """
+        try:
+            if self.accumulator and start_date and end_date and _is_intraday_range(start_date, end_date):
+                return await _fetch_store_range_incremental(
+                    self.client, self.cookies, self.store_info, start_date, end_date, self.accumulator,
+                    verify_context=(self.via == 'http'), cache=self.cache)
+            return await _fetch_store_range(self.client, self.cookies, self.store_info, start_date, end_date,
+                                            verify_context=(self.via == 'http'), cache=self.cache)
+        except Exception as e:
+            app_logger.error(f"[{self.store_name}] Error fetching range: {e}")
+            return False, {'error': str(e), 'store': self.store_name}
+    
+    async def fetch_ranges(self, ranges: Dict[str, Tuple[datetime, datetime]]) -> Dict[str, RangeResult]:
+        """Fetch several date ranges concurrently.
         
-        form_data = {
-            'store': store_name,
-            'orders': str(int(api_data.get('OrdersShopped_V2', 0))),
-            'units': str(int(api_data.get('RequestedQuantity_V2', 0))),
-            'fulfilled': str(int(api_data.get('PickedUnits_V2', 0))),
-            'uph': f"{api_data.get('AverageUPH_V2', 0.0):.0f}",
-            'inf': f"{api_data.get('ItemNotFoundRate_V2', 0.0):.1f} %",
-            'found': f"{api_data.get('ItemFoundRate_V2', 0.0):.1f} %",
-            'cancelled': str(int(api_data.get('ShortedUnits_V2', 0))),
-            'lates': f"{lates_rate:.1f} %",  # NOW ACCURATE!
-            'time_available': formatted_time,
-            '_api_data': {
-                'late_picks_rate': lates_rate,
-                'acceptance_rate': api_data.get('AcceptanceRate_V2', 0),
-                'rejection_rate': api_data.get('RejectionRate_V2', 0),
-            }
-        }
+        Args:
+            ranges: Mapping of range key (e.g. 'today', 'wtd') to (start, end)
         
-        app_logger.debug(f"[{store_name}] API+Browser fetch: Orders={form_data['orders']}, Lates={lates_rate:.1f}%")
-        return True, form_data
+        Returns:
+            Mapping of the same keys to (success, data) results
+        """
+        keys = list(ranges)
+        results = await asyncio.gather(*(self.fetch_range(*ranges[key]) for key in keys))
+        return dict(zip(keys, results))
+
+
+def date_range_for(name: str, now: datetime = None) -> Tuple[datetime, datetime]:
+    """Return the (start, end) datetimes for a named range.
+    
+    Args:
+        name: 'today', 'yesterday', 'wtd' (Monday to now) or 'last_7_days'
+        now: Reference time (defaults to now in LOCAL_TIMEZONE)
+    """
+    now = now or datetime.now(LOCAL_TIMEZONE)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if name == 'today':
+        return midnight, now
+    if name == 'yesterday':
+        yesterday = midnight - timedelta(days=1)
+        return yesterday, yesterday.replace(hour=23, minute=59, second=59)
+    if name == 'wtd':
+        return midnight - timedelta(days=now.weekday()), now
+    if name == 'last_7_days':
+        return midnight - timedelta(days=7), now
+    raise ValueError(f"Unknown date range: {name}")
+
+
+async def fetch_store_metrics_with_lates_browser(
+    page,
+    store_info: Dict[str, str],
+    start_date: datetime = None,
+    end_date: datetime = None,
+    client: Optional[SellerCentralClient] = None
+) -> RangeResult:
+    """Fetch store metrics WITH accurate Lates by using browser to set context.
+    
+    Single-range convenience wrapper around ``StoreContext``. When more than
+    one range is needed for a store, enter a StoreContext once and call
+    ``fetch_ranges`` instead of calling this repeatedly.
+    
+    This function:
+    1. Navigates to the store's dashboard (sets session context)
+    2. Fetches summationMetrics API (main data) and /metrics API (LatePicksRate,
+       available due to context) concurrently
+    3. Combines both into the final result. If only the /metrics call fails the
+       summation data is still returned with Lates recorded as "N/A".
+    
+    Args:
+        page: Playwright page object
+        store_info: Store info dict
+        start_date: Start of date range
+        end_date: End of date range
+        client: Shared SellerCentralClient for the run. If omitted, a
+            temporary client is created and closed for this call.
+    
+    Returns:
+        Tuple of (success: bool, data: dict)
+    """
+    store_name = store_info.get('store_name', 'Unknown')
+    
+    owns_client = client is None
+    if owns_client:
+        client = SellerCentralClient(limit=2)
+    
+    try:
+        store_ctx = await StoreContext.enter_browser(page, client, store_info)
+        return await store_ctx.fetch_range(start_date, end_date)
         
     except Exception as e:
         app_logger.error(f"[{store_name}] Error in fetch_with_lates: {e}")
         return False, {'error': str(e), 'store': store_name}
+    finally:
+        if owns_client:
+            await client.close()
+
+
+async def switch_store_context_http(
+    client: SellerCentralClient,
+    cookies: Dict[str, str],
+    store_info: Dict[str, str]
+) -> Optional[Dict[str, str]]:
+    """Switch the session's current merchant without a browser.
+    
+    Replays the redirect/cookie handshake that ``page.goto`` on the snowdash
+    URL performs (``mons_sel_dir_mcid``/``mons_sel_mkid``), using plain HTTP.
+    
+    Args:
+        client: SellerCentralClient to issue the navigation on
+        cookies: Current session cookies (e.g. from state.json)
+        store_info: Store info dict
+    
+    Returns:
+        Updated cookies on success, or None if the handshake failed (non-200
+        landing page, or bounced to the sign-in page)
+    """
+    store_name = store_info.get('store_name', 'Unknown')
+    dash_url = DASHBOARD_URL_TEMPLATE.format(merchant_id=store_info.get('merchant_id', ''),
+                                             marketplace_id=store_info.get('marketplace_id', ''))
+    try:
+        status, final_url, new_cookies = await client.navigate(dash_url, cookies)
+    except Exception as e:
+        app_logger.warning(f"[{store_name}] HTTP context switch failed: {e}")
+        return None
+    
+    if status != 200 or any(marker in final_url for marker in LOGIN_URL_MARKERS):
+        app_logger.warning(f"[{store_name}] HTTP context switch landed on {status} {final_url.split('?')[0]}")
+        return None
+    return new_cookies
+
+
+async def fetch_store_metrics_with_lates_http(
+    client: SellerCentralClient,
+    cookies: Dict[str, str],
+    store_info: Dict[str, str],
+    start_date: datetime = None,
+    end_date: datetime = None
+) -> Tuple[bool, Dict, Dict[str, str]]:
+    """Browser-free variant of ``fetch_store_metrics_with_lates_browser``.
+    
+    Sets the store context with ``switch_store_context_http`` and then fetches
+    the same metrics. The /metrics records are checked against the store name,
+    so a handshake that did not really switch context is reported as a failure
+    rather than returning another store's Lates.
+    
+    Returns:
+        Tuple of (success, data, cookies). On failure ``data['error']`` is
+        'handshake_failed' or 'context_mismatch' when the caller should fall
+        back to browser navigation. ``cookies`` is the latest cookie set and
+        should be passed to the next call.
+    """
+    store_name = store_info.get('store_name', 'Unknown')
+    store_ctx = await StoreContext.enter_http(client, cookies, store_info)
+    if store_ctx is None:
+        return False, {'error': 'handshake_failed', 'store': store_name}, cookies
+    success, data = await store_ctx.fetch_range(start_date, end_date)
+    return success, data, store_ctx.cookies
 
 
 # Convenience function for quick testing
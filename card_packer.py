@@ -0,0 +1,109 @@
+# =======================================================================================
+#                  CARD PACKER MODULE - Fill Chat Cards up to the Message Size Limit
+# =======================================================================================
+# Google Chat rejects messages over 32,000 bytes. Batch sizes used to be fixed store
+# counts picked to stay well clear of that, so most cards went out half empty and every
+# extra card is another rate-limited post. Sections are now measured as they will be
+# serialised and packed greedily into as few cards as fit. A section too big for a card
+# on its own is split across cards (by widget, then by line of text), never dropped.
+# =======================================================================================
+
+from typing import Dict, List
+
+import codec
+
+CHAT_MESSAGE_LIMIT = 32000  # bytes, Google Chat's limit for one message
+DEFAULT_MAX_BYTES = 30000   # what the packer fills to, leaving headroom under the limit
+CONTINUED = " (cont.)"      # appended to the header of each later part of a split section
+
+
+def json_size(obj) -> int:
+    """Size in bytes of ``obj`` as it is sent (same codec as the chat client)."""
+    return len(codec.dumps(obj).encode('utf-8'))
+
+
+def _split_text(text: str, budget: int) -> List[str]:
+    """Cut ``text`` into chunks of whole lines that each encode within ``budget`` bytes."""
+    chunks, current, size = [], [], 0
+    for line in text.split("\n"):
+        line_size = json_size(line)  # the quotes cover the escaped newline joining it
+        while line_size > budget:
+            # A single line longer than a whole card: hard cut it
+            cut = max(1, len(line) * budget // line_size)
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(line[:cut])
+            line = line[cut:]
+            line_size = json_size(line)
+        if current and size + line_size > budget:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += line_size
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _split_widget(widget: Dict, max_bytes: int) -> List[Dict]:
+    if json_size(widget) <= max_bytes or 'textParagraph' not in widget:
+        return [widget]
+    paragraph = widget['textParagraph']
+    budget = max_bytes - json_size(dict(widget, textParagraph=dict(paragraph, text="")))
+    return [dict(widget, textParagraph=dict(paragraph, text=chunk))
+            for chunk in _split_text(paragraph['text'], budget)]
+
+
+def split_section(section: Dict, max_bytes: int) -> List[Dict]:
+    """Split a section into parts that each encode within ``max_bytes``.
+
+    Widgets are kept whole where possible; a text paragraph that is too big on its
+    own is split between lines. Later parts get ``CONTINUED`` on their header.
+    """
+    if json_size(section) <= max_bytes:
+        return [section]
+    empty = dict(section, widgets=[])
+    if 'header' in section:
+        empty['header'] = section['header'] + CONTINUED
+    budget = max_bytes - json_size(empty)
+    widgets = [part for widget in section.get('widgets', []) for part in _split_widget(widget, budget)]
+
+    parts, current, size = [], [], 0
+    for widget in widgets:
+        widget_size = json_size(widget) + 1  # separating comma
+        if current and size + widget_size > budget:
+            parts.append(current)
+            current, size = [], 0
+        current.append(widget)
+        size += widget_size
+    if current:
+        parts.append(current)
+    return [dict(section, widgets=part) if index == 0 else dict(empty, widgets=part)
+            for index, part in enumerate(parts)]
+
+
+def pack_sections(sections: List[Dict], max_bytes: int = DEFAULT_MAX_BYTES, overhead: int = 0) -> List[List[Dict]]:
+    """Greedily pack ``sections`` (in order) into cards of at most ``max_bytes``.
+
+    Args:
+        sections: Card sections, e.g. one per store
+        max_bytes: Size budget for a whole message
+        overhead: Size of the message with no sections (header, ids, wrappers)
+
+    Returns:
+        Sections per card; oversized sections are split across consecutive cards
+    """
+    budget = max_bytes - overhead
+    cards, current, size = [], [], 0
+    for section in sections:
+        for part in split_section(section, budget):
+            part_size = json_size(part) + 1
+            if current and size + part_size > budget:
+                cards.append(current)
+                current, size = [], 0
+            current.append(part)
+            size += part_size
+    if current:
+        cards.append(current)
+    return cards
@@ -0,0 +1,198 @@
+# =======================================================================================
+#                  CHAT CLIENT MODULE - Pooled, Rate-limited Google Chat Posting
+# =======================================================================================
+# Every card used to open its own aiohttp session (and usually its own SSL context and
+# connector), and pacing was a fixed sleep between posts. All chat posts now go through
+# one ChatClient per event loop: a single pooled session, and a token bucket per Chat
+# space so posts follow Google Chat's per-space write quota (about one message per
+# second). A 429 pauses that space for the server's Retry-After. Different spaces (store
+# cards, performance, INF) have separate buckets and post in parallel.
+# =======================================================================================
+
+import asyncio
+import ssl
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+import certifi
+
+import codec
+
+DEFAULT_RATE = 1.0         # messages per second per space (Google Chat's per-space write quota)
+DEFAULT_BURST = 1          # messages a space may send back to back
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_TIMEOUT = 30       # seconds per request
+DEFAULT_RETRY_AFTER = 5.0  # seconds to pause a space after a 429 without a usable Retry-After
+
+# Settings for clients created by get_chat_client() - see configure()
+_settings = {'rate': DEFAULT_RATE, 'burst': DEFAULT_BURST, 'max_attempts': DEFAULT_MAX_ATTEMPTS}
+_clients = weakref.WeakKeyDictionary()  # event loop -> ChatClient
+
+
+class TokenBucket:
+    """``rate`` tokens per second with bursts of up to ``capacity``.
+
+    Kept as the time the bucket is next empty (GCRA form), so concurrent callers
+    each reserve their own slot and a pause holds back everyone who asks after it.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.burst_window = (capacity - 1) / rate
+        self.next_empty = 0.0
+
+    def reserve(self, now: float = None) -> float:
+        """Take a token and return how many seconds to wait before using it."""
+        now = self.clock() if now is None else now
+        start = max(now, self.next_empty - self.burst_window)
+        self.next_empty = max(self.next_empty, now) + 1 / self.rate
+        return start - now
+
+    def pause(self, seconds: float, now: float = None):
+        """Give out no tokens for ``seconds`` (e.g. the server's Retry-After)."""
+        now = self.clock() if now is None else now
+        self.next_empty = max(self.next_empty, now + seconds + self.burst_window)
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def space_key(url: str) -> str:
+    """The Chat space a webhook posts to (``/v1/spaces/<id>/messages``); quota is per space."""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+def same_space(url: str, other: str) -> bool:
+    """True if both webhooks post to the same space (and so share its quota and ordering)."""
+    return bool(url) and bool(other) and space_key(url) == space_key(other)
+
+
+def retry_after_seconds(value: Optional[str], default: float = DEFAULT_RETRY_AFTER) -> float:
+    """Parse a Retry-After header (seconds or an HTTP date)."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class ChatClient:
+    """One pooled session and per-space token buckets for all Google Chat posts.
+
+    Usage:
+        client = get_chat_client()
+        if await client.post(webhook_url, payload, "job summary"):
+            ...
+        await close_chat_client()   # once, at the end of the run
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, timeout: float = DEFAULT_TIMEOUT):
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.stats = {'posts': 0, 'throttled': 0, 'failed': 0}
+
+    def bucket(self, url: str) -> TokenBucket:
+        key = space_key(url)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(ssl=ssl.create_default_context(cafile=certifi.where()))
+            self.session = aiohttp.ClientSession(connector=connector, json_serialize=codec.dumps,
+                                                 timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def post(self, url: str, payload: Dict, label: str = "chat message", app_logger=None) -> bool:
+        """POST ``payload`` to a Chat webhook, paced by the space's bucket.
+
+        Throttled (429), 5xx and network errors are retried up to ``max_attempts``
+        in total; a 429 pauses the whole space for its Retry-After.
+
+        Returns:
+            True if the message was accepted
+        """
+        bucket = self.bucket(url)
+        for attempt in range(1, self.max_attempts + 1):
+            await bucket.acquire()
+            self.stats['posts'] += 1
+            try:
+                async with self._session().post(url, json=payload) as resp:
+                    if resp.status < 300:
+                        return True
+                    body = await resp.text()
+                    if resp.status == 429:
+                        self.stats['throttled'] += 1
+                        wait = retry_after_seconds(resp.headers.get('Retry-After'))
+                        bucket.pause(wait)
+                        problem = f"throttled, retrying after {wait:.1f}s"
+                    elif resp.status >= 500:
+                        bucket.pause(2 ** (attempt - 1))
+                        problem = f"status {resp.status}: {body[:200]}"
+                    else:
+                        self.stats['failed'] += 1
+                        if app_logger:
+                            app_logger.error(f"Failed to post {label}: {resp.status} {body[:500]}")
+                        return False
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                bucket.pause(2 ** (attempt - 1))
+                problem = f"{type(e).__name__}: {e}"
+            if app_logger:
+                app_logger.warning(f"Posting {label} failed (attempt {attempt}/{self.max_attempts}): {problem}")
+        self.stats['failed'] += 1
+        if app_logger:
+            app_logger.error(f"Giving up on {label} after {self.max_attempts} attempts")
+        return False
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+
+def configure(rate: float = None, burst: int = None, max_attempts: int = None):
+    """Set the pacing for clients created from now on (call once at startup from config)."""
+    for key, value in (('rate', rate), ('burst', burst), ('max_attempts', max_attempts)):
+        if value is not None:
+            _settings[key] = value
+
+
+def get_chat_client() -> ChatClient:
+    """The ChatClient for the running event loop.
+
+    Sessions can't be shared across loops, so each loop (e.g. each ``--processes``
+    child, or each test) gets its own.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = ChatClient(**_settings)
+    return client
+
+
+async def close_chat_client():
+    """Close the running loop's client, if one was created."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client:
+        await client.close()
@@ -0,0 +1,117 @@
+# =======================================================================================
+#                  CHAT SENDER MODULE - Background Batching of Store Chat Cards
+# =======================================================================================
+# Store results are logged by the data processors while they hold the log lock. Posting
+# a batch card from there stalled every processor on a Google Chat round trip, so the
+# processors now only enqueue entries and a single sender task builds the batches,
+# posts them and retries failed posts. On shutdown the sender drains what is left
+# within a bounded wait, so a slow or unreachable webhook can't hold up the run.
+# =======================================================================================
+
+import asyncio
+from typing import Awaitable, Callable, List
+
+_CLOSE = object()  # queued by close() after the last entry
+
+
+class ChatSender:
+    """Queue of chat entries posted in batches of ``batch_size`` by one background task.
+
+    With ``entry_size``, a batch is also posted early when the next entry would
+    take it over ``max_bytes``, so cards fill up to the message size limit.
+
+    ``post_batch(entries, batch_number)`` returns False when the post failed for
+    good - the chat client has already retried what can be retried - and the
+    batch is counted as failed. Only a raised exception is retried, up to
+    ``retries`` more times with exponential backoff.
+
+    Usage:
+        sender = ChatSender(post_batch, batch_size=100, app_logger=app_logger)
+        sender.start()
+        sender.submit(entry)                # never blocks
+        await sender.close(timeout=30)      # post the last partial batch
+    """
+
+    def __init__(self, post_batch: Callable[[List, int], Awaitable[bool]], batch_size: int,
+                 retries: int = 0, retry_delay: float = 2.0, app_logger=None,
+                 entry_size: Callable[[object], int] = None, max_bytes: int = None):
+        self.post_batch = post_batch
+        self.batch_size = max(1, batch_size)
+        self.entry_size = entry_size
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.app_logger = app_logger
+        self.stats = {'batches': 0, 'retries': 0, 'failed': 0, 'dropped': 0}
+        self._queue = asyncio.Queue()
+        self._batch = []
+        self._batch_bytes = 0
+        self._sending = []
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, entry):
+        """Queue one entry for the next batch."""
+        self._queue.put_nowait(entry)
+
+    async def _run(self):
+        while True:
+            entry = await self._queue.get()
+            if entry is not _CLOSE:
+                size = self.entry_size(entry) if self.entry_size else 0
+                if self._batch and self.max_bytes and self._batch_bytes + size > self.max_bytes:
+                    await self._flush()
+                self._batch.append(entry)
+                self._batch_bytes += size
+            if self._batch and (entry is _CLOSE or len(self._batch) >= self.batch_size):
+                await self._flush()
+            if entry is _CLOSE:
+                return
+
+    async def _flush(self):
+        self._sending, self._batch, self._batch_bytes = self._batch, [], 0
+        await self._post(self._sending)
+        self._sending = []
+
+    async def _post(self, batch: List):
+        self.stats['batches'] += 1
+        number = self.stats['batches']
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                if await self.post_batch(batch, number) is not False:
+                    return
+                break  # rejected or out of attempts in the client; posting again won't help
+            except Exception as e:
+                if self.app_logger:
+                    self.app_logger.warning(f"Chat batch {number} post raised: {e}")
+        self.stats['failed'] += 1
+        if self.app_logger:
+            self.app_logger.error(f"Chat batch {number} ({len(batch)} stores) not posted")
+
+    async def close(self, timeout: float):
+        """Post everything queued so far, waiting at most ``timeout`` seconds.
+
+        Entries still unposted when the wait runs out are dropped and counted in
+        ``stats['dropped']``.
+        """
+        if self._task is None:
+            return
+        self._queue.put_nowait(_CLOSE)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            queued = 0
+            while not self._queue.empty():
+                queued += self._queue.get_nowait() is not _CLOSE
+            self.stats['dropped'] = len(self._sending) + len(self._batch) + queued
+            if self.app_logger:
+                self.app_logger.warning(f"Chat sender did not drain within {timeout:.0f}s - "
+                                        f"{self.stats['dropped']} entries not posted")
+        self._task = None
@@ -0,0 +1,77 @@
+# =======================================================================================
+#                  CODEC MODULE - Pluggable JSON Codec and Event Loop Selection
+# =======================================================================================
+# The stdlib json module is the default everywhere. Enabling the fast profile switches
+# encode/decode to orjson and the event loop to uvloop, each only if it is installed -
+# a missing library silently leaves that part on the stdlib implementation.
+#
+#     pip install orjson uvloop
+# =======================================================================================
+
+import asyncio
+import json
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # optional
+    uvloop = None
+
+_fast_json = False
+_fast_loop = False
+
+
+def configure(fast: bool) -> Dict[str, bool]:
+    """Turn the fast profile on or off.
+
+    Args:
+        fast: Use orjson/uvloop where available
+
+    Returns:
+        Which fast paths are actually active, e.g. {'orjson': True, 'uvloop': False}
+    """
+    global _fast_json, _fast_loop
+    _fast_json = bool(fast and orjson)
+    _fast_loop = bool(fast and uvloop)
+    return {'orjson': _fast_json, 'uvloop': _fast_loop}
+
+
+def dumps(obj: Any, indent: int = None) -> str:
+    """Serialise to a JSON string. ``indent`` of 2 is supported on both codecs."""
+    if _fast_json:
+        try:
+            option = orjson.OPT_INDENT_2 if indent else 0
+            return orjson.dumps(obj, option=option).decode('utf-8')
+        except TypeError:
+            pass  # e.g. non-str dict keys - let the stdlib handle it
+    return json.dumps(obj, indent=indent)
+
+
+def loads(data) -> Any:
+    """Parse JSON from str or bytes."""
+    if _fast_json:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load(fp) -> Any:
+    """Parse JSON from an open file."""
+    return loads(fp.read())
+
+
+async def read_json(resp) -> Any:
+    """Decode an aiohttp response body with the active codec."""
+    return await resp.json(loads=loads)
+
+
+def run(main_coro):
+    """``asyncio.run`` on uvloop when the fast profile is active."""
+    if _fast_loop:
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            return runner.run(main_coro)
+    return asyncio.run(main_coro)
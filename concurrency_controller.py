@@ -0,0 +1,183 @@
+# =======================================================================================
+#              CONCURRENCY CONTROLLER MODULE - Latency/Error-driven AIMD Scaling
+# =======================================================================================
+# API-first runs are I/O-bound against sellercentral, so the useful signals are the
+# response times and status codes of the API calls themselves, not local CPU load.
+# The controller grows the worker limit by one while the windowed p95 latency is under
+# target, and halves it as soon as the API starts throttling (429/503) or timing out.
+# Every decision is recorded so the run can be replayed as a time series afterwards.
+# =======================================================================================
+
+import asyncio
+import csv
+import os
+import time
+from typing import Dict, List, Optional
+
+from run_stats import RunStats, OUTCOME_OK
+
+THROTTLE_STATUSES = (429, 503)
+
+# Error classes reported per request
+CLASS_OK = OUTCOME_OK
+CLASS_THROTTLE = 'throttle'
+CLASS_TIMEOUT = 'timeout'
+CLASS_SERVER = 'server'
+CLASS_CLIENT = 'client'
+CLASS_NETWORK = 'network'
+
+DECISION_FIELDS = ('t', 'limit', 'new_limit', 'action', 'reason', 'samples', 'p50', 'p95',
+                   'throttles', 'timeouts', 'errors')
+
+
+def classify_request(status: Optional[int] = None, error: Optional[str] = None) -> str:
+    """Map an HTTP status / exception name to an error class.
+
+    Args:
+        status: HTTP status, None if the request never got a response
+        error: Exception class name for failed requests (e.g. 'TimeoutError')
+    """
+    if error:
+        return CLASS_TIMEOUT if 'Timeout' in error else CLASS_NETWORK
+    if status in THROTTLE_STATUSES:
+        return CLASS_THROTTLE
+    if status is not None and status >= 500:
+        return CLASS_SERVER
+    if status is not None and status >= 400:
+        return CLASS_CLIENT
+    return CLASS_OK
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease controller for the worker limit.
+
+    Workers (through ``SellerCentralClient`` observers) call ``record()`` for every
+    API request, which lands in the shared ``RunStats``. ``run()`` evaluates its
+    sliding request window every few seconds:
+
+    - any throttle response, or timeouts above ``timeout_tolerance``: limit * ``decrease_factor``
+    - enough samples, p95 <= ``target_p95`` and no server errors: limit + ``increase_step``
+    - otherwise: hold
+
+    Only samples taken since the last change are considered, so a single burst
+    of 429s halves the limit once instead of on every tick.
+
+    Usage:
+        controller = AIMDController(concurrency_limit_ref, concurrency_condition, 1, 60,
+                                    run_stats=run_stats, app_logger=app_logger)
+        http_client.add_observer(controller.record)
+        task = asyncio.create_task(controller.run(check_interval=5))
+    """
+
+    def __init__(self, concurrency_limit_ref: dict, concurrency_condition, min_limit: int, max_limit: int,
+                 target_p95: float = 2.0, window_seconds: float = 30.0, min_samples: int = 20,
+                 increase_step: int = 1, decrease_factor: float = 0.5, timeout_tolerance: float = 0.05,
+                 cooldown: float = 5.0, run_stats: RunStats = None, app_logger=None):
+        self.concurrency_limit_ref = concurrency_limit_ref
+        self.concurrency_condition = concurrency_condition
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_p95 = target_p95
+        self.run_stats = run_stats or RunStats(request_window=window_seconds)
+        self.min_samples = min_samples
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.timeout_tolerance = timeout_tolerance
+        self.cooldown = cooldown
+        self.app_logger = app_logger
+
+        self.started_at = time.monotonic()
+        self.last_change = None
+        self.decisions: List[Dict] = []
+
+    def record(self, latency: float, status: Optional[int] = None, error: Optional[str] = None):
+        """Record one finished API request (safe to call from sync code)."""
+        self.run_stats.record_request(latency, classify_request(status, error))
+
+    def window(self, now: float = None) -> Dict:
+        """Latency percentiles and error counts for the samples since the last change."""
+        snapshot = self.run_stats.request_snapshot(now, since=self.last_change)
+        counts = snapshot['counts']
+        return {
+            'samples': snapshot['samples'],
+            'p50': snapshot['p50'],
+            'p95': snapshot['p95'],
+            'throttles': counts.get(CLASS_THROTTLE, 0),
+            'timeouts': counts.get(CLASS_TIMEOUT, 0),
+            'errors': counts.get(CLASS_SERVER, 0) + counts.get(CLASS_NETWORK, 0),
+        }
+
+    def decide(self, now: float = None) -> Dict:
+        """Evaluate the window, apply the new limit to the ref and record the decision."""
+        now = time.monotonic() if now is None else now
+        stats = self.window(now)
+        limit = self.concurrency_limit_ref['value']
+        new_limit, action, reason = limit, 'hold', ''
+
+        timeout_rate = stats['timeouts'] / stats['samples'] if stats['samples'] else 0.0
+        if self.last_change is not None and now - self.last_change < self.cooldown:
+            reason = 'cooldown'
+        elif stats['throttles'] or timeout_rate > self.timeout_tolerance:
+            new_limit = max(self.min_limit, int(limit * self.decrease_factor))
+            action = 'decrease'
+            reason = (f"{stats['throttles']} throttled" if stats['throttles']
+                      else f"{timeout_rate:.0%} timeouts")
+        elif stats['samples'] < self.min_samples:
+            reason = f"{stats['samples']}/{self.min_samples} samples"
+        elif stats['p95'] > self.target_p95:
+            reason = f"p95 {stats['p95']:.2f}s over target"
+        elif stats['errors']:
+            reason = f"{stats['errors']} server/network errors"
+        else:
+            new_limit = min(self.max_limit, limit + self.increase_step)
+            action = 'increase'
+            reason = f"p95 {stats['p95']:.2f}s under target"
+
+        if new_limit == limit and action != 'hold':
+            action = 'hold'
+            reason = f"{reason} (at {'min' if new_limit == self.min_limit else 'max'})"
+        if new_limit != limit:
+            self.concurrency_limit_ref['value'] = new_limit
+            self.last_change = now
+
+        decision = dict(stats, t=round(now - self.started_at, 2), limit=limit, new_limit=new_limit,
+                        action=action, reason=reason)
+        self.decisions.append(decision)
+        return decision
+
+    async def run(self, check_interval: float = 5.0):
+        """Evaluate every ``check_interval`` seconds until cancelled."""
+        if self.app_logger:
+            self.app_logger.info(f"AIMD concurrency enabled: {self.min_limit}-{self.max_limit}, "
+                                 f"target p95 {self.target_p95:.1f}s")
+        while True:
+            await asyncio.sleep(check_interval)
+            decision = self.decide()
+            if decision['action'] == 'hold':
+                continue
+            if self.app_logger:
+                log = self.app_logger.warning if decision['action'] == 'decrease' else self.app_logger.info
+                log(f"AIMD concurrency: {decision['limit']} -> {decision['new_limit']} ({decision['reason']})")
+            async with self.concurrency_condition:
+                self.concurrency_condition.notify_all()
+
+    def summary(self) -> Dict:
+        """Run-level view of the controller for metrics and the job summary."""
+        limits = [d['new_limit'] for d in self.decisions] or [self.concurrency_limit_ref['value']]
+        return {
+            'final_limit': self.concurrency_limit_ref['value'],
+            'peak_limit': max(limits),
+            'lowest_limit': min(limits),
+            'increases': sum(1 for d in self.decisions if d['action'] == 'increase'),
+            'decreases': sum(1 for d in self.decisions if d['action'] == 'decrease'),
+            'requests': self.run_stats.request_totals(),
+        }
+
+    def write_decisions(self, path: str):
+        """Write the decision time series as CSV."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=DECISION_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.decisions)
@@ -0,0 +1,135 @@
+# =======================================================================================
+#                  CONTEXT POOL MODULE - Elastic Playwright BrowserContext Pool
+# =======================================================================================
+# Every BrowserContext keeps a renderer process alive, and renderer memory (RSS) is what
+# caps concurrency on the 7GB runners. Instead of one context per worker for the whole
+# run, workers lease a context per store from this pool:
+#
+# - contexts are created lazily, on the first lease that finds no idle one
+# - idle contexts above the current concurrency limit are closed when it drops
+# - a context is closed and replaced after ``max_uses`` stores to stop memory creep
+# =======================================================================================
+
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+DEFAULT_MAX_USES = 50
+
+
+class PooledContext:
+    """A leased BrowserContext plus its (lazily opened) reusable page."""
+
+    __slots__ = ('context', 'page', 'uses')
+
+    def __init__(self, context):
+        self.context = context
+        self.page = None
+        self.uses = 0
+
+    async def get_page(self):
+        """Return the context's page, opening it on first use."""
+        if self.page is None or self.page.is_closed():
+            self.page = await self.context.new_page()
+        return self.page
+
+
+class BrowserContextPool:
+    """Pool of BrowserContexts sized by ``concurrency_limit_ref``.
+
+    Usage:
+        pool = BrowserContextPool(browser, storage_state, concurrency_limit_ref, app_logger=app_logger)
+        async with pool.lease() as leased:
+            page = await leased.get_page()
+            ...
+        await pool.close()
+    """
+
+    def __init__(self, browser, storage_state: Dict, concurrency_limit_ref: dict,
+                 page_timeout: Optional[int] = None, action_timeout: Optional[int] = None,
+                 max_uses: int = DEFAULT_MAX_USES,
+                 setup: Optional[Callable[[object], Awaitable[None]]] = None, app_logger=None):
+        self.browser = browser
+        self.storage_state = storage_state
+        self.concurrency_limit_ref = concurrency_limit_ref
+        self.page_timeout = page_timeout
+        self.action_timeout = action_timeout
+        self.max_uses = max_uses
+        self.setup = setup
+        self.app_logger = app_logger
+        self.stats = {'created': 0, 'reused': 0, 'recycled': 0, 'trimmed': 0, 'peak_open': 0}
+        self._idle: List[PooledContext] = []
+        self._in_use = 0
+        self._closed = False
+
+    @property
+    def open_count(self) -> int:
+        return len(self._idle) + self._in_use
+
+    async def _create(self) -> PooledContext:
+        context = await self.browser.new_context(storage_state=self.storage_state)
+        if self.page_timeout:
+            context.set_default_navigation_timeout(self.page_timeout)
+        if self.action_timeout:
+            context.set_default_timeout(self.action_timeout)
+        if self.setup:
+            await self.setup(context)
+        self.stats['created'] += 1
+        return PooledContext(context)
+
+    async def _discard(self, entry: PooledContext):
+        try:
+            await entry.context.close()
+        except Exception as e:
+            if self.app_logger:
+                self.app_logger.debug(f"Context pool: error closing context: {e}")
+
+    async def acquire(self) -> PooledContext:
+        """Lease an idle context, or create one if none is idle."""
+        await self.trim()
+        self._in_use += 1
+        self.stats['peak_open'] = max(self.stats['peak_open'], self.open_count)
+        if self._idle:
+            self.stats['reused'] += 1
+            return self._idle.pop()
+        try:
+            return await self._create()
+        except Exception:
+            self._in_use -= 1
+            raise
+
+    async def release(self, entry: PooledContext, discard: bool = False):
+        """Return a leased context. It is closed instead if ``discard`` is set,
+        it has served ``max_uses`` stores, or the pool is closed."""
+        self._in_use -= 1
+        entry.uses += 1
+        if discard or self._closed:
+            await self._discard(entry)
+        elif self.max_uses and entry.uses >= self.max_uses:
+            self.stats['recycled'] += 1
+            await self._discard(entry)
+        else:
+            self._idle.append(entry)
+        await self.trim()
+
+    async def trim(self):
+        """Close idle contexts that the current concurrency limit no longer needs."""
+        allowed = max(0, self.concurrency_limit_ref['value'] - self._in_use)
+        while len(self._idle) > allowed:
+            self.stats['trimmed'] += 1
+            await self._discard(self._idle.pop(0))
+
+    @asynccontextmanager
+    async def lease(self):
+        """``async with pool.lease() as leased`` - acquire and always release."""
+        entry = await self.acquire()
+        try:
+            yield entry
+        finally:
+            await self.release(entry)
+
+    async def close(self):
+        """Close all idle contexts; leased ones are closed when released."""
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for entry in idle:
+            await self._discard(entry)
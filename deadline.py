@@ -0,0 +1,116 @@
+# =======================================================================================
+#                  DEADLINE MODULE - Time Budget and Priority Tiers for a Run
+# =======================================================================================
+# The master workflow is killed at its timeout, wherever it is. With a deadline the run
+# watches its own throughput and, when the stores left will not fit in the time left,
+# drops optional work one tier at a time (stock enrichment, then WTD, then INF for stores
+# below the INF threshold). A reserve is always kept for flushing webhooks and pushing
+# the dashboard; once only the reserve is left, workers stop taking new stores and the
+# run goes straight to reporting what it has.
+# =======================================================================================
+
+import time
+from typing import Optional, Sequence
+
+# Optional work, in the order it is given up
+SHED_STOCK_ENRICHMENT = 'stock_enrichment'
+SHED_WTD = 'wtd'
+SHED_LOW_INF_STORES = 'low_inf_stores'
+SHED_ORDER = (SHED_STOCK_ENRICHMENT, SHED_WTD, SHED_LOW_INF_STORES)
+
+DEFAULT_RESERVE_SECONDS = 300
+
+
+def parse_deadline(value: str, now: float = None) -> float:
+    """Deadline as a ``time.time()`` timestamp.
+
+    Args:
+        value: Minutes from now (``"85"``) or an absolute Unix time (``"@1760000000"``),
+            e.g. computed once at the start of a workflow job and shared by its steps
+
+    Raises:
+        ValueError: If the value is not a number
+    """
+    now = time.time() if now is None else now
+    if value.startswith('@'):
+        return float(value[1:])
+    return now + float(value) * 60
+
+
+class DeadlineBudget:
+    """Time budget for one process, with throughput-based shedding of ``tiers``.
+
+    Workers call ``store_done(remaining)`` after every store and check
+    ``is_shed(tier)`` before optional work and ``expired()`` before taking the
+    next store.
+
+    Usage:
+        deadline = DeadlineBudget(parse_deadline(args.deadline), tiers=(SHED_WTD,), app_logger=app_logger)
+        ...
+        if not deadline.is_shed(SHED_WTD):
+            ...  # fetch WTD
+        deadline.store_done(job_queue.qsize())
+    """
+
+    def __init__(self, deadline: float, tiers: Sequence[str] = SHED_ORDER,
+                 reserve_seconds: float = DEFAULT_RESERVE_SECONDS, min_samples: int = 5,
+                 cooldown: float = 60.0, app_logger=None, clock=time.time):
+        self.deadline = deadline
+        self.tiers = [tier for tier in SHED_ORDER if tier in tiers]
+        self.reserve_seconds = reserve_seconds
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.app_logger = app_logger
+        self.clock = clock
+        self.shed = []
+        self.done = 0
+        self.skipped = 0
+        # Throughput is measured from the last shed, so each tier gets judged on its own effect
+        self._mark = (clock(), 0)
+
+    def remaining(self, now: float = None) -> float:
+        """Seconds left for collection, i.e. before the reporting reserve."""
+        now = self.clock() if now is None else now
+        return self.deadline - self.reserve_seconds - now
+
+    def expired(self, now: float = None) -> bool:
+        """True once only the reporting reserve is left - take no new stores."""
+        return self.remaining(now) <= 0
+
+    def is_shed(self, tier: str) -> bool:
+        return tier in self.shed
+
+    def projected(self, remaining_stores: int, now: float = None) -> Optional[float]:
+        """Seconds to finish ``remaining_stores`` at the throughput since the last shed
+        (None until ``min_samples`` stores have finished)."""
+        now = self.clock() if now is None else now
+        mark_time, mark_done = self._mark
+        finished = self.done - mark_done
+        if finished < self.min_samples or now <= mark_time:
+            return None
+        return remaining_stores / (finished / (now - mark_time))
+
+    def store_done(self, remaining_stores: int, now: float = None) -> Optional[str]:
+        """Record a finished store and shed the next tier if the rest won't fit.
+
+        Returns:
+            The tier shed by this call, if any
+        """
+        now = self.clock() if now is None else now
+        self.done += 1
+        if len(self.shed) == len(self.tiers) or now - self._mark[0] < self.cooldown:
+            return None
+        projected = self.projected(remaining_stores, now)
+        if projected is None or projected <= self.remaining(now):
+            return None
+        tier = self.tiers[len(self.shed)]
+        self.shed.append(tier)
+        self._mark = (now, self.done)
+        if self.app_logger:
+            self.app_logger.warning(f"Deadline: {remaining_stores} stores need ~{projected / 60:.0f} min but "
+                                    f"{max(0.0, self.remaining(now)) / 60:.0f} min are left - dropping {tier}")
+        return tier
+
+    def summary(self) -> dict:
+        return {'shed': list(self.shed), 'skipped_stores': self.skipped,
+                'seconds_left': round(self.deadline - self.clock())}
@@ -5,10 +5,12 @@ import asyncio
 import re
 import os
 import csv
+import math
+import time
 import base64
 import io
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from asyncio import Queue, Lock, Condition
 from playwright.async_api import async_playwright, Page, TimeoutError, expect, Browser
 import qrcode
@@ -27,6 +29,18 @@ from utils import (
 )
 from auth import check_if_login_needed, perform_login_and_otp, prime_master_session
 from workers import auto_concurrency_manager
+from run_stats import RunStats
+from context_pool import BrowserContextPool, DEFAULT_MAX_USES
+from sharding import (partition_stores, start_shard_processes, drain_shard_results, RECORD, DONE,
+                      parse_shard_spec, shard_artifact_path, shard_config, write_shard_artifact,
+                      read_shard_artifacts, missing_shards)
+from run_journal import RunJournal, journal_key
+from deadline import DeadlineBudget, parse_deadline, SHED_STOCK_ENRICHMENT, SHED_LOW_INF_STORES, DEFAULT_RESERVE_SECONDS
+from store_metrics import metric_value
+from chat_client import get_chat_client, close_chat_client, configure as configure_chat_client
+from loop_monitor import start_loop_monitor, stop_loop_monitor, phase
+from card_packer import pack_sections, json_size, CONTINUED, DEFAULT_MAX_BYTES
+import codec
 from stock_enrichment import enrich_items_with_stock_data
 from date_range import get_date_time_range_from_config, apply_date_time_range
 
@@ -48,7 +62,11 @@ APPS_SCRIPT_URL = config.get('apps_script_webhook_url')  # Optional - for intera
 STORAGE_STATE = 'state.json'
 OUTPUT_DIR = 'output'
 PAGE_TIMEOUT = config.get('page_timeout_ms', 30000)
+FAST_CODEC = codec.configure(config.get('use_fast_codec', False))  # orjson/uvloop when installed
 STORE_PREFIX_RE = re.compile(r"^morrisons\s*-\s*", re.I)
+configure_chat_client(rate=config.get('chat_rate_per_space', 1.0), burst=config.get('chat_burst', 1))
+CHAT_CARD_MAX_BYTES = config.get('chat_card_max_bytes', DEFAULT_MAX_BYTES)  # Fill chat cards up to this size
+LOOP_MONITOR_THRESHOLD = config.get('loop_monitor_threshold_ms', 100) / 1000  # Lag or callback time that counts as a stall
 
 # Morrisons API Config
 MORRISONS_API_KEY = config.get('morrisons_api_key')
@@ -78,6 +96,10 @@ CPU_LOWER_THRESHOLD = AUTO_CONF.get('cpu_lower_threshold', 65)
 MEM_UPPER_THRESHOLD = AUTO_CONF.get('mem_upper_threshold', 90)
 CHECK_INTERVAL = AUTO_CONF.get('check_interval_seconds', 3)
 COOLDOWN_SECONDS = AUTO_CONF.get('cooldown_seconds', 5)
+CONTEXT_RECYCLE_AFTER = config.get('context_recycle_after', DEFAULT_MAX_USES)  # Stores per browser context
+DEADLINE_RESERVE_SECONDS = config.get('deadline_reserve_seconds', DEFAULT_RESERVE_SECONDS)  # Kept for reporting
+DEADLINE_INF_THRESHOLD = config.get('deadline_inf_threshold', 2.0)  # INF % below which a store can be dropped
+SUBMISSIONS_JSON_LOG = os.path.join(OUTPUT_DIR, 'submissions.jsonl')  # Written by the performance scraper
 
 INF_PAGE_URL = "https://sellercentral.amazon.co.uk/snow-inventory/inventoryinsights/ref=xx_infr_dnav_xx"
 
@@ -224,7 +246,7 @@ async def _extract_from_api(store_name: str, top_n: int, captured_api_data: dict
                     'product_url': prod.get('productUrl') or prod.get('url') or ''
                 }
     
-    app_logger.debug(f"[{store_name}] Populated product_info for {len(product_info)} SKUs from ItemData API")
+    app_logger.debug("[%s] Populated product_info for %d SKUs from ItemData API", store_name, len(product_info))
     
     # Sort by INF count (highest first) and take top N
     sorted_items = sorted(items, key=lambda x: x.get('infCount', 0), reverse=True)
@@ -347,7 +369,8 @@ async def _extract_from_html(page: Page, store_name: str, top_n: int = 10) -> li
         await _save_screenshot(page, f"error_inf_{sanitize_store_name(store_name, STORE_PREFIX_RE)}", OUTPUT_DIR, LOCAL_TIMEZONE, app_logger)
         return []
 
-async def process_store_task(context, store_info, results_list, results_lock, failure_lock, failure_timestamps, date_range_func=None, action_timeout=20000, bearer_token=None, top_n=10):
+async def process_store_task(context, store_info, results_list, results_lock, run_stats: RunStats, date_range_func=None, action_timeout=20000, bearer_token=None, top_n=10,
+                             journal: RunJournal = None, deadline: DeadlineBudget = None):
     merchant_id = store_info['merchant_id']
     marketplace_id = store_info['marketplace_id']
     store_name = store_info['store_name']
@@ -355,6 +378,7 @@ async def process_store_task(context, store_info, results_list, results_lock, fa
     inf_rate = store_info.get('inf_rate', 'N/A')
     
     page = None
+    store_start = time.monotonic()
     # Dictionary to capture API responses
     captured_api_data = {}
     
@@ -369,14 +393,14 @@ async def process_store_task(context, store_info, results_list, results_lock, fa
                     content_type = response.headers.get('content-type', '')
                     if 'json' in content_type:
                         captured_api_data['GetAllByAsin'] = await response.json()
-                        app_logger.debug(f"[{store_name}] Captured GetAllByAsin API response")
+                        app_logger.debug("[%s] Captured GetAllByAsin API response", store_name)
                 elif '/item/data' in url:
                     content_type = response.headers.get('content-type', '')
                     if 'json' in content_type:
                         captured_api_data['ItemData'] = await response.json()
-                        app_logger.debug(f"[{store_name}] Captured ItemData API response")
+                        app_logger.debug("[%s] Captured ItemData API response", store_name)
             except Exception as e:
-                app_logger.debug(f"[{store_name}] Error capturing API response: {e}")
+                app_logger.debug("[%s] Error capturing API response: %s", store_name, e)
         
         page.on("response", capture_api_response)
         
@@ -427,12 +451,14 @@ async def process_store_task(context, store_info, results_list, results_lock, fa
         items = await navigate_and_extract_inf(page, store_name, top_n, captured_api_data)
         
         # Enrich with stock data if enabled and we have a store number
-        if ENRICH_STOCK_DATA and store_number and items and MORRISONS_API_KEY:
+        if (ENRICH_STOCK_DATA and store_number and items and MORRISONS_API_KEY
+                and not (deadline and deadline.is_shed(SHED_STOCK_ENRICHMENT))):
             try:
                 app_logger.info(f"[{store_name}] Enriching {len(items)} items with stock data...")
-                token_status = "valid token" if bearer_token else "NO TOKEN"
-                token_preview = f"{bearer_token[:20]}..." if bearer_token and len(bearer_token) > 20 else "None"
-                app_logger.debug(f"[{store_name}] Bearer token status: {token_status} (preview: {token_preview})")
+                if app_logger.isEnabledFor(logging.DEBUG):
+                    token_status = "valid token" if bearer_token else "NO TOKEN"
+                    token_preview = f"{bearer_token[:20]}..." if bearer_token and len(bearer_token) > 20 else "None"
+                    app_logger.debug("[%s] Bearer token status: %s (preview: %s)", store_name, token_status, token_preview)
                 items = await enrich_items_with_stock_data(
                     items, 
                     store_number, 
@@ -444,11 +470,13 @@ async def process_store_task(context, store_info, results_list, results_lock, fa
         
         async with results_lock:
             results_list.append((store_name, store_number, items, inf_rate))
+        if journal:
+            journal.append([store_name, store_number, items, inf_rate])
+        run_stats.record_latency('inf_store', time.monotonic() - store_start, store=store_name)
             
     except Exception as e:
         app_logger.error(f"Failed to process {store_name}: {e}")
-        async with failure_lock:
-            failure_timestamps.append(asyncio.get_event_loop().time())
+        run_stats.record_failure(store_name)
     finally:
         if page:
             try:
@@ -456,24 +484,31 @@ async def process_store_task(context, store_info, results_list, results_lock, fa
             except:
                 pass
 
-async def worker(worker_id: int, browser: Browser, storage_state: Dict, job_queue: Queue, 
+async def block_heavy_resources(context):
+    """Block images, styles, fonts and media on a new context to speed up page loads."""
+    await context.route("**/*", lambda route: route.abort() if route.request.resource_type in ("image", "stylesheet", "font", "media") else route.continue_())
+
+async def worker(worker_id: int, context_pool: BrowserContextPool, job_queue: Queue, 
                  results_list: List, results_lock: Lock,
                  concurrency_limit_ref: dict, active_workers_ref: dict, concurrency_condition: Condition,
-                 failure_lock: Lock, failure_timestamps: List, date_range_func=None, action_timeout=20000, bearer_token=None, top_n=10):
+                 run_stats: RunStats, date_range_func=None, action_timeout=20000, bearer_token=None, top_n=10,
+                 journal: RunJournal = None, deadline: DeadlineBudget = None, low_priority=frozenset()):
     
     app_logger.info(f"[Worker-{worker_id}] Starting...")
-    context = None
     try:
-        context = await browser.new_context(storage_state=storage_state)
-        # Block resources to speed up
-        await context.route("**/*", lambda route: route.abort() if route.request.resource_type in ("image", "stylesheet", "font", "media") else route.continue_())
-        
         while True:
+            if deadline and deadline.expired():
+                break  # the rest of the queue is left for reporting time
             try:
                 store_info = job_queue.get_nowait()
             except asyncio.QueueEmpty:
                 break
             
+            if deadline and deadline.is_shed(SHED_LOW_INF_STORES) and store_info['store_name'] in low_priority:
+                deadline.skipped += 1
+                job_queue.task_done()
+                continue
+            
             # Enforce Concurrency Limit
             async with concurrency_condition:
                 while active_workers_ref['value'] >= concurrency_limit_ref['value']:
@@ -481,7 +516,8 @@ async def worker(worker_id: int, browser: Browser, storage_state: Dict, job_queu
                 active_workers_ref['value'] += 1
             
             try:
-                await process_store_task(context, store_info, results_list, results_lock, failure_lock, failure_timestamps, date_range_func, action_timeout, bearer_token, top_n)
+                async with context_pool.lease() as leased:
+                    await process_store_task(leased.context, store_info, results_list, results_lock, run_stats, date_range_func, action_timeout, bearer_token, top_n, journal, deadline)
             except Exception as e:
                 app_logger.error(f"[Worker-{worker_id}] Error processing store: {e}")
             finally:
@@ -489,14 +525,11 @@ async def worker(worker_id: int, browser: Browser, storage_state: Dict, job_queu
                     active_workers_ref['value'] -= 1
                     concurrency_condition.notify_all()
                 job_queue.task_done()
+                if deadline:
+                    deadline.store_done(job_queue.qsize())
     except Exception as e:
         app_logger.error(f"[Worker-{worker_id}] Crashed: {e}")
     finally:
-        if context:
-            try:
-                await context.close()
-            except:
-                pass
         app_logger.info(f"[Worker-{worker_id}] Finished.")
 
 def generate_qr_code_data_url(sku: str) -> str:
@@ -585,7 +618,7 @@ def push_inf_to_dashboard(results_list: List, report_date: str = None):
         try:
             get_response = requests.get(gist_url, headers=headers, timeout=15)
             if get_response.status_code == 200:
-                gist_content = get_response.json()
+                gist_content = codec.loads(get_response.content)
                 # Try both filenames for backwards compatibility
                 file_content = None
                 if 'inf_data.json' in gist_content.get('files', {}):
@@ -595,7 +628,7 @@ def push_inf_to_dashboard(results_list: List, report_date: str = None):
                 
                 if file_content:
                     try:
-                        fetched_data = json.loads(file_content)
+                        fetched_data = codec.loads(file_content)
                         # Merge fetched data (preserve existing performance and INF data)
                         existing_data['performance'] = fetched_data.get('performance', {})
                         existing_data['inf_items'] = fetched_data.get('inf_items', {})
@@ -619,9 +652,9 @@ def push_inf_to_dashboard(results_list: List, report_date: str = None):
                                 # Retry fetching the now-recovered data
                                 get_response2 = requests.get(gist_url, headers=headers, timeout=15)
                                 if get_response2.status_code == 200:
-                                    gist_content2 = get_response2.json()
+                                    gist_content2 = codec.loads(get_response2.content)
                                     file_content2 = gist_content2['files']['dashboard_data.json'].get('content', '{}')
-                                    fetched_data = json.loads(file_content2)
+                                    fetched_data = codec.loads(file_content2)
                                     existing_data['performance'] = fetched_data.get('performance', {})
                                     existing_data['inf_items'] = fetched_data.get('inf_items', {})
                                     existing_data['metadata'] = fetched_data.get('metadata', existing_data['metadata'])
@@ -667,9 +700,9 @@ def push_inf_to_dashboard(results_list: List, report_date: str = None):
         
         # Validate JSON before updating gist
         try:
-            json_content = json.dumps(existing_data, indent=2)
+            json_content = codec.dumps(existing_data, indent=2)
             # Try parsing it back to ensure it's valid
-            json.loads(json_content)
+            codec.loads(json_content)
         except (TypeError, ValueError) as e:
             app_logger.error(f"ERROR: Generated JSON is invalid: {e}")
             app_logger.error("   Product descriptions may contain unescaped quotes")
@@ -685,7 +718,8 @@ def push_inf_to_dashboard(results_list: List, report_date: str = None):
             }
         }
         
-        update_response = requests.patch(gist_url, headers=headers, json=update_payload, timeout=15)
+        update_response = requests.patch(gist_url, headers={**headers, 'Content-Type': 'application/json'},
+                                         data=codec.dumps(update_payload).encode('utf-8'), timeout=15)
         if update_response.status_code == 200:
             app_logger.info(f"✅ Dashboard Gist updated ({len(existing_data['inf_items'])} INF days, {len(existing_data['performance'])} perf days)")
             return True
@@ -708,17 +742,12 @@ async def send_inf_report(store_data, network_top_10, skip_network_report=False,
         top_n: Number of top items to show per store (5, 10, 25)
         csv_urls: Optional dict with CSV download URLs (keys: 'store_details', 'network_summary')
     """
-    import aiohttp
-    import ssl
-    import certifi
-    
     if not CHAT_WEBHOOK_URL:
         app_logger.warning("No Chat Webhook URL configured.")
         return
 
-    ssl_context = ssl.create_default_context(cafile=certifi.where())
-    connector = aiohttp.TCPConnector(ssl=ssl_context)
-    timeout = aiohttp.ClientTimeout(total=30)
+    # Cards are paced by the INF space's rate limit rather than fixed sleeps
+    chat_client = get_chat_client()
     
     # Message 1: Network Wide Top 10 (skip if requested)
     if not skip_network_report:
@@ -886,228 +915,618 @@ async def send_inf_report(store_data, network_top_10, skip_network_report=False,
         }
         
         # Send network-wide report
-        try:
-            async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
-                async with session.post(CHAT_WEBHOOK_URL, json=payload_network) as resp:
-                    if resp.status != 200:
-                        app_logger.error(f"Failed to send network INF report: {await resp.text()}")
-                    else:
-                        app_logger.info("Network-wide INF report sent successfully.")
-        except Exception as e:
-            app_logger.error(f"Error sending network INF report: {e}")
-            return
+        if await chat_client.post(CHAT_WEBHOOK_URL, payload_network, "network INF report", app_logger):
+            app_logger.info("Network-wide INF report sent successfully.")
     
     # Message 2+: All Stores (sorted alphabetically)
     sorted_store_data = sorted(store_data, key=lambda x: x[0])
     stores_with_data = [(name, num, items, inf_rate) for name, num, items, inf_rate in sorted_store_data if items]
     
-    # Dynamic batch size based on items shown
-    # Reduced batch sizes due to added API details increasing payload size
-    if top_n <= 5:
-        BATCH_SIZE = 15  # Was 30
-    elif top_n <= 10:
-        BATCH_SIZE = 10  # Was 20
-    else:  # top_n >= 25
-        BATCH_SIZE = 5   # Was 15
-    
-    batches = [stores_with_data[i:i + BATCH_SIZE] for i in range(0, len(stores_with_data), BATCH_SIZE)]
-    
-    for batch_num, batch in enumerate(batches, 1):
-        sections_stores = []
-        
-        for store_name, store_number, items, inf_rate in batch:
-            widgets_store = []
-            clean_store_name = sanitize_store_name(store_name, STORE_PREFIX_RE)
-            total_inf = sum(item['inf'] for item in items)
+    # One collapsible section per store, packed into as few cards as fit the message size limit
+    sections_stores = []
+    for store_name, store_number, items, inf_rate in stores_with_data:
+        widgets_store = []
+        clean_store_name = sanitize_store_name(store_name, STORE_PREFIX_RE)
+        total_inf = sum(item['inf'] for item in items)
+        
+        # Header with INF Rate
+        inf_display = f"INF: {inf_rate}" if inf_rate != 'N/A' else f"Total INF: {total_inf}"
+        section_header = f"{clean_store_name} | {inf_display}"
+        
+        # Build product list text (no images/QR codes)
+        product_lines = []
+        for item in items[:top_n]:
+            # Check for discontinued/inactive products first
+            alerts = []
+            if item.get('product_status') and item.get('product_status') != 'A':
+                alerts.append("⚠️ DISCONTINUED")
+            elif item.get('commercially_active') == 'No':
+                alerts.append("⚠️ NOT ACTIVE")
             
-            # Header with INF Rate
-            inf_display = f"INF: {inf_rate}" if inf_rate != 'N/A' else f"Total INF: {total_inf}"
-            section_header = f"{clean_store_name} | {inf_display}"
+            line = f"• <b>{item['name']}</b>"
+            line += f" - <b>{item['inf']}</b> INF"
+            line += f" (SKU: {item['sku']})"
             
-            # Build product list text (no images/QR codes)
-            product_lines = []
-            for item in items[:top_n]:
-                # Check for discontinued/inactive products first
-                alerts = []
-                if item.get('product_status') and item.get('product_status') != 'A':
-                    alerts.append("⚠️ DISCONTINUED")
-                elif item.get('commercially_active') == 'No':
-                    alerts.append("⚠️ NOT ACTIVE")
-                
-                line = f"• <b>{item['name']}</b>"
-                line += f" - <b>{item['inf']}</b> INF"
-                line += f" (SKU: {item['sku']})"
-                
-                # Add price if available
-                if item.get('price') is not None:
-                    line += f" - £{item['price']:.2f}"
-                
-                # Add alerts at end of main line
-                if alerts:
-                    line += f" {' '.join(alerts)}"
-                
-                product_lines.append(line)
-                
-                # Add API details + stock + location
-                details = []
-                
-                # Amazon API metrics
-                if item.get('orders_impacted'):
-                    details.append(f"Impact: {item['orders_impacted']}")
-                if item.get('picking_window'):
-                    details.append(f"Window: {item['picking_window']}")
-                if item.get('replacement_percent') is not None:
-                    details.append(f"Repl: {item['replacement_percent']}%")
-                
-                # Stock status with freshness
-                if item.get('stock_on_hand') is not None:
-                    try:
-                        # Convert to int (comes from CSV as string)
-                        qty = int(item.get('stock_on_hand'))
-                        unit = item.get('stock_unit', 'EA')
-                        
-                        # Only show unit if not EA (99% are EA)
-                        if unit == 'EA':
-                            stock_text = f"Stock: {qty}"
-                        else:
-                            stock_text = f"Stock: {qty} {unit}"
-                        
-                        # Add freshness if available
-                        if item.get('stock_last_updated'):
-                            try:
-                                updated = datetime.fromisoformat(item['stock_last_updated'].replace('Z', '+00:00'))
-                                from datetime import timezone
-                                hours_ago = (datetime.now(timezone.utc) - updated).total_seconds() / 3600
-                                if hours_ago < 24:
-                                    stock_text += f" ({int(hours_ago)}h ago)"
-                                elif hours_ago < 168:  # Less than 7 days
-                                    stock_text += f" ({int(hours_ago/24)}d ago)"
-                            except:
-                                pass
-                        
-                        details.append(stock_text)
-                    except (ValueError, TypeError):
-                        # Skip if stock_on_hand can't be converted to int
-                        pass
-                
-                # Location info
-                if item.get('std_location'):
-                    details.append(f"📍 {item['std_location']}")
-                if details:
-                    # Add details in grey text
-                    product_lines.append(f"  <font color=\"#666666\">{' | '.join(details)}</font>")
+            # Add price if available
+            if item.get('price') is not None:
+                line += f" - £{item['price']:.2f}"
             
-            # Add product list as single text paragraph
-            if product_lines:
-                widgets_store.append({
-                    "textParagraph": {
-                        "text": "\n".join(product_lines)
-                    }
-                })
+            # Add alerts at end of main line
+            if alerts:
+                line += f" {' '.join(alerts)}"
             
-            # Build aggregated link to external app using inventory_system_url from config
-            # Format: https://app.218.team/#/amazon/SKU1:INF1,SKU2:INF2?locationId=066
-            inventory_url = config.get('inventory_system_url', '')
-            if store_number and items and inventory_url:
-                # Extract base URL (e.g., https://app.218.team from https://app.218.team/assistant/{sku}...)
-                base_url = inventory_url.split('/assistant/')[0] if '/assistant/' in inventory_url else ''
-                
-                if base_url:
-                    # Build product string: SKU1:INF1,SKU2:INF2,...
-                    product_params = ",".join([f"{item['sku']}:{item['inf']}" for item in items[:top_n]])
-                    analysis_url = f"{base_url}/#/amazon/{product_params}?locationId={store_number}"
+            product_lines.append(line)
+            
+            # Add API details + stock + location
+            details = []
+            
+            # Amazon API metrics
+            if item.get('orders_impacted'):
+                details.append(f"Impact: {item['orders_impacted']}")
+            if item.get('picking_window'):
+                details.append(f"Window: {item['picking_window']}")
+            if item.get('replacement_percent') is not None:
+                details.append(f"Repl: {item['replacement_percent']}%")
+            
+            # Stock status with freshness
+            if item.get('stock_on_hand') is not None:
+                try:
+                    # Convert to int (comes from CSV as string)
+                    qty = int(item.get('stock_on_hand'))
+                    unit = item.get('stock_unit', 'EA')
                     
-                    # Add buttons: View Products and Auto PDF
-                    widgets_store.append({
-                        "buttonList": {
-                            "buttons": [
-                                {
-                                    "text": f"📊 View All {len(items[:top_n])} Products",
-                                    "onClick": {
-                                        "openLink": {
-                                            "url": analysis_url
-                                        }
+                    # Only show unit if not EA (99% are EA)
+                    if unit == 'EA':
+                        stock_text = f"Stock: {qty}"
+                    else:
+                        stock_text = f"Stock: {qty} {unit}"
+                    
+                    # Add freshness if available
+                    if item.get('stock_last_updated'):
+                        try:
+                            updated = datetime.fromisoformat(item['stock_last_updated'].replace('Z', '+00:00'))
+                            from datetime import timezone
+                            hours_ago = (datetime.now(timezone.utc) - updated).total_seconds() / 3600
+                            if hours_ago < 24:
+                                stock_text += f" ({int(hours_ago)}h ago)"
+                            elif hours_ago < 168:  # Less than 7 days
+                                stock_text += f" ({int(hours_ago/24)}d ago)"
+                        except:
+                            pass
+                    
+                    details.append(stock_text)
+                except (ValueError, TypeError):
+                    # Skip if stock_on_hand can't be converted to int
+                    pass
+            
+            # Location info
+            if item.get('std_location'):
+                details.append(f"📍 {item['std_location']}")
+            if details:
+                # Add details in grey text
+                product_lines.append(f"  <font color=\"#666666\">{' | '.join(details)}</font>")
+        
+        # Add product list as single text paragraph
+        if product_lines:
+            widgets_store.append({
+                "textParagraph": {
+                    "text": "\n".join(product_lines)
+                }
+            })
+        
+        # Build aggregated link to external app using inventory_system_url from config
+        # Format: https://app.218.team/#/amazon/SKU1:INF1,SKU2:INF2?locationId=066
+        inventory_url = config.get('inventory_system_url', '')
+        if store_number and items and inventory_url:
+            # Extract base URL (e.g., https://app.218.team from https://app.218.team/assistant/{sku}...)
+            base_url = inventory_url.split('/assistant/')[0] if '/assistant/' in inventory_url else ''
+            
+            if base_url:
+                # Build product string: SKU1:INF1,SKU2:INF2,...
+                product_params = ",".join([f"{item['sku']}:{item['inf']}" for item in items[:top_n]])
+                analysis_url = f"{base_url}/#/amazon/{product_params}?locationId={store_number}"
+                
+                # Add buttons: View Products and Auto PDF
+                widgets_store.append({
+                    "buttonList": {
+                        "buttons": [
+                            {
+                                "text": f"📊 View All {len(items[:top_n])} Products",
+                                "onClick": {
+                                    "openLink": {
+                                        "url": analysis_url
                                     }
-                                },
-                                {
-                                    "text": "📄 Auto PDF",
-                                    "onClick": {
-                                        "openLink": {
-                                            "url": f"{analysis_url}&pdf"
-                                        }
+                                }
+                            },
+                            {
+                                "text": "📄 Auto PDF",
+                                "onClick": {
+                                    "openLink": {
+                                        "url": f"{analysis_url}&pdf"
                                     }
                                 }
-                            ]
-                        }
-                    })
-            
-            # Add collapsible section
-            sections_stores.append({
-                "header": section_header,
-                "collapsible": True,
-                "uncollapsibleWidgetsCount": 0,
-                "widgets": widgets_store
-            })
+                            }
+                        ]
+                    }
+                })
         
-        payload_stores = {
+        # Add collapsible section
+        sections_stores.append({
+            "header": section_header,
+            "collapsible": True,
+            "uncollapsibleWidgetsCount": 0,
+            "widgets": widgets_store
+        })
+    
+    def build_store_card(sections, batch_num, total):
+        stores_shown = len({section['header'].removesuffix(CONTINUED) for section in sections})
+        return {
             "cardsV2": [{
                 "cardId": f"inf-stores-{batch_num}-{int(datetime.now().timestamp())}",
                 "card": {
                     "header": {
-                        "title": f"{title_prefix}INF by Store - {datetime.now(LOCAL_TIMEZONE).strftime('%H:%M')} - Part {batch_num}/{len(batches)}",
-                        "subtitle": f"Showing {len(batch)} stores",
+                        "title": f"{title_prefix}INF by Store - {datetime.now(LOCAL_TIMEZONE).strftime('%H:%M')} - Part {batch_num}/{total}",
+                        "subtitle": f"Showing {stores_shown} stores",
                         "imageUrl": "https://cdn-icons-png.flaticon.com/512/869/869636.png",
                         "imageType": "CIRCLE"
                     },
-                    "sections": sections_stores,
+                    "sections": sections,
                 },
             }]
         }
+    
+    batches = pack_sections(sections_stores, CHAT_CARD_MAX_BYTES, overhead=json_size(build_store_card([], 999, 999)))
+    app_logger.info(f"Packed {len(stores_with_data)} stores into {len(batches)} INF cards")
+    
+    for batch_num, batch in enumerate(batches, 1):
+        # Retries, Retry-After and pacing between batches are handled by the chat client
+        if await chat_client.post(CHAT_WEBHOOK_URL, build_store_card(batch, batch_num, len(batches)),
+                                  f"INF store batch {batch_num}", app_logger):
+            app_logger.info(f"Store batch {batch_num}/{len(batches)} sent successfully.")
+
+
+def load_store_inf_rates(path: str) -> Dict[str, float]:
+    """Latest INF % per store from the performance scraper's JSONL submission log."""
+    rates = {}
+    if not os.path.exists(path):
+        return rates
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = codec.loads(line)
+            except ValueError:
+                continue
+            if entry.get('store'):
+                rates[entry['store']] = metric_value(entry, 'inf')
+    return rates
+
+
+def fetch_run_bearer_token() -> str:
+    """Bearer token for stock enrichment, fetched fresh for each run (tokens expire frequently)."""
+    bearer_token_for_run = MORRISONS_BEARER_TOKEN  # Start with global token
+    if ENRICH_STOCK_DATA and MORRISONS_BEARER_TOKEN_URL:
+        app_logger.info("Fetching fresh bearer token for this INF run...")
+        from stock_enrichment import fetch_bearer_token_from_gist
+        fresh_token = fetch_bearer_token_from_gist(MORRISONS_BEARER_TOKEN_URL)
+        if fresh_token:
+            bearer_token_for_run = fresh_token
+            token_preview = f"{fresh_token[:20]}..." if len(fresh_token) > 20 else fresh_token
+            app_logger.info(f"Fresh bearer token successfully loaded (preview: {token_preview})")
+        else:
+            app_logger.warning("Failed to fetch fresh bearer token - will use global token (may be expired)")
+    
+    # Log final token status for debugging
+    if bearer_token_for_run:
+        app_logger.info(f"Bearer token is set and ready (length: {len(bearer_token_for_run)})")
+    else:
+        app_logger.warning("WARNING: Bearer token is None! Stock enrichment will fail with 401 errors")
+    return bearer_token_for_run
+
+
+def open_inf_journal(stores: List[Dict], get_date_range, resume: bool) -> Tuple[RunJournal, List, List[Dict]]:
+    """Open the INF journal for the date range.
+
+    Returns:
+        Tuple of (journal, results resumed from an interrupted run, stores still to process)
+    """
+    journal = RunJournal.open('inf', journal_key(get_date_range(), datetime.now(LOCAL_TIMEZONE).strftime('%Y%m%d')),
+                              resume=resume, app_logger=app_logger)
+    resumed = [tuple(record) for record in journal.records]
+    done = {result[0] for result in resumed}
+    return journal, resumed, [store for store in stores if store['store_name'] not in done]
+
+
+def prioritise_inf_stores(stores: List[Dict]) -> Tuple[List[Dict], frozenset]:
+    """Order stores highest latest INF % first for a deadline run.
+
+    Returns:
+        Tuple of (ordered stores, names of stores below ``DEADLINE_INF_THRESHOLD`` that may be dropped)
+    """
+    inf_rates = load_store_inf_rates(SUBMISSIONS_JSON_LOG)
+    stores = sorted(stores, key=lambda s: inf_rates.get(s['store_name'], float('inf')), reverse=True)
+    low_priority = frozenset(name for name, rate in inf_rates.items() if rate < DEADLINE_INF_THRESHOLD)
+    app_logger.info(f"Deadline set: {len(low_priority)} stores below {DEADLINE_INF_THRESHOLD}% INF can be dropped")
+    return stores, low_priority
+
+
+async def collect_inf_results(browser: Browser, storage_state: Dict, stores: List[Dict], get_date_range,
+                              action_timeout: int, bearer_token: str, top_n: int, share: int = 1,
+                              journal: RunJournal = None, deadline: float = None,
+                              low_priority=frozenset(), shared_concurrency: Tuple = None):
+    """Run the INF worker pool over ``stores``.
+
+    Args:
+        share: Number of processes the run is split across; worker count and
+            concurrency bounds are divided by it
+        journal: Optional RunJournal each store result is appended to
+        deadline: Optional Unix time to finish by. Stock enrichment and then the
+            ``low_priority`` stores are dropped if the stores left won't fit.
+        low_priority: Names of stores that may be dropped for the deadline
+        shared_concurrency: Optional (concurrency_limit_ref, active_workers_ref,
+            concurrency_condition) of another worker pool in this process. INF
+            workers then take slots from that pool's budget, which is tuned by its
+            own controller, instead of starting their own.
+
+    Returns:
+        Tuple of (results list of (store_name, store_number, items, inf_rate), RunStats)
+    """
+    job_queue = Queue()
+    for store in stores:
+        job_queue.put_nowait(store)
         
-        # Send this batch with retry logic for rate limits
-        max_retries = 3
-        retry_delay = 2.0  # Start with 2 seconds
+    results_list = []
+    results_lock = Lock()
+    
+    # Concurrency State
+    max_concurrency = max(1, math.ceil(AUTO_MAX_CONCURRENCY / share))
+    if shared_concurrency:
+        concurrency_limit_ref, active_workers_ref, concurrency_condition = shared_concurrency
+    else:
+        concurrency_limit_ref = {'value': max(1, math.ceil(INITIAL_CONCURRENCY / share))}
+        active_workers_ref = {'value': 0}
+        concurrency_condition = Condition()
+    last_concurrency_change_ref = {'value': 0.0}
+    
+    run_stats = RunStats()
+    budget = None
+    if deadline:
+        budget = DeadlineBudget(deadline, tiers=(SHED_STOCK_ENRICHMENT, SHED_LOW_INF_STORES),
+                                reserve_seconds=DEADLINE_RESERVE_SECONDS, app_logger=app_logger)
+    # Contexts are created per store on demand and trimmed when the limit drops
+    context_pool = BrowserContextPool(browser, storage_state, concurrency_limit_ref,
+                                      max_uses=CONTEXT_RECYCLE_AFTER, setup=block_heavy_resources,
+                                      app_logger=app_logger)
+    
+    # Start Auto-concurrency Manager
+    manager_task = None
+    if AUTO_ENABLED and not shared_concurrency:
+        manager_task = asyncio.create_task(auto_concurrency_manager(
+            concurrency_limit_ref, last_concurrency_change_ref, AUTO_ENABLED, min(AUTO_MIN_CONCURRENCY, max_concurrency),
+            max_concurrency, CPU_UPPER_THRESHOLD, CPU_LOWER_THRESHOLD, MEM_UPPER_THRESHOLD,
+            CHECK_INTERVAL, COOLDOWN_SECONDS, run_stats,
+            concurrency_condition, app_logger
+        ))
+    
+    # Launch Workers
+    num_workers = min(max_concurrency, len(stores))
+    app_logger.info(f"Launching {num_workers} workers (Initial Concurrency Limit: {concurrency_limit_ref['value']})...")
+    
+    workers = [
+        asyncio.create_task(worker(i+1, context_pool, job_queue, results_list, results_lock,
+                                   concurrency_limit_ref, active_workers_ref, concurrency_condition,
+                                   run_stats, get_date_range, action_timeout, bearer_token, top_n, journal,
+                                   budget, low_priority))
+        for i in range(num_workers)
+    ]
+    
+    await asyncio.gather(*workers)
+    await context_pool.close()
+    if manager_task:
+        manager_task.cancel()
+    if budget:
+        budget.skipped += job_queue.qsize()
+        if budget.shed or budget.skipped:
+            app_logger.warning(f"Deadline: dropped {', '.join(budget.shed) or 'nothing'}, "
+                               f"{budget.skipped} stores skipped")
+    return results_list, run_stats
+
+
+async def collect_inf_shard(index: int, count: int, results, stores: List[Dict], active_config: Dict,
+                            bearer_token: str, deadline: float = None, low_priority=frozenset()):
+    """Child process: run the INF worker pool over one partition and send the results to the parent."""
+    stores = partition_stores(stores, index, count)
+    app_logger.info(f"INF shard {index + 1}/{count}: {len(stores)} stores")
+    run_stats = RunStats()
+    local_playwright = None
+    try:
+        local_playwright = await async_playwright().start()
+        browser = await local_playwright.chromium.launch(headless=not DEBUG_MODE)
+        with open(STORAGE_STATE) as f:
+            storage_state = codec.load(f)
         
-        for attempt in range(max_retries):
+        def get_date_range():
+            return get_date_time_range_from_config(active_config, LOCAL_TIMEZONE, app_logger)
+        
+        results_list, run_stats = await collect_inf_results(
+            browser, storage_state, stores, get_date_range, int(PAGE_TIMEOUT / 2), bearer_token,
+            active_config.get('top_n_items', 10), share=count, deadline=deadline, low_priority=low_priority)
+        for result in results_list:
+            results.put((RECORD, index, result))
+    except Exception as e:
+        app_logger.critical(f"INF shard {index + 1}/{count} failed: {e}", exc_info=True)
+    finally:
+        if local_playwright:
+            await local_playwright.stop()
+        results.put((DONE, index, {'stats': run_stats}))
+
+
+def run_inf_shard(index: int, count: int, results, stores: List[Dict], active_config: Dict, bearer_token: str,
+                  deadline: float = None, low_priority=frozenset()):
+    """Process entry point for ``--processes``."""
+    codec.run(collect_inf_shard(index, count, results, stores, active_config, bearer_token, deadline, low_priority))
+
+
+async def collect_inf_sharded(stores: List[Dict], active_config: Dict, bearer_token: str, processes: int,
+                              journal: RunJournal = None, deadline: float = None, low_priority=frozenset()):
+    """Split ``stores`` across child processes and merge their INF results.
+
+    Returns:
+        Same shape as ``collect_inf_results``
+    """
+    app_logger.info(f"Splitting {len(stores)} stores across {processes} INF processes...")
+    shard_processes, results = start_shard_processes(run_inf_shard, processes, stores, active_config, bearer_token,
+                                                     deadline, low_priority)
+    results_list = []
+    
+    async def add_result(result):
+        results_list.append(result)
+        if journal:
+            journal.append(list(result))
+    
+    summaries = await drain_shard_results(shard_processes, results, add_result, app_logger)
+    run_stats = RunStats()
+    for summary in summaries:
+        if summary is not None:
+            run_stats.merge(summary['stats'])
+    return results_list, run_stats
+
+
+async def report_inf_results(results_list: List, active_config: Dict, skip_network: bool, top_n: int):
+    """Aggregate INF results, export/upload the CSVs, push the dashboard and send the report.
+
+    Args:
+        results_list: (store_name, store_number, items, inf_rate) per store
+        active_config: Config the results were collected with (for the title prefix)
+        skip_network: Skip the network-wide report (targeted runs from the main scraper)
+        top_n: Items per store in the report
+    """
+    # Process Results
+    # results_list contains tuples of (store_name, store_number, items, inf_rate)
+    all_items = []
+    
+    # Build a mapping of store_name -> store_number for network analysis URLs
+    store_number_map = {}
+    for store_name, store_number, items, inf_rate in results_list:
+        store_number_map[store_name] = store_number
+        # Add store_number to each item for tracking
+        for item in items:
+            item['store_number'] = store_number
+        all_items.extend(items)
+    
+    # Calculate Network Wide Top 25 with store breakdown
+    aggregated = {}
+    for item in all_items:
+        key = (item['sku'], item['name'])
+        if key not in aggregated:
+            aggregated[key] = {
+                'total_inf': 0,
+                'stores': {},  # store_name -> {'inf': count, 'store_number': number}
+                'image_url': item.get('image_url', ''),
+                'barcode': item.get('barcode'),
+                'price': item.get('price')
+            }
+        aggregated[key]['total_inf'] += item['inf']
+        
+        # Track store contribution with store number
+        store_name = item['store']
+        store_number = item.get('store_number', '')
+        if store_name not in aggregated[key]['stores']:
+            aggregated[key]['stores'][store_name] = {'inf': 0, 'store_number': store_number}
+        aggregated[key]['stores'][store_name]['inf'] += item['inf']
+        
+    # Build network list with top contributing stores (up to 10) and all stores for CSV
+    network_list = []
+    for (sku, name), data in aggregated.items():
+        # Sort stores by INF contribution - now stores is dict with 'inf' and 'store_number'
+        sorted_stores = sorted(data['stores'].items(), key=lambda x: x[1]['inf'], reverse=True)
+        # Convert to list of tuples: (store_name, inf_count, store_number)
+        top_stores = [(name, info['inf'], info['store_number']) for name, info in sorted_stores[:10]]
+        all_stores = [(name, info['inf'], info['store_number']) for name, info in sorted_stores]
+
+        network_list.append({
+            "sku": sku,
+            "name": name,
+            "inf": data['total_inf'],
+            "top_stores": top_stores,  # [(store_name, inf_count, store_number), ...]
+            "all_stores": all_stores,
+            "store_count": len(data['stores']),
+            "image_url": data['image_url'],
+            "barcode": data['barcode'],
+            "price": data['price']
+        })
+
+    network_list.sort(key=lambda x: x['inf'], reverse=True)
+    network_top_25 = network_list[:25]
+    network_top_10 = network_list[:10]
+    
+    # Determine title prefix based on date mode
+    title_prefix = ""
+    if active_config.get('use_date_range'):
+        mode = active_config.get('date_range_mode')
+        if mode == 'today':
+            title_prefix = "Today's "
+        elif mode == 'yesterday':
+            title_prefix = "Yesterday's "
+        elif mode == 'last_7_days':
+            title_prefix = "Last 7 Days "
+        elif mode == 'last_30_days':
+            title_prefix = "Last 30 Days "
+        elif mode == 'week_to_date':
+            title_prefix = "Week to Date "
+        elif mode == 'custom':
+            # Check if it's actually "Today" (custom dates matching today)
             try:
-                # Create fresh connector for each batch
-                batch_ssl_context = ssl.create_default_context(cafile=certifi.where())
-                batch_connector = aiohttp.TCPConnector(ssl=batch_ssl_context)
-                
-                async with aiohttp.ClientSession(timeout=timeout, connector=batch_connector) as session:
-                    async with session.post(CHAT_WEBHOOK_URL, json=payload_stores) as resp:
-                        if resp.status == 429:
-                            # Rate limit hit - retry with exponential backoff
-                            if attempt < max_retries - 1:
-                                wait_time = retry_delay * (2 ** attempt)
-                                app_logger.warning(f"Rate limit hit for batch {batch_num}. Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
-                                await asyncio.sleep(wait_time)
-                                continue
-                            else:
-                                app_logger.error(f"Failed to send store batch {batch_num} after {max_retries} attempts: {await resp.text()}")
-                                break
-                        elif resp.status != 200:
-                            app_logger.error(f"Failed to send store batch {batch_num}: {await resp.text()}")
-                            break
-                        else:
-                            app_logger.info(f"Store batch {batch_num}/{len(batches)} sent successfully.")
-                            break
-                
-                # Delay between batches to avoid rate limiting (1.5s is safer than 0.5s)
-                if batch_num < len(batches):
-                    await asyncio.sleep(1.5)
-                    
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)
-                    app_logger.warning(f"Error sending store batch {batch_num} (attempt {attempt + 1}/{max_retries}): {e}. Retrying in {wait_time}s...")
-                    await asyncio.sleep(wait_time)
+                today_str = datetime.now(LOCAL_TIMEZONE).strftime("%m/%d/%Y")
+                if active_config.get('custom_start_date') == today_str and active_config.get('custom_end_date') == today_str:
+                    title_prefix = "Today's "
                 else:
-                    app_logger.error(f"Error sending store batch {batch_num} after {max_retries} attempts: {e}")
+                    title_prefix = "Custom Range "
+            except:
+                title_prefix = "Custom Range "
+
+    # Export to CSV (will then send report with CSV links)
+    csv_urls = {}
+    try:
+        # Ensure output directory exists (especially in GitHub Actions)
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        
+        timestamp_str = datetime.now(LOCAL_TIMEZONE).strftime('%Y%m%d_%H%M%S')
+        
+        # 1. Store-Level Details CSV
+        store_csv_path = os.path.join(OUTPUT_DIR, f'inf_store_details_{timestamp_str}.csv')
+        store_fieldnames = [
+            'timestamp', 'store_name', 'store_number', 'sku', 'product_name', 
+            'inf_count', 'inf_rate', 'image_url', 'price', 'barcode',
+            'stock_on_hand', 'stock_unit', 'stock_last_updated',
+            'std_location', 'promo_location', 'product_status', 'commercially_active'
+        ]
+        
+        with open(store_csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(
+                f, fieldnames=store_fieldnames, extrasaction='ignore', quoting=csv.QUOTE_ALL
+            )
+            writer.writeheader()
+            
+            for store_name, store_number, items, inf_rate in results_list:
+                for item in items:
+                    row = {
+                        'timestamp': datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S'),
+                        'store_name': store_name,
+                        'store_number': store_number or '',
+                        'sku': item.get('sku', ''),
+                        'product_name': item.get('name', ''),
+                        'inf_count': item.get('inf', 0),
+                        'inf_rate': inf_rate if inf_rate != 'N/A' else '',
+                        'image_url': item.get('image_url', ''),
+                        'price': item.get('price', ''),
+                        'barcode': item.get('barcode', ''),
+                        'stock_on_hand': item.get('stock_on_hand', ''),
+                        'stock_unit': item.get('stock_unit', ''),
+                        'stock_last_updated': item.get('stock_last_updated', ''),
+                        'std_location': item.get('std_location', ''),
+                        'promo_location': item.get('promo_location', ''),
+                        'product_status': item.get('product_status', ''),
+                        'commercially_active': item.get('commercially_active', '')
+                    }
+                    row = {key: sanitize_csv_value(value) for key, value in row.items()}
+                    writer.writerow(row)
+        
+        app_logger.info(f"Store-level CSV exported to: {store_csv_path}")
+        
+        # 2. Network-Wide Summary CSV
+        network_csv_path = os.path.join(OUTPUT_DIR, f'inf_network_summary_{timestamp_str}.csv')
+        network_fieldnames = [
+            'timestamp', 'rank', 'sku', 'product_name', 'total_inf_count',
+            'store_count', 'top_contributing_stores', 'all_impacted_stores', 'image_url', 'price', 'barcode'
+        ]
+        
+        with open(network_csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(
+                f, fieldnames=network_fieldnames, extrasaction='ignore', quoting=csv.QUOTE_ALL
+            )
+            writer.writeheader()
+            
+            for rank, item in enumerate(network_top_25, 1):
+                # Format top contributing stores as "Store1 (count), Store2 (count), ..."
+                # Note: top_stores is now (store_name, inf_count, store_number)
+                top_stores_str = ', '.join([
+                    f"{sanitize_store_name(store, STORE_PREFIX_RE)} ({count})"
+                    for store, count, _ in item['top_stores']
+                ])
+
+                all_stores_str = ', '.join([
+                    f"{sanitize_store_name(store, STORE_PREFIX_RE)} ({count})"
+                    for store, count, _ in item.get('all_stores', [])
+                ])
+
+                row = {
+                    'timestamp': datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S'),
+                    'rank': rank,
+                    'sku': item.get('sku', ''),
+                    'product_name': item.get('name', ''),
+                    'total_inf_count': item.get('inf', 0),
+                    'store_count': item.get('store_count', 0),
+                    'top_contributing_stores': top_stores_str,
+                    'all_impacted_stores': all_stores_str,
+                    'image_url': item.get('image_url', ''),
+                    'price': item.get('price', ''),
+                    'barcode': item.get('barcode', '')
+                }
+                row = {key: sanitize_csv_value(value) for key, value in row.items()}
+                writer.writerow(row)
+        
+        app_logger.info(f"Network summary CSV exported to: {network_csv_path}")
+        
+        # Upload to GitHub Gist if running in GitHub Actions
+        with phase("inf upload"):
+            store_details_url = upload_csv_to_gist(
+                store_csv_path, 
+                f"INF Store Details - {datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M')}"
+            )
+            network_summary_url = upload_csv_to_gist(
+                network_csv_path,
+                f"INF Network Summary - {datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M')}"
+            )
+        
+        # Store URLs if available
+        if store_details_url:
+            csv_urls['store_details'] = store_details_url
+        if network_summary_url:
+            csv_urls['network_summary'] = network_summary_url
+        
+    except Exception as e:
+        app_logger.error(f"Error exporting CSV files: {e}")
+    
+    # Push INF data to dashboard Gist
+    try:
+        with phase("inf upload"):
+            push_inf_to_dashboard(results_list)
+    except Exception as e:
+        app_logger.warning(f"Failed to push INF data to dashboard: {e}")
+    
+    # Send Report - skip network-wide report if called from main scraper with specific stores
+    # (top_n is already defined earlier in this function)
+    with phase("inf report"):
+        await send_inf_report(results_list, network_top_10, skip_network_report=skip_network, title_prefix=title_prefix, top_n=top_n, csv_urls=csv_urls if csv_urls else None)
+
 
+async def run_inf_analysis(target_stores: List[Dict] = None, provided_browser: Browser = None, config_override: Dict = None,
+                           processes: int = 1, shard: Tuple[int, int] = None, resume: bool = False,
+                           deadline: float = None):
+    """Run the INF analysis and report it.
 
-async def run_inf_analysis(target_stores: List[Dict] = None, provided_browser: Browser = None, config_override: Dict = None):
-    import time
+    With ``shard`` (0-based index, count) only that partition of the stores is
+    processed and the results are written to a shard artifact instead of being
+    reported; ``merge_inf_shards`` reports them once all shards are done.
+
+    Full-network runs journal every store result; with ``resume`` the stores in
+    the journal of an interrupted run for the same date range are not processed
+    again and their results are reported with this run's.
+
+    With a ``deadline`` (Unix time) stores are processed highest INF first, and
+    stock enrichment and then stores below ``DEADLINE_INF_THRESHOLD`` are dropped
+    when the rest won't fit.
+    """
     _start_time = time.time()
     
     app_logger.info("Starting INF Analysis...")
@@ -1128,10 +1547,22 @@ async def run_inf_analysis(target_stores: List[Dict] = None, provided_browser: B
     else:
         urls_data = target_stores
         app_logger.info(f"Analyzing {len(urls_data)} provided stores.")
+    if shard:
+        urls_data = partition_stores(urls_data, *shard)
+        app_logger.info(f"INF shard {shard[0] + 1}/{shard[1]}: {len(urls_data)} stores")
+    
+    low_priority = frozenset()
+    if deadline:
+        if DeadlineBudget(deadline, reserve_seconds=DEADLINE_RESERVE_SECONDS).expired():
+            # Publishing an empty INF run would overwrite the dashboard with nothing
+            app_logger.warning("Deadline reached before INF analysis started - skipping it")
+            return
+        urls_data, low_priority = prioritise_inf_stores(urls_data)
 
     # Manage browser lifecycle
     local_playwright = None
     browser = provided_browser
+    journal = None
     
     try:
         if not browser:
@@ -1177,35 +1608,18 @@ async def run_inf_analysis(target_stores: List[Dict] = None, provided_browser: B
         else:
             app_logger.info("Using provided browser from main scraper (already authenticated)")
 
-        # Fetch fresh bearer token for this run (tokens expire frequently)
-        bearer_token_for_run = MORRISONS_BEARER_TOKEN  # Start with global token
-        if ENRICH_STOCK_DATA and MORRISONS_BEARER_TOKEN_URL:
-            app_logger.info("Fetching fresh bearer token for this INF run...")
-            from stock_enrichment import fetch_bearer_token_from_gist
-            fresh_token = fetch_bearer_token_from_gist(MORRISONS_BEARER_TOKEN_URL)
-            if fresh_token:
-                bearer_token_for_run = fresh_token
-                token_preview = f"{fresh_token[:20]}..." if len(fresh_token) > 20 else fresh_token
-                app_logger.info(f"Fresh bearer token successfully loaded (preview: {token_preview})")
-            else:
-                app_logger.warning("Failed to fetch fresh bearer token - will use global token (may be expired)")
-        
-        # Log final token status for debugging
-        if bearer_token_for_run:
-            app_logger.info(f"Bearer token is set and ready (length: {len(bearer_token_for_run)})")
-        else:
-            app_logger.warning("WARNING: Bearer token is None! Stock enrichment will fail with 401 errors")
-
+        with phase("bearer token"):
+            bearer_token_for_run = fetch_run_bearer_token()
 
         # Load state
         with open(STORAGE_STATE) as f:
-            storage_state = json.load(f)
+            storage_state = codec.load(f)
         
         # Use overridden config if provided, otherwise use global config
         active_config = config_override if config_override else config
         apps_script_url = active_config.get('apps_script_webhook_url') or APPS_SCRIPT_URL
         skip_network = target_stores is not None
-        should_post_quick_actions = (not skip_network) and bool(CHAT_WEBHOOK_URL) and bool(apps_script_url)
+        should_post_quick_actions = (not skip_network) and not shard and bool(CHAT_WEBHOOK_URL) and bool(apps_script_url)
 
         # Create date range function (same as main scraper)
         def get_date_range():
@@ -1217,250 +1631,41 @@ async def run_inf_analysis(target_stores: List[Dict] = None, provided_browser: B
         # Get top_n for extraction (default 10)
         top_n = active_config.get('top_n_items', 10)
             
-        # Setup Queue
-        job_queue = Queue()
-        for store in urls_data:
-            job_queue.put_nowait(store)
+        resumed = []
+        stores = urls_data
+        if target_stores is None and not shard:
+            journal, resumed, stores = open_inf_journal(urls_data, get_date_range, resume)
             
-        results_list = []
-        results_lock = Lock()
-        
-        # Concurrency State
-        concurrency_limit_ref = {'value': INITIAL_CONCURRENCY}
-        active_workers_ref = {'value': 0}
-        concurrency_condition = Condition()
-        last_concurrency_change_ref = {'value': 0.0}
-        
-        failure_lock = Lock()
-        failure_timestamps = []
-        
-        # Start Auto-concurrency Manager
-        if AUTO_ENABLED:
-            asyncio.create_task(auto_concurrency_manager(
-                concurrency_limit_ref, last_concurrency_change_ref, AUTO_ENABLED, AUTO_MIN_CONCURRENCY,
-                AUTO_MAX_CONCURRENCY, CPU_UPPER_THRESHOLD, CPU_LOWER_THRESHOLD, MEM_UPPER_THRESHOLD,
-                CHECK_INTERVAL, COOLDOWN_SECONDS, failure_lock, failure_timestamps,
-                concurrency_condition, app_logger
-            ))
-        
-        # Launch Workers
-        num_workers = min(AUTO_MAX_CONCURRENCY, len(urls_data))
-        app_logger.info(f"Launching {num_workers} workers (Initial Concurrency Limit: {INITIAL_CONCURRENCY})...")
-        
-        workers = [
-            asyncio.create_task(worker(i+1, browser, storage_state, job_queue, results_list, results_lock,
-                                       concurrency_limit_ref, active_workers_ref, concurrency_condition,
-                                       failure_lock, failure_timestamps, get_date_range, ACTION_TIMEOUT, bearer_token_for_run, top_n))
-            for i in range(num_workers)
-        ]
-        
-        await asyncio.gather(*workers)
-        
-        # Process Results
-        # results_list contains tuples of (store_name, store_number, items, inf_rate)
-        all_items = []
-        
-        # Build a mapping of store_name -> store_number for network analysis URLs
-        store_number_map = {}
-        for store_name, store_number, items, inf_rate in results_list:
-            store_number_map[store_name] = store_number
-            # Add store_number to each item for tracking
-            for item in items:
-                item['store_number'] = store_number
-            all_items.extend(items)
-        
-        # Calculate Network Wide Top 25 with store breakdown
-        aggregated = {}
-        for item in all_items:
-            key = (item['sku'], item['name'])
-            if key not in aggregated:
-                aggregated[key] = {
-                    'total_inf': 0,
-                    'stores': {},  # store_name -> {'inf': count, 'store_number': number}
-                    'image_url': item.get('image_url', ''),
-                    'barcode': item.get('barcode'),
-                    'price': item.get('price')
-                }
-            aggregated[key]['total_inf'] += item['inf']
-            
-            # Track store contribution with store number
-            store_name = item['store']
-            store_number = item.get('store_number', '')
-            if store_name not in aggregated[key]['stores']:
-                aggregated[key]['stores'][store_name] = {'inf': 0, 'store_number': store_number}
-            aggregated[key]['stores'][store_name]['inf'] += item['inf']
-            
-        # Build network list with top contributing stores (up to 10) and all stores for CSV
-        network_list = []
-        for (sku, name), data in aggregated.items():
-            # Sort stores by INF contribution - now stores is dict with 'inf' and 'store_number'
-            sorted_stores = sorted(data['stores'].items(), key=lambda x: x[1]['inf'], reverse=True)
-            # Convert to list of tuples: (store_name, inf_count, store_number)
-            top_stores = [(name, info['inf'], info['store_number']) for name, info in sorted_stores[:10]]
-            all_stores = [(name, info['inf'], info['store_number']) for name, info in sorted_stores]
-
-            network_list.append({
-                "sku": sku,
-                "name": name,
-                "inf": data['total_inf'],
-                "top_stores": top_stores,  # [(store_name, inf_count, store_number), ...]
-                "all_stores": all_stores,
-                "store_count": len(data['stores']),
-                "image_url": data['image_url'],
-                "barcode": data['barcode'],
-                "price": data['price']
-            })
-
-        network_list.sort(key=lambda x: x['inf'], reverse=True)
-        network_top_25 = network_list[:25]
-        network_top_10 = network_list[:10]
-        
-        # Determine title prefix based on date mode
-        title_prefix = ""
-        if active_config.get('use_date_range'):
-            mode = active_config.get('date_range_mode')
-            if mode == 'today':
-                title_prefix = "Today's "
-            elif mode == 'yesterday':
-                title_prefix = "Yesterday's "
-            elif mode == 'last_7_days':
-                title_prefix = "Last 7 Days "
-            elif mode == 'last_30_days':
-                title_prefix = "Last 30 Days "
-            elif mode == 'week_to_date':
-                title_prefix = "Week to Date "
-            elif mode == 'custom':
-                # Check if it's actually "Today" (custom dates matching today)
-                try:
-                    today_str = datetime.now(LOCAL_TIMEZONE).strftime("%m/%d/%Y")
-                    if active_config.get('custom_start_date') == today_str and active_config.get('custom_end_date') == today_str:
-                        title_prefix = "Today's "
-                    else:
-                        title_prefix = "Custom Range "
-                except:
-                    title_prefix = "Custom Range "
-
-        # Export to CSV (will then send report with CSV links)
-        csv_urls = {}
-        try:
-            # Ensure output directory exists (especially in GitHub Actions)
-            os.makedirs(OUTPUT_DIR, exist_ok=True)
-            
-            timestamp_str = datetime.now(LOCAL_TIMEZONE).strftime('%Y%m%d_%H%M%S')
-            
-            # 1. Store-Level Details CSV
-            store_csv_path = os.path.join(OUTPUT_DIR, f'inf_store_details_{timestamp_str}.csv')
-            store_fieldnames = [
-                'timestamp', 'store_name', 'store_number', 'sku', 'product_name', 
-                'inf_count', 'inf_rate', 'image_url', 'price', 'barcode',
-                'stock_on_hand', 'stock_unit', 'stock_last_updated',
-                'std_location', 'promo_location', 'product_status', 'commercially_active'
-            ]
-            
-            with open(store_csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(
-                    f, fieldnames=store_fieldnames, extrasaction='ignore', quoting=csv.QUOTE_ALL
-                )
-                writer.writeheader()
-                
-                for store_name, store_number, items, inf_rate in results_list:
-                    for item in items:
-                        row = {
-                            'timestamp': datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S'),
-                            'store_name': store_name,
-                            'store_number': store_number or '',
-                            'sku': item.get('sku', ''),
-                            'product_name': item.get('name', ''),
-                            'inf_count': item.get('inf', 0),
-                            'inf_rate': inf_rate if inf_rate != 'N/A' else '',
-                            'image_url': item.get('image_url', ''),
-                            'price': item.get('price', ''),
-                            'barcode': item.get('barcode', ''),
-                            'stock_on_hand': item.get('stock_on_hand', ''),
-                            'stock_unit': item.get('stock_unit', ''),
-                            'stock_last_updated': item.get('stock_last_updated', ''),
-                            'std_location': item.get('std_location', ''),
-                            'promo_location': item.get('promo_location', ''),
-                            'product_status': item.get('product_status', ''),
-                            'commercially_active': item.get('commercially_active', '')
-                        }
-                        row = {key: sanitize_csv_value(value) for key, value in row.items()}
-                        writer.writerow(row)
-            
-            app_logger.info(f"Store-level CSV exported to: {store_csv_path}")
-            
-            # 2. Network-Wide Summary CSV
-            network_csv_path = os.path.join(OUTPUT_DIR, f'inf_network_summary_{timestamp_str}.csv')
-            network_fieldnames = [
-                'timestamp', 'rank', 'sku', 'product_name', 'total_inf_count',
-                'store_count', 'top_contributing_stores', 'all_impacted_stores', 'image_url', 'price', 'barcode'
-            ]
-            
-            with open(network_csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(
-                    f, fieldnames=network_fieldnames, extrasaction='ignore', quoting=csv.QUOTE_ALL
-                )
-                writer.writeheader()
-                
-                for rank, item in enumerate(network_top_25, 1):
-                    # Format top contributing stores as "Store1 (count), Store2 (count), ..."
-                    # Note: top_stores is now (store_name, inf_count, store_number)
-                    top_stores_str = ', '.join([
-                        f"{sanitize_store_name(store, STORE_PREFIX_RE)} ({count})"
-                        for store, count, _ in item['top_stores']
-                    ])
-
-                    all_stores_str = ', '.join([
-                        f"{sanitize_store_name(store, STORE_PREFIX_RE)} ({count})"
-                        for store, count, _ in item.get('all_stores', [])
-                    ])
-
-                    row = {
-                        'timestamp': datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S'),
-                        'rank': rank,
-                        'sku': item.get('sku', ''),
-                        'product_name': item.get('name', ''),
-                        'total_inf_count': item.get('inf', 0),
-                        'store_count': item.get('store_count', 0),
-                        'top_contributing_stores': top_stores_str,
-                        'all_impacted_stores': all_stores_str,
-                        'image_url': item.get('image_url', ''),
-                        'price': item.get('price', ''),
-                        'barcode': item.get('barcode', '')
-                    }
-                    row = {key: sanitize_csv_value(value) for key, value in row.items()}
-                    writer.writerow(row)
-            
-            app_logger.info(f"Network summary CSV exported to: {network_csv_path}")
-            
-            # Upload to GitHub Gist if running in GitHub Actions
-            store_details_url = upload_csv_to_gist(
-                store_csv_path, 
-                f"INF Store Details - {datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M')}"
-            )
-            network_summary_url = upload_csv_to_gist(
-                network_csv_path,
-                f"INF Network Summary - {datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M')}"
-            )
-            
-            # Store URLs if available
-            if store_details_url:
-                csv_urls['store_details'] = store_details_url
-            if network_summary_url:
-                csv_urls['network_summary'] = network_summary_url
-            
-        except Exception as e:
-            app_logger.error(f"Error exporting CSV files: {e}")
-        
-        # Push INF data to dashboard Gist
-        try:
-            push_inf_to_dashboard(results_list)
-        except Exception as e:
-            app_logger.warning(f"Failed to push INF data to dashboard: {e}")
+        with phase("inf collect"):
+            if processes > 1:
+                results_list, run_stats = await collect_inf_sharded(stores, active_config, bearer_token_for_run,
+                                                                    processes, journal, deadline, low_priority)
+            else:
+                results_list, run_stats = await collect_inf_results(browser, storage_state, stores, get_date_range,
+                                                                    ACTION_TIMEOUT, bearer_token_for_run, top_n,
+                                                                    journal=journal, deadline=deadline,
+                                                                    low_priority=low_priority)
+        if resumed:
+            app_logger.info(f"Resumed {len(resumed)} INF results from the journal")
+            results_list = resumed + results_list
+        
+        inf_latency = run_stats.latency('inf_store')
+        app_logger.info(f"INF stores: {inf_latency.count} done, {run_stats.failures.total} failed, "
+                        f"p50 {inf_latency.percentile(0.50):.1f}s / p95 {inf_latency.percentile(0.95):.1f}s")
+        
+        if shard:
+            index, count = shard
+            path = shard_artifact_path('inf', index, count)
+            write_shard_artifact(path, {
+                'kind': 'inf', 'shard': index, 'count': count, 'config': shard_config(active_config),
+                'stores': len(urls_data), 'stats': run_stats.to_dict(),
+            }, [list(result) for result in results_list])
+            app_logger.info(f"INF shard {index + 1}/{count}: {len(results_list)} results written to {path}")
+            return
         
-        # Send Report - skip network-wide report if called from main scraper with specific stores
-        # (top_n is already defined earlier in this function)
-        await send_inf_report(results_list, network_top_10, skip_network_report=skip_network, title_prefix=title_prefix, top_n=top_n, csv_urls=csv_urls if csv_urls else None)
+        await report_inf_results(results_list, active_config, skip_network, top_n)
+        if journal and not run_stats.failures.total:
+            journal.finish()
 
     finally:
         # Always try to post the quick actions card when applicable so users see buttons even if earlier steps hiccuped
@@ -1489,6 +1694,9 @@ async def run_inf_analysis(target_stores: List[Dict] = None, provided_browser: B
         except Exception as timing_err:
             app_logger.debug(f"Error logging timing summary: {timing_err}")
 
+        if journal:
+            journal.close()
+
         if local_playwright:
             if browser:
                 try:
@@ -1497,6 +1705,30 @@ async def run_inf_analysis(target_stores: List[Dict] = None, provided_browser: B
                     pass
             await local_playwright.stop()
 
+async def merge_inf_shards(paths: List[str], config_override: Dict = None):
+    """Report the INF results of ``--shard`` runs once (``--merge``)."""
+    metas, records = read_shard_artifacts(paths, 'inf')
+    missing = missing_shards(metas)
+    if missing:
+        app_logger.warning(f"Merging without INF shard(s) {missing} of {metas[0]['count']} - their stores are not in the report")
+    
+    active_config = dict(config_override or config, **metas[0]['config'])
+    apps_script_url = active_config.get('apps_script_webhook_url') or APPS_SCRIPT_URL
+    results_list = [tuple(record) for record in records]
+    run_stats = RunStats()
+    for meta in metas:
+        run_stats.merge(RunStats.from_dict(meta['stats']))
+    app_logger.info(f"Merging {len(results_list)} INF results from {len(metas)} shard(s) "
+                    f"({run_stats.failures.total} failed stores)")
+    
+    try:
+        await report_inf_results(results_list, active_config, False, active_config.get('top_n_items', 10))
+    finally:
+        if CHAT_WEBHOOK_URL and apps_script_url:
+            from webhook import post_quick_actions_card
+            await post_quick_actions_card(CHAT_WEBHOOK_URL, apps_script_url, DEBUG_MODE, app_logger)
+
+
 async def main():
     import argparse
     
@@ -1508,29 +1740,46 @@ async def main():
     parser.add_argument('--start-time', help='Start time (e.g., "12:00 AM")')
     parser.add_argument('--end-time', help='End time (e.g., "11:59 PM")')
     parser.add_argument('--relative-days', type=int, help='Days offset for relative mode')
+    parser.add_argument('--processes', type=int, default=config.get('processes', 1), help='Split the stores across N worker processes, each with its own browser')
+    parser.add_argument('--shard', type=parse_shard_spec, help='Process only shard i of n (e.g. 2/4) and write its results to output/shards')
+    parser.add_argument('--merge', nargs='+', metavar='PATH', help='Report the results of --shard runs (artifact files or directories)')
+    parser.add_argument('--deadline', help='Time budget: minutes from now (e.g. 40) or @<unix time>. Optional work is dropped and collection stops early so the run still reports in time')
+    parser.add_argument('--resume', action='store_true', help='Skip stores already completed by an interrupted run for the same date range and report them with this run')
+    parser.add_argument('--loop-monitor', action='store_true', help='Log event-loop stalls with the blocking stack and summarise the worst offenders per phase at the end of the run')
     
     args, unknown = parser.parse_known_args()
     
-    # Create a copy of the global config to modify
-    local_config = config.copy()
+    if args.loop_monitor or config.get('loop_monitor', False):
+        start_loop_monitor(threshold=LOOP_MONITOR_THRESHOLD, app_logger=app_logger)
+    try:
+        if args.merge:
+            await merge_inf_shards(args.merge)
+            return
+    
+        # Create a copy of the global config to modify
+        local_config = config.copy()
     
-    # Merge CLI args into config
-    if args.date_mode:
-        local_config['use_date_range'] = True
-        local_config['date_range_mode'] = args.date_mode
-
-    if args.start_date: local_config['custom_start_date'] = args.start_date
-    if args.end_date: local_config['custom_end_date'] = args.end_date
-    if args.start_time: local_config['custom_start_time'] = args.start_time
-    if args.end_time: local_config['custom_end_time'] = args.end_time
-    if args.relative_days is not None: local_config['relative_days'] = args.relative_days
+        # Merge CLI args into config
+        if args.date_mode:
+            local_config['use_date_range'] = True
+            local_config['date_range_mode'] = args.date_mode
+
+        if args.start_date: local_config['custom_start_date'] = args.start_date
+        if args.end_date: local_config['custom_end_date'] = args.end_date
+        if args.start_time: local_config['custom_start_time'] = args.start_time
+        if args.end_time: local_config['custom_end_time'] = args.end_time
+        if args.relative_days is not None: local_config['relative_days'] = args.relative_days
     
-    # Force custom mode if dates provided without mode
-    if (args.start_date or args.end_date) and not args.date_mode:
-        local_config['use_date_range'] = True
-        local_config['date_range_mode'] = 'custom'
+        # Force custom mode if dates provided without mode
+        if (args.start_date or args.end_date) and not args.date_mode:
+            local_config['use_date_range'] = True
+            local_config['date_range_mode'] = 'custom'
 
-    await run_inf_analysis(config_override=local_config)
+        await run_inf_analysis(config_override=local_config, processes=max(1, args.processes), shard=args.shard,
+                               resume=args.resume, deadline=parse_deadline(args.deadline) if args.deadline else None)
+    finally:
+        await close_chat_client()
+        await stop_loop_monitor()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    codec.run(main())
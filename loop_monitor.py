@@ -0,0 +1,272 @@
+# =======================================================================================
+#                  LOOP MONITOR MODULE - Find What Blocks the Event Loop
+# =======================================================================================
+# Some synchronous work still runs on the event loop (gist uploads through requests,
+# report CSV parsing, the bearer token fetch), and while it runs no worker makes any
+# progress. The monitor is opt-in instrumentation to find and prove those stalls:
+#   * a sampler task measures how late its own timer fires (loop lag),
+#   * a watchdog thread grabs the loop thread's stack while a stall is in progress,
+#     so the blocking call itself is caught, not just the callback around it,
+#   * asyncio debug mode logs every callback slower than the threshold.
+# Everything is grouped by run phase (login, collect, report, ...) and the worst
+# offenders per phase are logged when the monitor stops.
+# =======================================================================================
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+DEFAULT_INTERVAL = 0.05     # seconds between lag samples
+DEFAULT_THRESHOLD = 0.1     # seconds of lag (or callback time) that counts as a stall
+TOP_OFFENDERS = 5           # offenders listed per phase in the summary
+IDLE_PHASE = "other"        # phase for anything outside a phase() block
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+_monitors = weakref.WeakKeyDictionary()  # event loop -> LoopMonitor
+
+
+def is_project_frame(filename: str) -> bool:
+    """True for files of this project (not the stdlib or installed packages)."""
+    path = os.path.abspath(filename)
+    return path.startswith(_PROJECT_DIR + os.sep) and 'site-packages' not in path
+
+
+def blocking_frame(stack: List[traceback.FrameSummary]) -> str:
+    """The innermost project frame of a stack, e.g. ``inf_scraper.py:617 push_inf_to_dashboard``.
+
+    That is the line of our code that made the blocking call; frames below it are
+    library internals (requests, ssl, csv). Falls back to the innermost frame.
+    """
+    for frame in reversed(stack):
+        if is_project_frame(frame.filename):
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    if stack:
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} {frame.name}"
+    return "unknown"
+
+
+class PhaseStats:
+    """Lag samples, stalls and slow callbacks seen during one phase."""
+
+    def __init__(self):
+        self.samples = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.stalls = 0
+        self.slow_callbacks = 0
+        self.offenders: Dict[str, Dict] = {}  # blocking frame -> {'count', 'seconds', 'stack'}
+
+    def add_sample(self, lag: float):
+        self.samples += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def add_stall(self, where: str, seconds: float, stack: str = ""):
+        self.stalls += 1
+        offender = self.offenders.setdefault(where, {'count': 0, 'seconds': 0.0, 'stack': stack})
+        offender['count'] += 1
+        offender['seconds'] += seconds
+
+    def worst(self, n: int = TOP_OFFENDERS) -> List[tuple]:
+        """The ``n`` offenders that blocked the loop longest, as (frame, stats) pairs."""
+        return sorted(self.offenders.items(), key=lambda item: item[1]['seconds'], reverse=True)[:n]
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Receives asyncio debug mode's "Executing <Handle ...> took N seconds" warnings."""
+
+    def __init__(self, monitor: 'LoopMonitor'):
+        super().__init__(logging.WARNING)
+        self.monitor = monitor
+
+    def emit(self, record: logging.LogRecord):
+        if record.msg.startswith('Executing'):
+            self.monitor.slow_callback(record.getMessage())
+
+
+class LoopMonitor:
+    """Samples event-loop lag and catches blocking calls, grouped by phase.
+
+    Usage:
+        monitor = LoopMonitor(app_logger=app_logger)
+        monitor.start()                 # from inside the running loop
+        with monitor.phase("collect"):
+            ...
+        await monitor.stop()            # logs the per-phase summary
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, threshold: float = DEFAULT_THRESHOLD,
+                 asyncio_debug: bool = True, app_logger=None, clock=time.monotonic):
+        self.interval = interval
+        self.threshold = threshold
+        self.asyncio_debug = asyncio_debug
+        self.app_logger = app_logger
+        self.clock = clock
+        self.phases: Dict[str, PhaseStats] = {}
+        self._active: List[tuple] = []  # phases entered and not yet left, innermost last
+        self._lock = threading.Lock()
+        self._beat = 0.0
+        self._pending: Optional[tuple] = None  # (phase, frame, stack) caught by the watchdog
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._watchdog = None
+        self._stopping = threading.Event()
+        self._handler = None
+        self._saved_debug = None
+
+    @property
+    def current(self) -> str:
+        active = self._active
+        return active[-1][0] if active else IDLE_PHASE
+
+    def stats(self, phase: str = None) -> PhaseStats:
+        phase = phase or self.current
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats()
+        return stats
+
+    @contextmanager
+    def phase(self, name: str):
+        """Attribute lag and stalls to ``name`` until the block exits.
+
+        Phases entered by concurrent tasks may exit in any order; the most
+        recently entered phase that is still open is the current one.
+        """
+        entry = (name, object())  # unique, so nested or parallel phases of the same name don't clash
+        self._active.append(entry)
+        try:
+            yield
+        finally:
+            self._active.remove(entry)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = self.clock()
+        if self.asyncio_debug:
+            self._saved_debug = (self._loop.get_debug(), self._loop.slow_callback_duration)
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.threshold
+            self._handler = _SlowCallbackHandler(self)
+            logging.getLogger('asyncio').addHandler(self._handler)
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    def record_lag(self, lag: float):
+        """Count one lag sample; a stall is charged to what the watchdog caught during it."""
+        stats = self.stats()
+        stats.add_sample(lag)
+        if lag < self.threshold:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending:
+            phase, where, stack = pending
+            self.stats(phase).add_stall(where, lag, stack)
+        else:
+            # Shorter than the watchdog's poll, or the process was suspended
+            stats.add_stall("unknown", lag)
+
+    async def _sample(self):
+        while True:
+            before = self.clock()
+            await asyncio.sleep(self.interval)
+            self._beat = now = self.clock()
+            self.record_lag(max(0.0, now - before - self.interval))
+
+    def _watch(self):
+        caught = None
+        while not self._stopping.wait(self.interval / 2):
+            beat = self._beat
+            if beat == caught or self.clock() - beat - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+            caught = beat
+            where, text = blocking_frame(stack), ''.join(stack.format())
+            with self._lock:
+                self._pending = (self.current, where, text)
+            if self.app_logger:
+                self.app_logger.warning("Event loop blocked for over %.0fms in %s at %s",
+                                        self.threshold * 1000, self.current, where)
+                self.app_logger.debug("Blocking stack:\n%s", text)
+
+    def slow_callback(self, message: str):
+        self.stats().slow_callbacks += 1
+        if self.app_logger:
+            self.app_logger.warning("Slow callback in %s: %s", self.current, message)
+
+    async def stop(self):
+        """Stop sampling, restore the loop's debug settings and log the summary."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await asyncio.to_thread(self._watchdog.join)
+        if self._handler:
+            logging.getLogger('asyncio').removeHandler(self._handler)
+            self._handler = None
+        if self._saved_debug:
+            self._loop.set_debug(self._saved_debug[0])
+            self._loop.slow_callback_duration = self._saved_debug[1]
+        if self.app_logger:
+            for line in self.summary():
+                self.app_logger.info(line)
+
+    def summary(self) -> List[str]:
+        lines = [f"Event loop monitor (stall = over {self.threshold * 1000:.0f}ms):"]
+        for name, stats in self.phases.items():
+            mean = stats.total_lag / stats.samples if stats.samples else 0.0
+            blocked = sum(o['seconds'] for o in stats.offenders.values())
+            lines.append(f"  {name}: {stats.samples} samples, lag mean {mean * 1000:.1f}ms / "
+                         f"max {stats.max_lag * 1000:.0f}ms, {stats.stalls} stalls ({blocked:.1f}s blocked), "
+                         f"{stats.slow_callbacks} slow callbacks")
+            for where, offender in stats.worst():
+                lines.append(f"    {offender['seconds']:.2f}s in {offender['count']} stalls: {where}")
+        return lines
+
+
+def start_loop_monitor(interval: float = DEFAULT_INTERVAL, threshold: float = DEFAULT_THRESHOLD,
+                       asyncio_debug: bool = True, app_logger=None) -> LoopMonitor:
+    """Start a monitor for the running loop; ``phase()`` blocks report to it."""
+    monitor = LoopMonitor(interval, threshold, asyncio_debug, app_logger)
+    monitor.start()
+    _monitors[monitor._loop] = monitor
+    return monitor
+
+
+async def stop_loop_monitor():
+    """Stop the running loop's monitor, if one was started, and log its summary."""
+    monitor = _monitors.pop(asyncio.get_running_loop(), None)
+    if monitor:
+        await monitor.stop()
+
+
+@contextmanager
+def phase(name: str):
+    """Mark a run phase for the running loop's monitor (does nothing when it is off)."""
+    try:
+        monitor = _monitors.get(asyncio.get_running_loop())
+    except RuntimeError:
+        monitor = None
+    if monitor is None:
+        yield
+        return
+    with monitor.phase(name):
+        yield
@@ -0,0 +1,157 @@
+# =======================================================================================
+#                  METRICS CACHE MODULE - On-disk Cache for Snowdash API Responses
+# =======================================================================================
+# Metrics for a range that ended before today never change, so re-runs, WTD fetches and
+# history backfills can read them from disk instead of the API. Ranges that end today
+# are still moving and are only reused for a short TTL.
+#
+# The same database also holds the intraday accumulator: per-store totals for the
+# settled hours of today, so repeated runs in a day only fetch the hours since the last.
+# =======================================================================================
+
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import codec
+from utils import LOCAL_TIMEZONE
+
+DEFAULT_CACHE_PATH = os.path.join('output', 'metrics_cache.sqlite3')
+DEFAULT_OPEN_RANGE_TTL = 300  # seconds an open (today) range stays fresh
+
+# Endpoint names used as part of the cache key
+SUMMATION_ENDPOINT = 'summationMetrics'
+DETAILED_ENDPOINT = 'metrics'
+
+
+def _hour_key(dt: datetime) -> str:
+    """Hour-granularity key - the API only accepts whole hours."""
+    return dt.strftime('%Y-%m-%dT%H')
+
+
+def is_closed_range(end_date: datetime, now: datetime = None) -> bool:
+    """True if the range ended before today and its metrics can no longer change."""
+    now = now or datetime.now(LOCAL_TIMEZONE)
+    if end_date.tzinfo and now.tzinfo:
+        end_date = end_date.astimezone(now.tzinfo)
+    return end_date.date() < now.date()
+
+
+class MetricsCache:
+    """SQLite cache keyed by ``(endpoint, merchant_id, start, end)``.
+
+    Closed ranges never expire. Open ranges (ending today) are returned only
+    while younger than ``open_ttl`` seconds.
+
+    Usage:
+        cache = MetricsCache()
+        payload = cache.get(SUMMATION_ENDPOINT, merchant_id, start, end)
+        if payload is None:
+            payload = ...  # fetch from the API
+            cache.put(SUMMATION_ENDPOINT, merchant_id, start, end, payload)
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, open_ttl: float = DEFAULT_OPEN_RANGE_TTL):
+        self.path = path
+        self.open_ttl = open_ttl
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        # Rollback journal rather than WAL: every write lands in the main file, so a run
+        # that is killed still leaves it complete for the workflow's cache save step
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " endpoint TEXT NOT NULL, merchant_id TEXT NOT NULL,"
+            " start_key TEXT NOT NULL, end_key TEXT NOT NULL,"
+            " closed INTEGER NOT NULL, stored_at REAL NOT NULL, payload TEXT NOT NULL,"
+            " PRIMARY KEY (endpoint, merchant_id, start_key, end_key))"
+        )
+
+    def get(self, endpoint: str, merchant_id: str, start_date: datetime, end_date: datetime) -> Optional[Any]:
+        """Return the cached payload, or None on a miss or an expired open range."""
+        row = self._conn.execute(
+            "SELECT closed, stored_at, payload FROM responses"
+            " WHERE endpoint = ? AND merchant_id = ? AND start_key = ? AND end_key = ?",
+            (endpoint, merchant_id, _hour_key(start_date), _hour_key(end_date)),
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        closed, stored_at, payload = row
+        if not closed and time.time() - stored_at > self.open_ttl:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return codec.loads(payload)
+
+    def put(self, endpoint: str, merchant_id: str, start_date: datetime, end_date: datetime, payload: Any):
+        """Store a successful payload for the range."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (endpoint, merchant_id, _hour_key(start_date), _hour_key(end_date),
+             int(is_closed_range(end_date)), time.time(), codec.dumps(payload)),
+        )
+        self.stats['writes'] += 1
+
+    def hit_ratio(self) -> float:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def close(self):
+        self._conn.close()
+
+
+class IntradayAccumulator:
+    """Per-store, per-day store of the settled hour blocks already fetched today.
+
+    ``watermark`` is the last whole hour (inclusive) covered by the stored
+    blocks; -1 means nothing has been accumulated for the day yet.
+
+    Usage:
+        accumulator = IntradayAccumulator()
+        watermark, blocks, records = accumulator.load(merchant_id, today)
+        ...  # fetch hours watermark+1 .. settled hour as one block
+        accumulator.save(merchant_id, today, settled_hour, blocks + [block], records + block_records)
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        # Rollback journal rather than WAL: every write lands in the main file, so a run
+        # that is killed still leaves it complete for the workflow's cache save step
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS intraday ("
+            " merchant_id TEXT NOT NULL, day TEXT NOT NULL, watermark INTEGER NOT NULL,"
+            " blocks TEXT NOT NULL, records TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (merchant_id, day))"
+        )
+
+    def load(self, merchant_id: str, day: date) -> Tuple[int, List[Dict], List[Dict]]:
+        """Return (watermark, summation blocks, detailed records) for the day."""
+        row = self._conn.execute(
+            "SELECT watermark, blocks, records FROM intraday WHERE merchant_id = ? AND day = ?",
+            (merchant_id, day.isoformat()),
+        ).fetchone()
+        if row is None:
+            return -1, [], []
+        return row[0], codec.loads(row[1]), codec.loads(row[2])
+
+    def save(self, merchant_id: str, day: date, watermark: int, blocks: List[Dict], records: List[Dict]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO intraday VALUES (?, ?, ?, ?, ?, ?)",
+            (merchant_id, day.isoformat(), watermark, codec.dumps(blocks), codec.dumps(records), time.time()),
+        )
+
+    def prune(self, before: date):
+        """Drop accumulators for days before ``before``."""
+        self._conn.execute("DELETE FROM intraday WHERE day < ?", (before.isoformat(),))
+
+    def close(self):
+        self._conn.close()
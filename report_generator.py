@@ -12,6 +12,8 @@ from confirmed_hours import (
     get_forecast_hours_wtd,
     find_headcount_csv
 )
+from store_metrics import store_name_of, metric_value, available_hours
+import codec
 
 class ReportGenerator:
     def __init__(self, managers_file='managers.json', output_dir='output', headcount_csv=None):
@@ -23,7 +25,7 @@ class ReportGenerator:
     def load_managers(self):
         try:
             with open(self.managers_file, 'r') as f:
-                data = json.load(f)
+                data = codec.load(f)
                 self.store_map = data.get('stores', {})
                 self.settings = data.get('settings', {'hourly_rate': 11.00, 'avg_item_value': 3.50})
         except FileNotFoundError:
@@ -75,7 +77,7 @@ class ReportGenerator:
         day_of_week = report_date.weekday()
         
         for entry in store_data_list:
-            store_name = entry.get('store', 'Unknown').replace('Morrisons - ', '')
+            store_name = store_name_of(entry).replace('Morrisons - ', '')
             meta = self.store_map.get(store_name, {'region': 'Unknown', 'manager': 'Unassigned'})
             region = meta.get('region', 'Unknown')
             manager = meta.get('manager', 'Unassigned')
@@ -85,22 +87,16 @@ class ReportGenerator:
             if manager not in regions[region]:
                 regions[region][manager] = []
 
-            # Extract basic metrics
-            def parse_metric(val):
-                if isinstance(val, str):
-                    clean = val.replace('%', '').strip()
-                    if clean == '' or clean == 'N/A': return 0.0
-                    return float(clean)
-                return float(val or 0)
-
-            inf_y = parse_metric(entry.get('inf', 0))
-            inf_wtd = parse_metric(entry.get('inf_WTD', 0) if entry.get('has_wtd') else entry.get('inf', 0))
+            # Extract basic metrics (raw numbers for StoreMetrics, parsed for legacy dicts;
+            # WTD falls back to the range value when there is no WTD data)
+            inf_y = metric_value(entry, 'inf')
+            inf_wtd = metric_value(entry, 'inf', wtd=True)
             
-            lates_y = parse_metric(entry.get('lates', 0))
-            lates_wtd = parse_metric(entry.get('lates_WTD', 0) if entry.get('has_wtd') else entry.get('lates', 0))
+            lates_y = metric_value(entry, 'lates')
+            lates_wtd = metric_value(entry, 'lates', wtd=True)
             
-            uph_y = parse_metric(entry.get('uph', 0))
-            uph_wtd = parse_metric(entry.get('uph_WTD', 0) if entry.get('has_wtd') else entry.get('uph', 0))
+            uph_y = metric_value(entry, 'uph')
+            uph_wtd = metric_value(entry, 'uph', wtd=True)
             
             # Calculate Available vs Confirmed Hours, Available vs Requested, and financials
             metrics = self._calculate_avc(entry, store_name, day_of_week)
@@ -147,34 +143,9 @@ class ReportGenerator:
         missed_sales = 0.0
         forecast_wtd = None
         
-        # Get available hours from API data
-        api_data = entry.get('_api_data', {})
-        available_hours_y = api_data.get('time_available_hours', 0.0)
-        
-        # Fallback: parse from formatted time_available string (e.g., "3:45")
-        if not available_hours_y:
-            time_str = entry.get('time_available', '0:00')
-            try:
-                parts = time_str.split(':')
-                if len(parts) == 2:
-                    hours = int(parts[0])
-                    minutes = int(parts[1])
-                    available_hours_y = hours + (minutes / 60.0)
-            except (ValueError, IndexError):
-                available_hours_y = 0.0
-        
-        # Get WTD available hours
-        available_hours_wtd = api_data.get('time_available_hours_wtd', 0.0)
-        if not available_hours_wtd:
-            time_str_wtd = entry.get('time_available_WTD', entry.get('time_available', '0:00'))
-            try:
-                parts = time_str_wtd.split(':')
-                if len(parts) == 2:
-                    hours = int(parts[0])
-                    minutes = int(parts[1])
-                    available_hours_wtd = hours + (minutes / 60.0)
-            except (ValueError, IndexError):
-                available_hours_wtd = 0.0
+        # Get available hours (exact for StoreMetrics / API data, parsed from "3:45" otherwise)
+        available_hours_y = available_hours(entry)
+        available_hours_wtd = available_hours(entry, wtd=True)
         
         # Get confirmed hours from CSV
         confirmed_y = get_confirmed_hours_for_day(self.confirmed_hours, store_name, day_of_week)
@@ -417,7 +388,7 @@ class ReportGenerator:
         
         try:
             with open('config.json', 'r') as f:
-                config = json.load(f)
+                config = codec.load(f)
             gist_id = config.get('dashboard_gist_id')
             gist_token = config.get('gist_token')
         except:
@@ -452,11 +423,11 @@ class ReportGenerator:
             try:
                 get_response = requests.get(gist_url, headers=headers, timeout=15)
                 if get_response.status_code == 200:
-                    gist_content = get_response.json()
+                    gist_content = codec.loads(get_response.content)
                     if 'dashboard_data.json' in gist_content.get('files', {}):
                         file_content = gist_content['files']['dashboard_data.json'].get('content', '{}')
                         try:
-                            fetched_data = json.loads(file_content)
+                            fetched_data = codec.loads(file_content)
                             # Merge fetched data (preserve existing historical data)
                             existing_data['performance'] = fetched_data.get('performance', {})
                             existing_data['inf_items'] = fetched_data.get('inf_items', {})
@@ -481,9 +452,9 @@ class ReportGenerator:
                                     # Retry fetching the now-recovered data
                                     get_response2 = requests.get(gist_url, headers=headers, timeout=15)
                                     if get_response2.status_code == 200:
-                                        gist_content2 = get_response2.json()
+                                        gist_content2 = codec.loads(get_response2.content)
                                         file_content2 = gist_content2['files']['dashboard_data.json'].get('content', '{}')
-                                        fetched_data = json.loads(file_content2)
+                                        fetched_data = codec.loads(file_content2)
                                         existing_data['performance'] = fetched_data.get('performance', {})
                                         existing_data['inf_items'] = fetched_data.get('inf_items', {})
                                         existing_data['metadata'] = fetched_data.get('metadata', existing_data['metadata'])
@@ -543,9 +514,9 @@ class ReportGenerator:
             
             # Validate JSON before updating gist
             try:
-                json_content = json.dumps(existing_data, indent=2)
+                json_content = codec.dumps(existing_data, indent=2)
                 # Try parsing it back to ensure it's valid
-                json.loads(json_content)
+                codec.loads(json_content)
                 
                 # MONITOR GIST SIZE - GitHub has ~920KB limit
                 size_bytes = len(json_content)
@@ -579,7 +550,8 @@ class ReportGenerator:
             }
             
             try:
-                update_response = requests.patch(gist_url, headers=headers, json=update_payload, timeout=15)
+                update_response = requests.patch(gist_url, headers={**headers, 'Content-Type': 'application/json'},
+                                                 data=codec.dumps(update_payload).encode('utf-8'), timeout=15)
                 if update_response.status_code in [200, 201]:
                     print(f"✅ Dashboard Gist updated ({len(existing_data['performance'])} days of history)")
                     return True
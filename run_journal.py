@@ -0,0 +1,125 @@
+# =======================================================================================
+#                  RUN JOURNAL MODULE - Crash-safe Per-store Results for --resume
+# =======================================================================================
+# Each completed store result is appended (and flushed) to a JSONL journal as soon as it
+# is processed, so a run that is killed part way - e.g. by the workflow timeout - leaves
+# everything it finished on disk. ``--resume`` reopens the journal for the same date
+# range, skips the stores already in it and feeds their results into the report stage.
+#
+# Layout: one ``{"meta": ...}`` line per run that wrote to the journal (run ID, start
+# time), then ``{"record": ...}`` lines. A torn last line from a crash is ignored.
+# =======================================================================================
+
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import codec
+
+JOURNAL_DIR = os.path.join('output', 'journal')
+
+
+def run_id() -> str:
+    """GitHub Actions run ID (with attempt) when available, else a local timestamp."""
+    if os.environ.get('GITHUB_RUN_ID'):
+        return f"{os.environ['GITHUB_RUN_ID']}.{os.environ.get('GITHUB_RUN_ATTEMPT', '1')}"
+    return datetime.now().strftime('local-%Y%m%d%H%M%S')
+
+
+def journal_key(date_range: Optional[Dict], today: str) -> str:
+    """Filesystem-safe key for a resolved date range (``today`` when date ranges are off).
+
+    The built-in modes (``today``, ``yesterday``, ``last_7_days``, ...) carry no explicit
+    dates - the dashboard resolves them - so their key is the mode plus ``today``.
+    """
+    if not date_range:
+        return f"default_{today}"
+    parts = [date_range.get(field) for field in ('start_date', 'start_time', 'end_date', 'end_time')]
+    if not any(parts):
+        parts = [date_range.get('mode') or 'default', today]
+    return re.sub(r'[^0-9A-Za-z_]+', '', '_'.join(str(part) for part in parts if part))
+
+
+class RunJournal:
+    """Append-only journal of completed store results for one kind of run and date range.
+
+    Usage:
+        journal = RunJournal.open('perf', journal_key(date_range, today), resume=args.resume)
+        done = journal.records            # results from earlier runs (empty unless resuming)
+        journal.append(record)            # JSON-safe result, once per completed store
+        journal.finish()                  # run reported - the journal is no longer needed
+    """
+
+    def __init__(self, path: str, records: List, run: str):
+        self.path = path
+        self.records = records
+        self.run_id = run
+        self._file = None
+
+    @classmethod
+    def open(cls, kind: str, key: str, resume: bool = False, directory: str = JOURNAL_DIR,
+             app_logger=None) -> 'RunJournal':
+        """Open the journal for ``kind``/``key``; without ``resume`` any old one is discarded."""
+        path = os.path.join(directory, f"{kind}-{key}.jsonl")
+        records = []
+        if resume and os.path.exists(path):
+            records = cls.read(path, app_logger)
+            if app_logger:
+                app_logger.info(f"Resuming from {path}: {len(records)} stores already done")
+        elif resume and app_logger:
+            app_logger.info(f"No journal at {path} to resume from, starting a full run")
+        journal = cls(path, records, run_id())
+        os.makedirs(directory, exist_ok=True)
+        journal._file = open(path, 'a' if records else 'w', encoding='utf-8')
+        if records and not cls._ends_with_newline(path):
+            journal._file.write('\n')  # keep a torn last line from running into ours
+        journal._write({'meta': {'kind': kind, 'key': key, 'run_id': journal.run_id,
+                                 'started': datetime.now().isoformat(), 'resumed': len(records)}})
+        return journal
+
+    @staticmethod
+    def read(path: str, app_logger=None) -> List:
+        records = []
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = codec.loads(line)
+                except ValueError:
+                    if app_logger:
+                        app_logger.warning(f"Skipping unreadable line {number} of {path} (interrupted write)")
+                    continue
+                if 'record' in entry:
+                    records.append(entry['record'])
+        return records
+
+    @staticmethod
+    def _ends_with_newline(path: str) -> bool:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if not f.tell():
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _write(self, entry: Dict):
+        self._file.write(codec.dumps(entry) + '\n')
+        self._file.flush()
+
+    def append(self, record):
+        """Journal one completed store (flushed immediately)."""
+        if self._file is not None:
+            self._write({'record': record})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self):
+        """Close and delete the journal once the run has been reported."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
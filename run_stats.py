@@ -0,0 +1,290 @@
+# =======================================================================================
+#                  RUN STATS MODULE - Windowed Counters and Latency Histograms
+# =======================================================================================
+# One place for the numbers a run produces while it is running: failures over the last
+# minute, latency percentiles per phase (collection, submission, API requests) and a
+# per-store breakdown. Everything is bounded - counters and windows are bucketed by the
+# second and histograms use fixed log-spaced buckets - so memory does not grow with the
+# number of stores or requests.
+#
+# All methods are synchronous and never await, so callers on the event loop don't need
+# a lock around them.
+# =======================================================================================
+
+import math
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+HISTOGRAM_MIN = 0.001    # seconds; anything faster shares the first bucket
+HISTOGRAM_GROWTH = 1.05  # bucket width, i.e. percentiles are within ~5%
+_LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+
+OUTCOME_OK = 'ok'
+
+
+def _now(now: Optional[float]) -> float:
+    return time.monotonic() if now is None else now
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram of durations in seconds.
+
+    Percentiles are reported as the upper bound of the bucket they fall in,
+    clamped to the observed min/max, so a single sample reports exactly.
+    """
+
+    __slots__ = ('buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        index = 0 if value <= HISTOGRAM_MIN else math.ceil(math.log(value / HISTOGRAM_MIN) / _LOG_GROWTH)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.min = value if not self.count else min(self.min, value)
+        self.max = value if not self.count else max(self.max, value)
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: 'LatencyHistogram'):
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        if other.count:
+            self.min = other.min if not self.count else min(self.min, other.min)
+            self.max = other.max if not self.count else max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """Approximate percentile, e.g. ``percentile(0.95)`` (0.0 when empty)."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                upper = HISTOGRAM_MIN * HISTOGRAM_GROWTH ** index
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {'buckets': {str(index): n for index, n in self.buckets.items()},
+                'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LatencyHistogram':
+        histogram = cls()
+        histogram.buckets = {int(index): n for index, n in data['buckets'].items()}
+        histogram.count, histogram.total = data['count'], data['total']
+        histogram.min, histogram.max = data['min'], data['max']
+        return histogram
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count, 'mean': self.mean,
+            'p50': self.percentile(0.50), 'p95': self.percentile(0.95), 'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+
+class WindowedCounter:
+    """Event count over a sliding window, bucketed per ``bucket_seconds``.
+
+    ``add()`` and ``count()`` are O(1) amortised; ``total`` counts the whole run.
+    """
+
+    def __init__(self, window_seconds: float = 60.0, bucket_seconds: float = 1.0):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.total = 0
+        self._buckets = deque()  # [bucket start, count]
+        self._in_window = 0
+
+    def add(self, n: int = 1, now: float = None):
+        now = _now(now)
+        start = now - now % self.bucket_seconds
+        if self._buckets and self._buckets[-1][0] == start:
+            self._buckets[-1][1] += n
+        else:
+            self._buckets.append([start, n])
+        self._in_window += n
+        self.total += n
+        self._expire(now)
+
+    def _expire(self, now: float):
+        horizon = now - self.window_seconds
+        while self._buckets and self._buckets[0][0] + self.bucket_seconds <= horizon:
+            self._in_window -= self._buckets.popleft()[1]
+
+    def count(self, now: float = None, since: float = None) -> int:
+        """Events in the window; with ``since``, only buckets started at or after it."""
+        self._expire(_now(now))
+        if since is None:
+            return self._in_window
+        return sum(n for start, n in self._buckets if start >= since)
+
+
+class WindowedHistogram:
+    """Latency histogram over a sliding window, one small histogram per bucket."""
+
+    def __init__(self, window_seconds: float = 30.0, bucket_seconds: float = 1.0):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self._buckets = deque()  # (bucket start, LatencyHistogram)
+
+    def add(self, value: float, now: float = None):
+        now = _now(now)
+        start = now - now % self.bucket_seconds
+        if not self._buckets or self._buckets[-1][0] != start:
+            self._buckets.append((start, LatencyHistogram()))
+        self._buckets[-1][1].add(value)
+        horizon = now - self.window_seconds
+        while self._buckets and self._buckets[0][0] + self.bucket_seconds <= horizon:
+            self._buckets.popleft()
+
+    def snapshot(self, now: float = None, since: float = None) -> LatencyHistogram:
+        """Merged histogram of the window (optionally only buckets started at or after ``since``)."""
+        horizon = _now(now) - self.window_seconds
+        merged = LatencyHistogram()
+        for start, histogram in self._buckets:
+            if start + self.bucket_seconds <= horizon or (since is not None and start < since):
+                continue
+            merged.merge(histogram)
+        return merged
+
+
+class RunStats:
+    """Run-wide statistics shared by the scraper, workers, INF scraper and controllers.
+
+    - ``record_failure()`` / ``recent_failures()``: failures in the last ``failure_window`` seconds
+    - ``record_latency(name, seconds, store)``: per-phase histograms ('collection', 'submission', ...)
+    - ``record_request(latency, outcome)``: API requests for the concurrency controller
+    - ``store_breakdown()``: per-store attempts, failures and phase durations
+
+    Usage:
+        run_stats = RunStats()
+        run_stats.record_latency('collection', 1.8, store='Leeds')
+        run_stats.latency('collection').percentile(0.95)
+    """
+
+    def __init__(self, failure_window: float = 60.0, request_window: float = 30.0):
+        self.failures = WindowedCounter(failure_window)
+        self.latencies: Dict[str, LatencyHistogram] = {}
+        self.requests = WindowedHistogram(request_window)
+        self.request_outcomes: Dict[str, WindowedCounter] = {}
+        self.request_window = request_window
+        self.stores: Dict[str, Dict] = {}
+
+    def _store(self, store: str) -> Dict:
+        entry = self.stores.get(store)
+        if entry is None:
+            entry = self.stores[store] = {'failures': 0}
+        return entry
+
+    def record_failure(self, store: str = None, now: float = None):
+        self.failures.add(now=now)
+        if store:
+            self._store(store)['failures'] += 1
+
+    def recent_failures(self, now: float = None) -> int:
+        return self.failures.count(now)
+
+    def record_latency(self, name: str, seconds: float, store: str = None):
+        histogram = self.latencies.get(name)
+        if histogram is None:
+            histogram = self.latencies[name] = LatencyHistogram()
+        histogram.add(seconds)
+        if store:
+            entry = self._store(store)
+            entry[name] = entry.get(name, 0.0) + seconds
+
+    def latency(self, name: str) -> LatencyHistogram:
+        """Histogram for a phase (empty if nothing was recorded)."""
+        return self.latencies.get(name) or LatencyHistogram()
+
+    def record_request(self, latency: float, outcome: str = OUTCOME_OK, now: float = None):
+        """Record one API request; only ``'ok'`` requests feed the latency window."""
+        now = _now(now)
+        counter = self.request_outcomes.get(outcome)
+        if counter is None:
+            counter = self.request_outcomes[outcome] = WindowedCounter(self.request_window)
+        counter.add(now=now)
+        if outcome == OUTCOME_OK:
+            self.requests.add(latency, now=now)
+        self.record_latency('api_request', latency)
+
+    def request_snapshot(self, now: float = None, since: float = None) -> Dict:
+        """Recent request latency percentiles and counts per outcome."""
+        now = _now(now)
+        histogram = self.requests.snapshot(now, since)
+        counts = {outcome: counter.count(now, since) for outcome, counter in self.request_outcomes.items()}
+        return {
+            'samples': sum(counts.values()),
+            'p50': histogram.percentile(0.50),
+            'p95': histogram.percentile(0.95),
+            'counts': counts,
+        }
+
+    def request_totals(self) -> Dict[str, int]:
+        return {outcome: counter.total for outcome, counter in self.request_outcomes.items()}
+
+    def extremes(self, name: str) -> Tuple[Tuple[str, float], Tuple[str, float]]:
+        """(fastest, slowest) stores for a phase as (store, seconds) - ("N/A", 0) when empty."""
+        timed = [(store, entry[name]) for store, entry in self.stores.items() if name in entry]
+        if not timed:
+            return ("N/A", 0), ("N/A", 0)
+        return min(timed, key=lambda x: x[1]), max(timed, key=lambda x: x[1])
+
+    def store_breakdown(self, sort_by: str = 'collection') -> List[Dict]:
+        """Per-store rows, slowest first by ``sort_by``."""
+        rows = [dict(entry, store=store) for store, entry in self.stores.items()]
+        return sorted(rows, key=lambda row: row.get(sort_by, 0.0), reverse=True)
+
+    def merge(self, other: 'RunStats'):
+        """Fold another process's stats into this one (run totals only - windows stay local)."""
+        self.failures.total += other.failures.total
+        for name, histogram in other.latencies.items():
+            self.latencies.setdefault(name, LatencyHistogram()).merge(histogram)
+        for outcome, counter in other.request_outcomes.items():
+            self.request_outcomes.setdefault(outcome, WindowedCounter(self.request_window)).total += counter.total
+        for store, entry in other.stores.items():
+            mine = self._store(store)
+            for key, value in entry.items():
+                mine[key] = mine.get(key, 0) + value
+
+    def to_dict(self) -> Dict:
+        """Run totals as JSON (for shard artifacts); windows are not kept."""
+        return {
+            'failures': self.failures.total,
+            'latencies': {name: histogram.to_dict() for name, histogram in self.latencies.items()},
+            'requests': self.request_totals(),
+            'stores': self.stores,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RunStats':
+        stats = cls()
+        stats.failures.total = data['failures']
+        stats.latencies = {name: LatencyHistogram.from_dict(h) for name, h in data['latencies'].items()}
+        for outcome, total in data['requests'].items():
+            stats.request_outcomes[outcome] = WindowedCounter(stats.request_window)
+            stats.request_outcomes[outcome].total = total
+        stats.stores = {store: dict(entry) for store, entry in data['stores'].items()}
+        return stats
+
+    def summary(self) -> Dict:
+        return {
+            'failures': self.failures.total,
+            'latency': {name: histogram.summary() for name, histogram in self.latencies.items()},
+            'requests': self.request_totals(),
+        }
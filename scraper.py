@@ -12,6 +12,7 @@ from threading import Lock
 from typing import Dict, List
 import re
 import os
+import math
 import argparse
 from datetime import datetime
 from pytz import timezone
@@ -22,10 +23,30 @@ from utils import setup_logging, sanitize_store_name, _save_screenshot, load_def
 from auth import check_if_login_needed, perform_login_and_otp, prime_master_session
 from date_range import get_date_time_range_from_config, apply_date_time_range
 from webhook import (post_to_chat_webhook, post_job_summary, post_performance_highlights,
-                    post_quick_actions_card, add_to_pending_chat, flush_pending_chat_entries, log_submission)
-from workers import auto_concurrency_manager, data_processor_worker, process_single_store, worker_task, api_worker_task
-from inf_scraper import run_inf_analysis
+                    post_quick_actions_card, log_submission, store_grid_row, STORE_CARD_OVERHEAD)
+from workers import (auto_concurrency_manager, data_processor_worker, process_single_store, worker_task, api_worker_task,
+                     MAX_WTD_BACKFILL_DAYS)
+from inf_scraper import (run_inf_analysis, merge_inf_shards, collect_inf_results, report_inf_results,
+                         fetch_run_bearer_token, open_inf_journal, prioritise_inf_stores)
 from report_generator import ReportGenerator
+from api_scraper import SellerCentralClient
+from store_metrics import store_name_of, metric_value, metric_display, entry_to_json, entry_from_json
+import codec
+from metrics_cache import MetricsCache, IntradayAccumulator, DEFAULT_OPEN_RANGE_TTL
+from concurrency_controller import AIMDController
+from run_stats import RunStats
+from context_pool import BrowserContextPool, DEFAULT_MAX_USES
+from store_schedule import StoreDurations
+from run_journal import RunJournal, journal_key
+from chat_sender import ChatSender
+from submission_log import SubmissionLogWriter
+from card_packer import json_size, DEFAULT_MAX_BYTES
+from chat_client import close_chat_client, configure as configure_chat_client, same_space
+from loop_monitor import start_loop_monitor, stop_loop_monitor, phase
+from deadline import DeadlineBudget, parse_deadline, SHED_WTD, DEFAULT_RESERVE_SECONDS
+from sharding import (partition_stores, start_shard_processes, drain_shard_results, RECORD, DONE,
+                      parse_shard_spec, shard_artifact_path, shard_config, write_shard_artifact,
+                      read_shard_artifacts, missing_shards)
 
 #######################################################################
 #                             APP SETUP & LOGGING
@@ -58,9 +79,18 @@ parser.add_argument('--end-time', help='End time (e.g., "11:59 PM")')
 parser.add_argument('--relative-days', type=int, help='Days offset for relative mode')
 parser.add_argument('--inf-mode', choices=['top10', 'all'], default='top10', help='INF analysis mode: top10 worst stores or all stores')
 parser.add_argument('--inf-only', action='store_true', help='Run ONLY INF analysis for all stores, skipping dashboard metrics')
+parser.add_argument('--with-inf', action='store_true', help='Run the full INF analysis alongside dashboard metrics in the same browser session and concurrency budget')
 parser.add_argument('--top-n', type=int, default=5, help='Number of top INF items to show per store (5, 10, or 25)')
+parser.add_argument('--processes', type=int, default=config.get('processes', 1), help='Split the stores across N worker processes, each with its own browser')
+parser.add_argument('--shard', type=parse_shard_spec, help='Process only shard i of n (e.g. 2/4) and write its results to output/shards')
+parser.add_argument('--resume', action='store_true', help='Skip stores already completed by an interrupted run for the same date range and report them with this run')
+parser.add_argument('--deadline', help='Time budget: minutes from now (e.g. 85) or @<unix time>. Optional work is dropped and collection stops early so the run still reports in time')
+parser.add_argument('--loop-monitor', action='store_true', help='Log event-loop stalls with the blocking stack and summarise the worst offenders per phase at the end of the run')
+parser.add_argument('--merge', nargs='+', metavar='PATH', help='Report the results of --shard runs (artifact files or directories) without scraping')
 
 args, unknown = parser.parse_known_args()
+if args.with_inf and (args.inf_only or args.shard or args.merge or args.processes > 1):
+    parser.error("--with-inf runs both analyses in one process and can't be combined with --inf-only, --shard, --merge or --processes")
 
 # Merge CLI args into config (CLI takes precedence)
 if args.date_mode:
@@ -80,12 +110,21 @@ if (args.start_date or args.end_date) and not args.date_mode:
     config['date_range_mode'] = 'custom'
 
 DEBUG_MODE      = config.get('debug', False)
+PROCESSES       = max(1, args.processes)
+SHARD           = args.shard  # (index, count) with --shard, else None
+DEADLINE        = parse_deadline(args.deadline) if args.deadline else None  # Unix time, or None
 LOGIN_URL       = config['login_url']
 CHAT_WEBHOOK_URL = config.get('chat_webhook_url')
 STORE_WEBHOOK_URL = config.get('store_webhook_url') or CHAT_WEBHOOK_URL
 PERFORMANCE_WEBHOOK_URL = config.get('performance_webhook_url') or CHAT_WEBHOOK_URL
+INF_WEBHOOK_URL = config.get('inf_webhook_url') or CHAT_WEBHOOK_URL
 APPS_SCRIPT_URL = config.get('apps_script_webhook_url')  # Optional - for interactive buttons
 CHAT_BATCH_SIZE  = config.get('chat_batch_size', 100)
+CHAT_SEND_RETRIES = config.get('chat_send_retries', 0)  # Extra attempts if posting a batch raised (the chat client retries HTTP errors)
+CHAT_DRAIN_TIMEOUT = config.get('chat_drain_timeout', 60)  # Max seconds to post queued cards at shutdown
+configure_chat_client(rate=config.get('chat_rate_per_space', 1.0),  # Messages/sec per Chat space
+                      burst=config.get('chat_burst', 1))
+CHAT_CARD_MAX_BYTES = config.get('chat_card_max_bytes', DEFAULT_MAX_BYTES)  # Fill chat cards up to this size
 STORE_PREFIX_RE  = re.compile(r"^morrisons\s*-\s*", re.I)
 
 # --- Constants for target-based emojis ---
@@ -107,6 +146,16 @@ INF_THRESHOLD = 2.0
 INITIAL_CONCURRENCY = config.get('initial_concurrency', 30)
 NUM_FORM_SUBMITTERS = config.get('num_form_submitters', 2)
 USE_API_FIRST = config.get('use_api_first', True)  # Enable API-first scraping by default
+USE_HTTP_CONTEXT_SWITCH = config.get('use_http_context_switch', False)  # Switch store context without Chromium (opt-in)
+USE_METRICS_CACHE = config.get('use_metrics_cache', True)  # Reuse API responses for closed date ranges
+METRICS_CACHE_TTL = config.get('metrics_cache_ttl_seconds', DEFAULT_OPEN_RANGE_TTL)  # Freshness of today's range
+WTD_BACKFILL_MAX_DAYS = config.get('wtd_backfill_max_days', MAX_WTD_BACKFILL_DAYS)  # Uncached WTD days fetched before going live
+INTRADAY_INCREMENTAL = config.get('intraday_incremental', False)  # Only fetch today's hours since the last run
+CONTEXT_RECYCLE_AFTER = config.get('context_recycle_after', DEFAULT_MAX_USES)  # Stores per browser context
+SCHEDULE_LONGEST_FIRST = config.get('schedule_longest_first', True)  # Queue slowest stores (by history) first
+STORE_DURATIONS_FILE = os.path.join('output', 'store_durations.json')
+DEADLINE_RESERVE_SECONDS = config.get('deadline_reserve_seconds', DEFAULT_RESERVE_SECONDS)  # Kept for reporting
+FAST_CODEC = codec.configure(config.get('use_fast_codec', False))  # orjson/uvloop when installed
 
 AUTO_CONF = config.get('auto_concurrency', {})
 AUTO_ENABLED = AUTO_CONF.get('enabled', False)
@@ -117,9 +166,16 @@ CPU_LOWER_THRESHOLD = AUTO_CONF.get('cpu_lower_threshold', 65)
 MEM_UPPER_THRESHOLD = AUTO_CONF.get('mem_upper_threshold', 90)
 CHECK_INTERVAL = AUTO_CONF.get('check_interval_seconds', 5)
 COOLDOWN_SECONDS = AUTO_CONF.get('cooldown_seconds', 15)
+AUTO_STRATEGY = AUTO_CONF.get('strategy', 'aimd' if USE_API_FIRST else 'cpu')  # 'aimd' (latency/429) or 'cpu' (psutil)
+AIMD_TARGET_P95 = AUTO_CONF.get('target_p95_seconds', 2.0)
+AIMD_WINDOW_SECONDS = AUTO_CONF.get('window_seconds', 30)
+CONCURRENCY_DECISIONS_FILE = os.path.join('output', 'concurrency_decisions.csv')
 
 LOG_FILE        = os.path.join('output', 'submissions.log')
 JSON_LOG_FILE   = os.path.join('output', 'submissions.jsonl')
+LOG_FLUSH_INTERVAL = config.get('log_flush_interval', 1.0)  # Max seconds submission log lines sit in the buffer
+LOOP_MONITOR = args.loop_monitor or config.get('loop_monitor', False)  # Find blocking calls on the event loop
+LOOP_MONITOR_THRESHOLD = config.get('loop_monitor_threshold_ms', 100) / 1000  # Lag or callback time that counts as a stall
 STORAGE_STATE   = 'state.json'
 OUTPUT_DIR      = 'output'
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -138,19 +194,17 @@ RESOURCE_BLOCKLIST = [
 #                      GLOBALS
 #######################################################################
 
-log_lock      = asyncio.Lock()
 progress_lock = Lock()
 urls_data     = []
 progress      = {"current": 0, "total": 0, "lastUpdate": "N/A"}
 run_failures  = []
 start_time    = None
-failure_timestamps = []
-failure_lock = asyncio.Lock()
+# Failures, latencies and per-store timings for the run (see run_stats.py)
+run_stats = RunStats(request_window=AIMD_WINDOW_SECONDS)
 
 # Metrics for Advanced Reporting
 metrics = {
-    "collection_times": [],
-    "submission_times": [],
+    "stats": run_stats,
     "retries": 0,
     "total_orders": 0,
     "total_units": 0,
@@ -158,12 +212,9 @@ metrics = {
 }
 metrics_lock = asyncio.Lock()
 
-pending_chat_entries: List[Dict[str, str]] = []
-pending_chat_lock = asyncio.Lock()
-chat_batch_count = 0
 
 # Track all submitted store data for performance highlights
-submitted_store_data: List[Dict[str, str]] = []
+submitted_store_data: List = []  # StoreMetrics (API path) or legacy form dicts
 submitted_data_lock = asyncio.Lock()
 
 playwright = None
@@ -179,8 +230,205 @@ last_concurrency_change_ref = {'value': 0.0}
 #                  MAIN PROCESS LOOP & ORCHESTRATION
 #######################################################################
 
+def get_date_range():
+    return get_date_time_range_from_config(config, LOCAL_TIMEZONE, app_logger)
+
+
+async def apply_date_range_wrapper(page, store_name):
+    return await apply_date_time_range(page, store_name, get_date_range, ACTION_TIMEOUT, DEBUG_MODE, app_logger)
+
+
+async def process_store_wrapper(context, store_info, queue):
+    await process_single_store(context, store_info, queue, WORKER_RETRY_COUNT, RESOURCE_BLOCKLIST,
+                               apply_date_range_wrapper, WAIT_TIMEOUT, ACTION_TIMEOUT,
+                               metrics_lock, metrics, run_failures,
+                               DEBUG_MODE, app_logger)
+
+
+def load_store_durations():
+    """Per-store duration history for longest-first ordering (None when disabled)."""
+    if not SCHEDULE_LONGEST_FIRST:
+        return None
+    return StoreDurations.load(STORE_DURATIONS_FILE, app_logger=app_logger)
+
+
+def save_store_durations(durations: StoreDurations):
+    """Fold this run's collection times into the history for the next run."""
+    durations.update(run_stats.store_breakdown())
+    try:
+        durations.save()
+    except OSError as e:
+        app_logger.warning(f"Could not save store durations: {e}")
+
+
+async def launch_browser(pw) -> Browser:
+    return await pw.chromium.launch(
+        headless=not DEBUG_MODE,
+        args=[
+            "--disable-gpu",
+            "--disable-dev-shm-usage",
+            "--no-sandbox",
+            "--disable-setuid-sandbox",
+            "--disable-accelerated-2d-canvas",
+            "--disable-gl-drawing-for-tests",
+        ]
+    )
+
+
+async def collect_store_metrics(stores: List[Dict], storage_template: Dict, submission_queue: Queue,
+                                share: int = 1):
+    """Scrape ``stores`` with the worker pool and put each result on ``submission_queue``.
+
+    Args:
+        stores: Store rows from urls.csv
+        storage_template: Playwright storage state used for every browser context
+        submission_queue: Receives one StoreMetrics (or legacy dict) per store
+        share: Number of processes the run is split across; the worker pool and
+            concurrency bounds are divided by it so the whole run keeps the
+            configured concurrency against Amazon
+    """
+    pool_size = max(1, math.ceil(config.get('initial_concurrency', 30) / share))
+    concurrency_limit_ref['value'] = pool_size
+    
+    durations = load_store_durations()
+    if durations:
+        stores = durations.longest_first(stores)
+    job_queue = Queue()
+    for store in stores:
+        job_queue.put_nowait(store)
+    
+    deadline = None
+    if DEADLINE:
+        deadline = DeadlineBudget(DEADLINE, tiers=(SHED_WTD,), reserve_seconds=DEADLINE_RESERVE_SECONDS,
+                                  app_logger=app_logger)
+        app_logger.info(f"Deadline in {(DEADLINE - datetime.now().timestamp()) / 60:.0f} min "
+                        f"({DEADLINE_RESERVE_SECONDS}s kept for reporting)")
+    
+    # Start Auto-concurrency Manager. API-first runs are I/O-bound, so by default they are
+    # tuned from API latency and throttling (AIMD) rather than from local CPU load.
+    use_aimd = AUTO_ENABLED and USE_API_FIRST and AUTO_STRATEGY == 'aimd'
+    auto_max = max(1, math.ceil(AUTO_MAX_CONCURRENCY / share))
+    auto_min = min(AUTO_MIN_CONCURRENCY, auto_max)
+    concurrency_controller = None
+    controller_task = None
+    if use_aimd:
+        concurrency_controller = AIMDController(
+            concurrency_limit_ref, concurrency_condition, auto_min, auto_max,
+            target_p95=AIMD_TARGET_P95, window_seconds=AIMD_WINDOW_SECONDS, cooldown=COOLDOWN_SECONDS,
+            run_stats=run_stats, app_logger=app_logger
+        )
+        # Spawn enough workers for the controller to grow into; the extra ones wait on the limit
+        pool_size = max(pool_size, auto_max)
+        controller_task = asyncio.create_task(concurrency_controller.run(CHECK_INTERVAL))
+    elif AUTO_ENABLED:
+        asyncio.create_task(auto_concurrency_manager(
+            concurrency_limit_ref, last_concurrency_change_ref, AUTO_ENABLED, auto_min,
+            auto_max, CPU_UPPER_THRESHOLD, CPU_LOWER_THRESHOLD, MEM_UPPER_THRESHOLD,
+            CHECK_INTERVAL, COOLDOWN_SECONDS, run_stats,
+            concurrency_condition, app_logger
+        ))
+
+    # Browser contexts are leased per store and follow the concurrency limit
+    context_pool = BrowserContextPool(browser, storage_template, concurrency_limit_ref, PAGE_TIMEOUT,
+                                      ACTION_TIMEOUT, max_uses=CONTEXT_RECYCLE_AFTER, app_logger=app_logger)
+    
+    # Start Worker Pool - use API-first workers if enabled, otherwise browser workers
+    http_client = None
+    metrics_cache = None
+    intraday_accumulator = None
+    if USE_API_FIRST:
+        app_logger.info(f"Spinning up {pool_size} API-first workers (optimized mode)...")
+        # One keep-alive client for the whole run so stores reuse TLS connections
+        http_client = SellerCentralClient(limit=pool_size * 2)
+        if concurrency_controller:
+            http_client.add_observer(concurrency_controller.record)
+        await http_client.start()
+        metrics_cache = MetricsCache(open_ttl=METRICS_CACHE_TTL) if USE_METRICS_CACHE else None
+        if INTRADAY_INCREMENTAL:
+            intraday_accumulator = IntradayAccumulator()
+            intraday_accumulator.prune(before=datetime.now(LOCAL_TIMEZONE).date())
+        api_workers = [
+            asyncio.create_task(api_worker_task(
+                i+1, browser, storage_template, job_queue, submission_queue, PAGE_TIMEOUT, ACTION_TIMEOUT,
+                active_workers_ref, concurrency_limit_ref, concurrency_condition, get_date_range, app_logger,
+                http_client=http_client, http_context_switch=USE_HTTP_CONTEXT_SWITCH,
+                metrics_cache=metrics_cache, intraday_accumulator=intraday_accumulator,
+                run_stats=run_stats, context_pool=context_pool, retry_attempts=WORKER_RETRY_COUNT,
+                metrics_lock=metrics_lock, metrics=metrics, deadline=deadline,
+                max_wtd_backfill_days=WTD_BACKFILL_MAX_DAYS
+            ))
+            for i in range(pool_size)
+        ]
+    else:
+        app_logger.info(f"Spinning up {pool_size} browser workers (legacy mode)...")
+        api_workers = [
+            asyncio.create_task(worker_task(
+                i+1, browser, storage_template, job_queue, submission_queue, PAGE_TIMEOUT, ACTION_TIMEOUT,
+                process_store_wrapper, active_workers_ref, concurrency_limit_ref,
+                concurrency_condition, app_logger, context_pool=context_pool, deadline=deadline
+            ))
+            for i in range(pool_size)
+        ]
+    
+    # Wait for all API/scraping workers to finish
+    try:
+        await asyncio.gather(*api_workers)
+    finally:
+        # Close the on-disk stores even when collection fails, so the run's writes are kept
+        if metrics_cache:
+            app_logger.info(f"Metrics cache: {metrics_cache.stats['hits']} hits, {metrics_cache.stats['misses']} misses "
+                            f"({metrics_cache.hit_ratio():.0%} hit ratio), {metrics_cache.stats['writes']} writes")
+            metrics_cache.close()
+        if intraday_accumulator:
+            intraday_accumulator.close()
+    if durations and share == 1:
+        save_store_durations(durations)
+    
+    if deadline:
+        deadline.skipped = job_queue.qsize()
+        if deadline.skipped:
+            app_logger.warning(f"Deadline reached: {deadline.skipped} stores not collected")
+            run_failures.append(f"{deadline.skipped} stores (Deadline)")
+        async with metrics_lock:
+            metrics["deadline"] = deadline.summary()
+    
+    await context_pool.close()
+    pool_stats = context_pool.stats
+    app_logger.info(f"Browser contexts: {pool_stats['created']} created (peak {pool_stats['peak_open']} open), "
+                    f"{pool_stats['reused']} reused, {pool_stats['recycled']} recycled, {pool_stats['trimmed']} trimmed")
+    
+    collection = run_stats.latency('collection')
+    if collection.count:
+        slowest = ", ".join(f"{row['store']} ({row['collection']:.1f}s)"
+                            for row in run_stats.store_breakdown()[:5] if 'collection' in row)
+        app_logger.info(f"Collection latency: p50 {collection.percentile(0.50):.2f}s, "
+                        f"p95 {collection.percentile(0.95):.2f}s, p99 {collection.percentile(0.99):.2f}s; "
+                        f"slowest: {slowest}")
+    
+    if concurrency_controller:
+        controller_task.cancel()
+        await asyncio.gather(controller_task, return_exceptions=True)
+        summary = concurrency_controller.summary()
+        app_logger.info(f"AIMD concurrency: final limit {summary['final_limit']} "
+                        f"(range {summary['lowest_limit']}-{summary['peak_limit']}, "
+                        f"{summary['increases']} increases, {summary['decreases']} decreases), "
+                        f"requests {summary['requests']}")
+        concurrency_controller.write_decisions(CONCURRENCY_DECISIONS_FILE)
+        async with metrics_lock:
+            metrics["concurrency"] = summary
+    
+    if http_client:
+        conn_stats = http_client.connection_stats()
+        app_logger.info(f"API client: {conn_stats['requests']} requests, "
+                        f"{conn_stats['connections_created']} new connections, "
+                        f"{conn_stats['connections_reused']} reused ({conn_stats['reuse_ratio']:.0%} reuse)")
+        async with metrics_lock:
+            metrics["http_client"] = conn_stats
+        await http_client.close()
+
+
 async def process_urls():
-    global progress, start_time, run_failures, browser, chat_batch_count
+    global run_failures, browser
     
     pool_size = config.get('initial_concurrency', 30)
     app_logger.info(f"Job 'process_urls' started with Worker Pool size: {pool_size}")
@@ -198,7 +446,7 @@ async def process_urls():
         try:
             first_store = urls_data[0]
             test_dash_url = f"https://sellercentral.amazon.co.uk/snowdash?ref_=mp_home_logo_xx&cor=mmp_EU&mons_sel_dir_mcid={first_store['merchant_id']}&mons_sel_mkid={first_store['marketplace_id']}"
-            with open(STORAGE_STATE) as f: storage_for_check = json.load(f)
+            with open(STORAGE_STATE) as f: storage_for_check = codec.load(f)
             temp_context = await browser.new_context(storage_state=storage_for_check)
             temp_page = await temp_context.new_page()
             if not await check_if_login_needed(temp_page, test_dash_url, PAGE_TIMEOUT, DEBUG_MODE, app_logger):
@@ -238,68 +486,121 @@ async def process_urls():
         app_logger.info("INF ONLY mode enabled. Skipping dashboard scraping.")
         # Pass None for target_stores so the full network summary and quick actions are included
         # The INF scraper will load stores internally when target_stores is None
-        await run_inf_analysis(None, browser, config)
+        await run_inf_analysis(None, browser, config, processes=PROCESSES, shard=SHARD, resume=args.resume,
+                                deadline=DEADLINE)
         return
 
-    with open(STORAGE_STATE) as f: storage_template = json.load(f)
+    with open(STORAGE_STATE) as f: storage_template = codec.load(f)
     
-    # Queues
-    job_queue = Queue()
-    submission_queue = Queue()
+    if SHARD:
+        await collect_shard_artifact(storage_template)
+        return
     
-    # Populate Job Queue
-    for store in urls_data:
-        job_queue.put_nowait(store)
+    # Every processed store is journaled so an interrupted run can be continued with --resume
+    journal = RunJournal.open('perf', journal_key(get_date_range(), datetime.now(LOCAL_TIMEZONE).strftime('%Y%m%d')),
+                              resume=args.resume, app_logger=app_logger)
+    resumed = [entry_from_json(record) for record in journal.records]
+    done = {store_name_of(entry) for entry in resumed}
+    stores = [store for store in urls_data if store['store_name'] not in done]
+    
+    inf_journal = None
+    inf_run = {'results': [], 'stats': None}
+    if args.with_inf:
+        inf_journal, inf_resumed, inf_stores = open_inf_journal(urls_data, get_date_range, args.resume)
+        inf_run['results'].extend(inf_resumed)
+    
+    async def collect(submission_queue):
+        if PROCESSES > 1:
+            await collect_sharded(stores, submission_queue)
+        elif args.with_inf:
+            await collect_with_inf(stores, storage_template, submission_queue, inf_stores, inf_journal, inf_run)
+        else:
+            await collect_store_metrics(stores, storage_template, submission_queue)
+    
+    async def report_inf():
+        await report_inf_results(inf_run['results'], config, False, config.get('top_n_items', 10))
+        # No stats if INF collection itself failed - keep the journal for --resume
+        if inf_run['stats'] and not inf_run['stats'].failures.total:
+            inf_journal.finish()
+    
+    try:
+        await report_results(len(urls_data), collect, datetime.now(LOCAL_TIMEZONE), journal, resumed,
+                             extra_reports=report_inf if args.with_inf else None, extra_reports_url=INF_WEBHOOK_URL)
+    finally:
+        journal.close()
+        if inf_journal:
+            inf_journal.close()
+
+
+async def report_results(total: int, collect, started: datetime, journal: RunJournal = None,
+                         resumed: List = (), extra_reports=None, extra_reports_url: str = None):
+    """Run the data processors over everything ``collect`` puts on the submission
+    queue, then send the job summary, highlights, daily report and quick actions.
+
+    Args:
+        total: Number of stores expected (for progress)
+        collect: ``async collect(submission_queue)`` - scrapes (or, with --merge,
+            replays) the results onto the queue
+        started: Run start time for the elapsed figure in the job summary
+        journal: Optional RunJournal; every processed result is appended to it and
+            it is deleted once the run has been reported
+        resumed: Results completed by an interrupted earlier run (from the journal).
+            They count as processed and are included in the highlights and report.
+        extra_reports: Optional ``async extra_reports()`` sent before the quick actions
+            card (the INF report with --with-inf)
+        extra_reports_url: Webhook ``extra_reports`` posts to. If it is a different Chat
+            space from the performance webhook, it is sent in parallel with the
+            job summary and highlights, otherwise after them.
+    """
+    global progress, start_time
+    
+    submission_queue = Queue()
         
     with progress_lock: 
-        progress = {"current": 0, "total": len(urls_data), "lastUpdate": "N/A"}
+        progress = {"current": len(resumed), "total": total, "lastUpdate": "N/A"}
     
-    start_time = datetime.now(LOCAL_TIMEZONE)
+    start_time = started
+    if resumed:
+        app_logger.info(f"Resuming: {len(resumed)}/{total} stores already done, collecting the rest")
+        async with submitted_data_lock:
+            submitted_store_data.extend(resumed)
 
     # Create wrapper functions for workers
-    def get_date_range():
-        return get_date_time_range_from_config(config, LOCAL_TIMEZONE, app_logger)
-    
     def sanitize_wrapper(name):
         return sanitize_store_name(name, STORE_PREFIX_RE)
     
-    async def post_webhook_wrapper(entries):
-        global chat_batch_count
-        chat_batch_count += 1
-        await post_to_chat_webhook(entries, STORE_WEBHOOK_URL, chat_batch_count, get_date_range,
-                                   sanitize_wrapper, UPH_THRESHOLD, LATES_THRESHOLD, INF_THRESHOLD,
-                                   EMOJI_GREEN_CHECK, EMOJI_RED_CROSS, LOCAL_TIMEZONE, DEBUG_MODE, app_logger)
+    async def post_webhook_wrapper(entries, batch_number):
+        return await post_to_chat_webhook(entries, STORE_WEBHOOK_URL, batch_number, get_date_range,
+                                          sanitize_wrapper, UPH_THRESHOLD, LATES_THRESHOLD, INF_THRESHOLD,
+                                          EMOJI_GREEN_CHECK, EMOJI_RED_CROSS, LOCAL_TIMEZONE, DEBUG_MODE, app_logger)
     
-    async def add_chat_wrapper(entry):
-        await add_to_pending_chat(entry, STORE_WEBHOOK_URL, pending_chat_lock, pending_chat_entries,
-                                  CHAT_BATCH_SIZE, post_webhook_wrapper)
+    # Store cards are posted by a background task so data processors never wait on Google Chat
+    chat_sender = None
+    if STORE_WEBHOOK_URL:
+        def chat_entry_size(entry):
+            return json_size(store_grid_row(entry, sanitize_wrapper, UPH_THRESHOLD, LATES_THRESHOLD, INF_THRESHOLD,
+                                            EMOJI_GREEN_CHECK, EMOJI_RED_CROSS)) + 1
+        
+        chat_sender = ChatSender(post_webhook_wrapper, CHAT_BATCH_SIZE, retries=CHAT_SEND_RETRIES,
+                                 app_logger=app_logger, entry_size=chat_entry_size,
+                                 max_bytes=CHAT_CARD_MAX_BYTES - STORE_CARD_OVERHEAD)
+        chat_sender.start()
     
-    async def log_submission_wrapper(data):
-        await log_submission(data, log_lock, LOG_FILE, JSON_LOG_FILE, submitted_data_lock,
-                            submitted_store_data, add_chat_wrapper, LOCAL_TIMEZONE, app_logger)
+    async def add_chat_wrapper(entry):
+        if chat_sender:
+            chat_sender.submit(entry)
     
-    async def apply_date_range_wrapper(page, store_name):
-        return await apply_date_time_range(page, store_name, get_date_range, ACTION_TIMEOUT, DEBUG_MODE, app_logger)
+    # The CSV/JSONL submission logs are written by one background task
+    log_writer = SubmissionLogWriter(LOG_FILE, JSON_LOG_FILE, flush_interval=LOG_FLUSH_INTERVAL, app_logger=app_logger)
+    await log_writer.start()
     
-    async def process_store_wrapper(context, store_info, queue):
-        await process_single_store(context, store_info, queue, WORKER_RETRY_COUNT, RESOURCE_BLOCKLIST,
-                                   apply_date_range_wrapper, WAIT_TIMEOUT, ACTION_TIMEOUT,
-                                   metrics_lock, metrics, run_failures, failure_lock, failure_timestamps,
-                                   DEBUG_MODE, app_logger)
+    async def log_submission_wrapper(data):
+        await log_submission(data, log_writer, submitted_data_lock, submitted_store_data, add_chat_wrapper,
+                             LOCAL_TIMEZONE)
+        if journal:
+            journal.append(entry_to_json(data))
     
-    # Start Auto-concurrency Manager
-    if AUTO_ENABLED:
-        asyncio.create_task(auto_concurrency_manager(
-            concurrency_limit_ref, last_concurrency_change_ref, AUTO_ENABLED, AUTO_MIN_CONCURRENCY,
-            AUTO_MAX_CONCURRENCY, CPU_UPPER_THRESHOLD, CPU_LOWER_THRESHOLD, MEM_UPPER_THRESHOLD,
-            CHECK_INTERVAL, COOLDOWN_SECONDS, failure_lock, failure_timestamps,
-            concurrency_condition, app_logger
-        ))
-
-    # Create Worker Lists
     form_submitter_tasks = []
-    api_workers = []
-    
     # Data Processor Workers (Replaces HTTP Form Submitter)
     for i in range(NUM_FORM_SUBMITTERS):
         w = asyncio.create_task(
@@ -311,37 +612,30 @@ async def process_urls():
         form_submitter_tasks.append(w)
         app_logger.info(f"Started Data Processor {i+1}")
     
-    # Start Worker Pool - use API-first workers if enabled, otherwise browser workers
-    if USE_API_FIRST:
-        app_logger.info(f"Spinning up {pool_size} API-first workers (optimized mode)...")
-        api_workers = [
-            asyncio.create_task(api_worker_task(
-                i+1, browser, storage_template, job_queue, submission_queue, PAGE_TIMEOUT, ACTION_TIMEOUT,
-                active_workers_ref, concurrency_limit_ref, concurrency_condition, get_date_range, app_logger
-            ))
-            for i in range(pool_size)
-        ]
-    else:
-        app_logger.info(f"Spinning up {pool_size} browser workers (legacy mode)...")
-        api_workers = [
-            asyncio.create_task(worker_task(
-                i+1, browser, storage_template, job_queue, submission_queue, PAGE_TIMEOUT, ACTION_TIMEOUT,
-                process_store_wrapper, active_workers_ref, concurrency_limit_ref,
-                concurrency_condition, app_logger
-            ))
-            for i in range(pool_size)
-        ]
-    
-    # Wait for all API/scraping workers to finish
-    await asyncio.gather(*api_workers)
-    
-    app_logger.info("All workers finished. Waiting for submission queue to empty...")
-    await submission_queue.join()
+    with phase("collect"):
+        await collect(submission_queue)
+        
+        app_logger.info("All workers finished. Waiting for submission queue to empty...")
+        await submission_queue.join()
+    await log_writer.close()
     
-    async def flush_wrapper():
-        await flush_pending_chat_entries(STORE_WEBHOOK_URL, pending_chat_lock, pending_chat_entries, post_webhook_wrapper)
+    # Cards for other Chat spaces post in parallel with the performance space's; a space
+    # shared with the performance webhook keeps its cards in the original order
+    async def send_extra_reports():
+        try:
+            await extra_reports()
+        except Exception as e:
+            app_logger.error(f"Failed to send INF report: {e}", exc_info=True)
+            run_failures.append("INF report")
     
-    await flush_wrapper()
+    drain_task = None
+    if chat_sender:
+        drain_task = asyncio.create_task(chat_sender.close(CHAT_DRAIN_TIMEOUT))
+        if same_space(STORE_WEBHOOK_URL, PERFORMANCE_WEBHOOK_URL):
+            await drain_task
+    extra_task = None
+    if extra_reports and not same_space(extra_reports_url, PERFORMANCE_WEBHOOK_URL):
+        extra_task = asyncio.create_task(send_extra_reports())
     
     app_logger.info("Cancelling form submitter workers...")
     for task in form_submitter_tasks: task.cancel()
@@ -351,9 +645,10 @@ async def process_urls():
     app_logger.info(f"Processing finished. Processed {progress['current']}/{progress['total']} in {elapsed:.2f}s")
     
     # Send Job Summary
-    await post_job_summary(progress['total'], progress['current'], run_failures, elapsed,
-                          PERFORMANCE_WEBHOOK_URL, metrics_lock, metrics, LOCAL_TIMEZONE, DEBUG_MODE, app_logger,
-                          APPS_SCRIPT_URL)
+    with phase("job summary"):
+        await post_job_summary(progress['total'], progress['current'], run_failures, elapsed,
+                              PERFORMANCE_WEBHOOK_URL, metrics_lock, metrics, LOCAL_TIMEZONE, DEBUG_MODE, app_logger,
+                              APPS_SCRIPT_URL)
     
     # Send Performance Highlights & Trigger INF Deep Dive
     # Send Performance Highlights & Trigger INF Deep Dive
@@ -379,9 +674,10 @@ async def process_urls():
                 # For other modes (last_7_days, etc), use today's date as they span multiple days
                 
                 # Pass report_date to process_data so correct headcount CSV is loaded
-                processed_data = gen.process_data(submitted_store_data, report_date=report_date)
-                
-                report_path = gen.save_report(processed_data, report_date=report_date)
+                with phase("daily report"):
+                    processed_data = gen.process_data(submitted_store_data, report_date=report_date)
+                    
+                    report_path = gen.save_report(processed_data, report_date=report_date)
                 app_logger.info(f"Report generated successfully: {report_path}")
             except Exception as e:
                 app_logger.error(f"Failed to generate report: {e}")
@@ -397,13 +693,10 @@ async def process_urls():
                     
                     # Parse INF and sort
                     def parse_inf(item):
-                        try:
-                            return float(item.get('inf', '0').replace('%', '').strip())
-                        except:
-                            return -1.0
+                        return metric_value(item, 'inf', default=-1.0)
 
                     # Filter for stores that actually have data and exist in lookup
-                    valid_stores = [s for s in submitted_store_data if s.get('store') in store_lookup]
+                    valid_stores = [s for s in submitted_store_data if store_name_of(s) in store_lookup]
                     
                     # Sort by INF descending (Higher INF is worse)
                     sorted_by_inf = sorted(valid_stores, key=parse_inf, reverse=True)
@@ -418,11 +711,11 @@ async def process_urls():
                     
                     target_stores_for_inf = []
                     for s in target_stores_inf_list:
-                        full_details = store_lookup.get(s['store'])
+                        full_details = store_lookup.get(store_name_of(s))
                         if full_details:
                             # Create a copy to avoid modifying the original urls_data
                             store_with_inf = full_details.copy()
-                            store_with_inf['inf_rate'] = s.get('inf', 'N/A')
+                            store_with_inf['inf_rate'] = metric_display(s, 'inf', 'N/A')
                             target_stores_for_inf.append(store_with_inf)
                     
                     if target_stores_for_inf:
@@ -437,8 +730,21 @@ async def process_urls():
 
             submitted_store_data.clear()
 
+    if extra_task:
+        await extra_task
+    elif extra_reports:
+        await send_extra_reports()
+    if drain_task:
+        await drain_task
+        app_logger.info(f"Store cards: {chat_sender.stats['batches']} batches, {chat_sender.stats['retries']} retries, "
+                        f"{chat_sender.stats['failed']} failed, {chat_sender.stats['dropped']} stores not sent")
+
     # Send Quick Actions card last so buttons are always at the bottom of the thread
     await post_quick_actions_card(PERFORMANCE_WEBHOOK_URL, APPS_SCRIPT_URL, DEBUG_MODE, app_logger)
+    if journal and not (run_failures or run_stats.failures.total):
+        journal.finish()
+    elif journal:
+        app_logger.info(f"Keeping {journal.path} - run with --resume to retry only the failed stores")
 
     if run_failures:
         app_logger.warning(f"Completed with {len(run_failures)} issue(s): {', '.join(run_failures)}")
@@ -446,6 +752,212 @@ async def process_urls():
         app_logger.info("Completed successfully.")
 
 
+#######################################################################
+#                  COMBINED PIPELINE (--with-inf)
+#######################################################################
+
+async def collect_with_inf(stores: List[Dict], storage_template: Dict, submission_queue: Queue,
+                           inf_stores: List[Dict], inf_journal: RunJournal, inf_run: Dict):
+    """Collect dashboard metrics for ``stores`` and INF for ``inf_stores`` at the same time.
+
+    Both worker pools run in this browser and take their slots from the one
+    concurrency budget (tuned by the metrics pool's controller), so INF page loads
+    fill the time the metrics workers spend waiting on API responses instead of
+    running as a second pass. INF results are added to ``inf_run['results']`` and
+    its RunStats is stored in ``inf_run['stats']`` (left as None if INF collection
+    fails, so the dashboard metrics are still collected and reported).
+    """
+    low_priority = frozenset()
+    if DEADLINE:
+        inf_stores, low_priority = prioritise_inf_stores(inf_stores)
+    with phase("bearer token"):
+        bearer_token = fetch_run_bearer_token()
+    app_logger.info(f"Combined run: {len(stores)} stores for dashboard metrics, {len(inf_stores)} for INF")
+    
+    async def collect_inf():
+        try:
+            return await collect_inf_results(
+                browser, storage_template, inf_stores, get_date_range, ACTION_TIMEOUT, bearer_token,
+                config.get('top_n_items', 10), journal=inf_journal, deadline=DEADLINE, low_priority=low_priority,
+                shared_concurrency=(concurrency_limit_ref, active_workers_ref, concurrency_condition))
+        except Exception as e:
+            app_logger.error(f"INF collection failed: {e}", exc_info=True)
+            run_failures.append("INF collection")
+            return None
+    
+    _, inf_collected = await asyncio.gather(
+        collect_store_metrics(stores, storage_template, submission_queue),
+        collect_inf()
+    )
+    if inf_collected is None:
+        return
+    inf_results, inf_stats = inf_collected
+    inf_run['results'].extend(inf_results)
+    inf_run['stats'] = inf_stats
+    inf_latency = inf_stats.latency('inf_store')
+    app_logger.info(f"INF stores: {inf_latency.count} done, {inf_stats.failures.total} failed, "
+                    f"p50 {inf_latency.percentile(0.50):.1f}s / p95 {inf_latency.percentile(0.95):.1f}s")
+    if inf_stats.failures.total:
+        run_failures.append(f"{inf_stats.failures.total} stores (INF)")
+
+
+#######################################################################
+#                  MULTI-PROCESS (--processes N)
+#######################################################################
+
+def shard_summary() -> Dict:
+    """This process's run totals, sent to the parent when a shard finishes."""
+    return {
+        "failures": list(run_failures),
+        "stats": run_stats,
+        "retries": metrics["retries"],
+        "total_orders": metrics["total_orders"],
+        "total_units": metrics["total_units"],
+        "retry_stores": set(metrics["retry_stores"]),
+        "http_client": metrics.get("http_client"),
+    }
+
+
+def merge_shard_summary(summary: Dict):
+    """Fold a shard's totals into this process's run_failures/metrics."""
+    run_failures.extend(summary["failures"])
+    run_stats.merge(summary["stats"])
+    metrics["retries"] += summary["retries"]
+    metrics["total_orders"] += summary["total_orders"]
+    metrics["total_units"] += summary["total_units"]
+    metrics["retry_stores"] |= summary["retry_stores"]
+    shard_http = summary.get("http_client")
+    if shard_http:
+        merged = metrics.setdefault("http_client", {'requests': 0, 'connections_created': 0, 'connections_reused': 0})
+        for key in ('requests', 'connections_created', 'connections_reused'):
+            merged[key] += shard_http[key]
+        opened = merged['connections_created'] + merged['connections_reused']
+        merged['reuse_ratio'] = merged['connections_reused'] / opened if opened else 0.0
+
+
+async def collect_shard(index: int, count: int, results, stores: List[Dict]):
+    """Child process: scrape one partition of ``stores`` and send the results to the parent."""
+    global playwright, browser
+    stores = partition_stores(stores, index, count)
+    app_logger.info(f"Shard {index + 1}/{count}: {len(stores)} stores")
+    with open(STORAGE_STATE) as f: storage_template = codec.load(f)
+    
+    forward_queue = Queue()
+    
+    async def forward_records():
+        while True:
+            record = await forward_queue.get()
+            results.put((RECORD, index, record))
+            forward_queue.task_done()
+    
+    forwarder = asyncio.create_task(forward_records())
+    try:
+        playwright = await async_playwright().start()
+        browser = await launch_browser(playwright)
+        await collect_store_metrics(stores, storage_template, forward_queue, share=count)
+        await forward_queue.join()
+    except Exception as e:
+        app_logger.critical(f"Shard {index + 1}/{count} failed: {e}", exc_info=True)
+        run_failures.append(f"Shard {index + 1}/{count} ({e})")
+    finally:
+        forwarder.cancel()
+        if browser and browser.is_connected():
+            await browser.close()
+        if playwright:
+            await playwright.stop()
+        results.put((DONE, index, shard_summary()))
+
+
+def run_collection_shard(index: int, count: int, results, stores: List[Dict]):
+    """Process entry point for ``--processes``."""
+    codec.run(collect_shard(index, count, results, stores))
+
+
+async def collect_sharded(stores: List[Dict], submission_queue: Queue):
+    """Split ``stores`` across PROCESSES child processes and merge their results into
+    ``submission_queue``, so the reporting stage sees a single result set."""
+    app_logger.info(f"Splitting {len(stores)} stores across {PROCESSES} processes...")
+    # Dealing the stores out slowest-first gives every process a similar share of slow stores
+    durations = load_store_durations()
+    if durations:
+        stores = durations.longest_first(stores)
+    processes, results = start_shard_processes(run_collection_shard, PROCESSES, stores)
+    summaries = await drain_shard_results(processes, results, submission_queue.put, app_logger)
+    for index, summary in enumerate(summaries):
+        if summary is None:
+            run_failures.append(f"Shard {index + 1}/{PROCESSES} (Crashed)")
+        else:
+            merge_shard_summary(summary)
+    if durations:
+        save_store_durations(durations)
+
+
+#######################################################################
+#                  MULTI-NODE (--shard i/n, --merge)
+#######################################################################
+
+async def collect_shard_artifact(storage_template: Dict):
+    """Scrape this machine's partition of urls.csv and write it to a shard artifact;
+    reporting is left to ``--merge``."""
+    index, count = SHARD
+    stores = partition_stores(urls_data, index, count)
+    app_logger.info(f"Shard {index + 1}/{count}: {len(stores)} of {len(urls_data)} stores")
+    started = datetime.now(LOCAL_TIMEZONE)
+    records = []
+    collected = Queue()
+    
+    async def keep_records():
+        while True:
+            records.append(entry_to_json(await collected.get()))
+            collected.task_done()
+    
+    keeper = asyncio.create_task(keep_records())
+    if PROCESSES > 1:
+        await collect_sharded(stores, collected)
+    else:
+        await collect_store_metrics(stores, storage_template, collected)
+    await collected.join()
+    keeper.cancel()
+    
+    summary = shard_summary()
+    summary.update(stats=run_stats.to_dict(), retry_stores=sorted(summary["retry_stores"]))
+    path = shard_artifact_path('perf', index, count)
+    write_shard_artifact(path, {
+        'kind': 'perf', 'shard': index, 'count': count, 'config': shard_config(config),
+        'started': started.isoformat(), 'finished': datetime.now(LOCAL_TIMEZONE).isoformat(),
+        'stores': len(stores), 'summary': summary,
+    }, records)
+    app_logger.info(f"Shard {index + 1}/{count}: {len(records)} results written to {path}")
+    if run_failures:
+        app_logger.warning(f"Shard completed with {len(run_failures)} issue(s): {', '.join(run_failures)}")
+
+
+async def merge_shards(paths: List[str]):
+    """Report the results of all ``--shard`` runs once, as if they were one run."""
+    global run_failures
+    run_failures = []
+    metas, records = read_shard_artifacts(paths, 'perf')
+    count = metas[0]['count']
+    for number in missing_shards(metas):
+        app_logger.warning(f"Shard {number}/{count} artifact is missing - its stores are not in the report")
+        run_failures.append(f"Shard {number}/{count} (Missing)")
+    
+    # Report with the date range the shards collected, whatever this machine's CLI says
+    config.update(metas[0]['config'])
+    for meta in metas:
+        summary = meta['summary']
+        merge_shard_summary(dict(summary, stats=RunStats.from_dict(summary['stats']),
+                                 retry_stores=set(summary['retry_stores'])))
+    app_logger.info(f"Merging {len(records)} results from {len(metas)}/{count} shard(s)...")
+    
+    async def replay(submission_queue):
+        for record in records:
+            await submission_queue.put(entry_from_json(record))
+    
+    started = min(datetime.fromisoformat(meta['started']) for meta in metas)
+    await report_results(sum(meta['stores'] for meta in metas), replay, started)
+
+
 #######################################################################
 #                         MAIN EXECUTION BLOCK
 #######################################################################
@@ -453,19 +965,20 @@ async def process_urls():
 async def main():
     global playwright, browser
     app_logger.info("Starting up in single-run mode...")
+    if config.get('use_fast_codec', False):
+        app_logger.info(f"Fast codec profile: orjson={FAST_CODEC['orjson']}, uvloop={FAST_CODEC['uvloop']}")
+    if LOOP_MONITOR:
+        start_loop_monitor(threshold=LOOP_MONITOR_THRESHOLD, app_logger=app_logger)
     try:
+        if args.merge:
+            # Reporting only - the shards did the scraping
+            if args.inf_only:
+                await merge_inf_shards(args.merge, config)
+            else:
+                await merge_shards(args.merge)
+            return
         playwright = await async_playwright().start()
-        browser = await playwright.chromium.launch(
-            headless=not DEBUG_MODE,
-            args=[
-                "--disable-gpu",
-                "--disable-dev-shm-usage",
-                "--no-sandbox",
-                "--disable-setuid-sandbox",
-                "--disable-accelerated-2d-canvas",
-                "--disable-gl-drawing-for-tests",
-            ]
-        )
+        browser = await launch_browser(playwright)
         app_logger.info("Browser launched successfully.")
         await process_urls()
     except Exception as e:
@@ -478,7 +991,9 @@ async def main():
         if playwright:
             await playwright.stop()
             app_logger.info("Playwright stopped.")
+        await close_chat_client()
+        await stop_loop_monitor()
         app_logger.info("Run complete.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    codec.run(main())
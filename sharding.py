@@ -0,0 +1,176 @@
+# =======================================================================================
+#                  SHARDING MODULE - Split a Run across Worker Processes
+# =======================================================================================
+# ``--processes N`` partitions the store list across N child processes, each with its
+# own Chromium and context pool. Children send their results back over a single
+# multiprocessing queue as ('record', shard, payload) messages followed by one
+# ('done', shard, summary) message, and the parent feeds the records into its normal
+# reporting stage so that stage sees one merged result set.
+#
+# ``--shard i/n`` does the same across machines: each machine processes its slice and
+# writes a self-contained JSONL artifact (a metadata line, then one line per result),
+# and ``--merge`` reads all the artifacts and runs the reporting stage once.
+# =======================================================================================
+
+import asyncio
+import functools
+import glob
+import multiprocessing
+import os
+import queue
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import codec
+
+RECORD = 'record'
+DONE = 'done'
+
+SHARD_DIR = os.path.join('output', 'shards')
+
+# Config that decides what a shard collected; every artifact of a split must agree on
+# it and ``--merge`` reports with it
+SHARD_CONFIG_KEYS = ('use_date_range', 'date_range_mode', 'custom_start_date', 'custom_end_date',
+                     'custom_start_time', 'custom_end_time', 'relative_days', 'top_n_items')
+
+
+def partition_stores(stores: Sequence[Dict], index: int, count: int) -> List[Dict]:
+    """Deterministic round-robin slice of the store list for shard ``index`` of ``count``.
+
+    Round-robin (rather than contiguous blocks) keeps each shard's mix of regions
+    and store sizes close to the whole network's.
+    """
+    return list(stores[index::count])
+
+
+def start_shard_processes(target: Callable, count: int, *args) -> Tuple[List, object]:
+    """Spawn ``count`` processes running ``target(index, count, results, *args)``.
+
+    ``spawn`` is used instead of ``fork`` because the parent already has a running
+    event loop and Playwright driver threads.
+
+    Returns:
+        Tuple of (processes, results queue)
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=target, args=(index, count, results) + args, name=f"shard-{index + 1}")
+                 for index in range(count)]
+    for process in processes:
+        process.start()
+    return processes, results
+
+
+async def drain_shard_results(processes: List, results, on_record: Callable[[object], Awaitable[None]],
+                              app_logger) -> List[Optional[Dict]]:
+    """Forward records to ``on_record`` until every shard is done (or has died).
+
+    Returns:
+        Per-shard summaries in shard order; None for a shard that exited
+        without reporting (crashed or killed).
+    """
+    loop = asyncio.get_running_loop()
+    summaries: Dict[int, Optional[Dict]] = {}
+    while len(summaries) < len(processes):
+        try:
+            kind, shard, payload = await loop.run_in_executor(None, functools.partial(results.get, timeout=1.0))
+        except queue.Empty:
+            for index, process in enumerate(processes):
+                if index not in summaries and not process.is_alive():
+                    app_logger.error(f"Shard {index + 1}/{len(processes)} exited with code {process.exitcode} "
+                                     f"before reporting its results")
+                    summaries[index] = None
+            continue
+        if kind == RECORD:
+            await on_record(payload)
+        elif kind == DONE:
+            summaries[shard] = payload
+            app_logger.info(f"Shard {shard + 1}/{len(processes)} finished")
+    for process in processes:
+        process.join()
+    return [summaries[index] for index in range(len(processes))]
+
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """Parse a 1-based ``"i/n"`` shard spec into a 0-based (index, count).
+
+    Raises:
+        ValueError: If the spec is malformed or i is outside 1..n
+    """
+    try:
+        number, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/n (e.g. 2/4)")
+    if count < 1 or not 1 <= number <= count:
+        raise ValueError(f"Invalid shard '{spec}', i must be between 1 and n")
+    return number - 1, count
+
+
+def shard_artifact_path(kind: str, index: int, count: int, directory: str = SHARD_DIR) -> str:
+    """e.g. ``output/shards/perf-2-of-4.jsonl``"""
+    return os.path.join(directory, f"{kind}-{index + 1}-of-{count}.jsonl")
+
+
+def shard_config(config: Dict) -> Dict:
+    """The ``SHARD_CONFIG_KEYS`` subset of ``config`` stored in artifact metadata."""
+    return {key: config[key] for key in SHARD_CONFIG_KEYS if key in config}
+
+
+def write_shard_artifact(path: str, meta: Dict, records: List):
+    """Write the metadata line and one line per record (atomically, via a temp file)."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(codec.dumps({'meta': meta}) + '\n')
+        for record in records:
+            f.write(codec.dumps({'record': record}) + '\n')
+    os.replace(tmp_path, path)
+
+
+def read_shard_artifacts(paths: List[str], kind: str) -> Tuple[List[Dict], List]:
+    """Load ``kind`` artifacts from files and/or directories.
+
+    Returns:
+        Tuple of (metadata per artifact in shard order, all records)
+
+    Raises:
+        ValueError: No artifacts found, artifacts from different splits
+            (n or date range differs), or the same shard given twice
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, f"{kind}-*-of-*.jsonl"))))
+        else:
+            files.append(path)
+    if not files:
+        raise ValueError(f"No {kind} shard artifacts found in {', '.join(paths)}")
+
+    artifacts = []
+    for file_path in files:
+        with open(file_path, encoding='utf-8') as f:
+            lines = [codec.loads(line) for line in f if line.strip()]
+        meta = lines[0]['meta']
+        if meta.get('kind') != kind:
+            raise ValueError(f"{file_path} is a {meta.get('kind')} artifact, expected {kind}")
+        artifacts.append((meta, [line['record'] for line in lines[1:]]))
+
+    counts = {meta['count'] for meta, _ in artifacts}
+    if len(counts) > 1:
+        raise ValueError(f"Artifacts come from different splits (n = {sorted(counts)})")
+    if any(meta.get('config') != artifacts[0][0].get('config') for meta, _ in artifacts):
+        raise ValueError("Artifacts were collected with different date ranges")
+    shards = [meta['shard'] for meta, _ in artifacts]
+    if len(set(shards)) != len(shards):
+        raise ValueError("The same shard was given more than once")
+
+    artifacts.sort(key=lambda artifact: artifact[0]['shard'])
+    return [meta for meta, _ in artifacts], [record for _, records in artifacts for record in records]
+
+
+def missing_shards(metas: List[Dict]) -> List[int]:
+    """1-based numbers of shards with no artifact."""
+    if not metas:
+        return []
+    present = {meta['shard'] for meta in metas}
+    return [index + 1 for index in range(metas[0]['count']) if index not in present]
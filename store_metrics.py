@@ -0,0 +1,206 @@
+# =======================================================================================
+#                  STORE METRICS MODULE - Typed Per-Store Metrics Record
+# =======================================================================================
+# The API path carries raw numbers from the snowdash payload all the way to the
+# consumers (chat cards, highlights, daily report) and only formats them for display.
+# The legacy browser path still produces string form dicts such as {'lates': '1.6 %'},
+# so the accessors below accept either shape.
+# =======================================================================================
+
+import re
+from typing import Dict, Optional, Union
+
+# Display fields in the order used by the submission log
+FORM_FIELDS = ('store', 'orders', 'units', 'fulfilled', 'uph', 'inf', 'found', 'cancelled', 'lates', 'time_available')
+
+
+class StoreMetrics:
+    """Raw numeric metrics for one store and one date range.
+
+    ``wtd`` optionally holds a second StoreMetrics for week-to-date.
+    ``lates`` is None when the detailed /metrics call failed ("N/A").
+    """
+
+    __slots__ = ('store', 'orders', 'units', 'fulfilled', 'uph', 'inf', 'found', 'cancelled',
+                 'lates', 'time_available_ms', 'acceptance_rate', 'rejection_rate', 'wtd')
+
+    def __init__(self, store: str, orders: int = 0, units: int = 0, fulfilled: int = 0,
+                 uph: float = 0.0, inf: float = 0.0, found: float = 0.0, cancelled: int = 0,
+                 lates: Optional[float] = None, time_available_ms: float = 0.0,
+                 acceptance_rate: float = 0.0, rejection_rate: float = 0.0,
+                 wtd: Optional['StoreMetrics'] = None):
+        self.store = store
+        self.orders = orders
+        self.units = units
+        self.fulfilled = fulfilled
+        self.uph = uph
+        self.inf = inf
+        self.found = found
+        self.cancelled = cancelled
+        self.lates = lates
+        self.time_available_ms = time_available_ms
+        self.acceptance_rate = acceptance_rate
+        self.rejection_rate = rejection_rate
+        self.wtd = wtd
+
+    @classmethod
+    def from_summation(cls, store: str, api_data: Dict, lates_rate: Optional[float] = None) -> 'StoreMetrics':
+        """Build from a summationMetrics payload (``*_V2`` fields)."""
+        return cls(
+            store=store,
+            orders=int(api_data.get('OrdersShopped_V2', 0)),
+            units=int(api_data.get('RequestedQuantity_V2', 0)),
+            fulfilled=int(api_data.get('PickedUnits_V2', 0)),
+            uph=float(api_data.get('AverageUPH_V2', 0.0)),
+            inf=float(api_data.get('ItemNotFoundRate_V2', 0.0)),
+            found=float(api_data.get('ItemFoundRate_V2', 0.0)),
+            cancelled=int(api_data.get('ShortedUnits_V2', 0)),
+            lates=lates_rate,
+            time_available_ms=float(api_data.get('TimeAvailable_V2', 0.0)),
+            acceptance_rate=api_data.get('AcceptanceRate_V2', 0),
+            rejection_rate=api_data.get('RejectionRate_V2', 0),
+        )
+
+    @property
+    def time_available_hours(self) -> float:
+        return self.time_available_ms / 3600000.0
+
+    def display(self, field: str) -> str:
+        """Format one field the way the dashboard and logs show it."""
+        if field == 'store':
+            return self.store
+        if field == 'time_available':
+            return format_hours_minutes(self.time_available_ms)
+        return format_metric(field, getattr(self, field))
+
+    def to_form_dict(self) -> Dict:
+        """Legacy string form dict (as written to submissions.log / .jsonl)."""
+        form = {field: self.display(field) for field in FORM_FIELDS}
+        form['_api_data'] = self._api_data()
+        if self.wtd is not None:
+            for field in FORM_FIELDS[1:]:
+                form[f"{field}_WTD"] = self.wtd.display(field)
+            form['_api_data_WTD'] = self.wtd._api_data()
+            form['_api_data']['time_available_hours_wtd'] = self.wtd.time_available_hours
+            form['has_wtd'] = True
+        return form
+
+    def to_record(self) -> Dict:
+        """Raw values as a JSON-safe dict (the inverse of ``from_record``)."""
+        record = {slot: getattr(self, slot) for slot in self.__slots__ if slot != 'wtd'}
+        record['wtd'] = self.wtd.to_record() if self.wtd is not None else None
+        return record
+
+    @classmethod
+    def from_record(cls, record: Dict) -> 'StoreMetrics':
+        wtd = record.get('wtd')
+        fields = {key: value for key, value in record.items() if key != 'wtd'}
+        return cls(**fields, wtd=cls.from_record(wtd) if wtd else None)
+
+    def _api_data(self) -> Dict:
+        return {
+            'time_available_ms': self.time_available_ms,
+            'time_available_hours': self.time_available_hours,
+            'late_picks_rate': self.lates,
+            'acceptance_rate': self.acceptance_rate,
+            'rejection_rate': self.rejection_rate,
+        }
+
+
+def format_hours_minutes(milliseconds: float) -> str:
+    """Format a duration in ms as "H:MM"."""
+    total_minutes, _ = divmod(abs(int(milliseconds / 1000)), 60)
+    total_hours, remaining_minutes = divmod(total_minutes, 60)
+    return f"{total_hours}:{remaining_minutes:02d}"
+
+
+def format_metric(field: str, value) -> str:
+    """Format a raw metric value for display ("N/A" when unknown)."""
+    if value is None:
+        return "N/A"
+    if field in ('orders', 'units', 'fulfilled', 'cancelled'):
+        return str(int(value))
+    if field == 'uph':
+        return f"{value:.0f}"
+    return f"{value:.1f} %"
+
+
+def _parse_number(value) -> Optional[float]:
+    """Parse a legacy display string ("1.6 %", "90", "N/A") back to a number."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    clean = re.sub(r'[^0-9.]', '', str(value))
+    try:
+        return float(clean) if clean else None
+    except ValueError:
+        return None
+
+
+def entry_to_json(entry: Union[StoreMetrics, Dict]) -> Dict:
+    """Tag a StoreMetrics or legacy form dict for JSON storage (e.g. shard artifacts)."""
+    if isinstance(entry, StoreMetrics):
+        return {'metrics': entry.to_record()}
+    return {'form': entry}
+
+
+def entry_from_json(data: Dict) -> Union[StoreMetrics, Dict]:
+    """Inverse of ``entry_to_json``."""
+    if 'metrics' in data:
+        return StoreMetrics.from_record(data['metrics'])
+    return data['form']
+
+
+def store_name_of(entry: Union[StoreMetrics, Dict]) -> str:
+    return entry.store if isinstance(entry, StoreMetrics) else entry.get('store', 'Unknown')
+
+
+def metric_value(entry: Union[StoreMetrics, Dict], field: str, wtd: bool = False,
+                 default: Optional[float] = 0.0) -> Optional[float]:
+    """Numeric value of ``field`` from a StoreMetrics or a legacy form dict.
+
+    Args:
+        entry: StoreMetrics or legacy dict
+        field: 'orders', 'uph', 'lates', 'inf', ...
+        wtd: Read the week-to-date value (falls back to the range value
+            when the entry has no WTD data)
+        default: Returned when the value is missing or "N/A"
+    """
+    if isinstance(entry, StoreMetrics):
+        source = entry.wtd if (wtd and entry.wtd is not None) else entry
+        value = getattr(source, field)
+        return default if value is None else float(value)
+    if wtd and entry.get('has_wtd'):
+        field = f"{field}_WTD"
+    value = _parse_number(entry.get(field))
+    return default if value is None else value
+
+
+def metric_display(entry: Union[StoreMetrics, Dict], field: str, default: str = '0') -> str:
+    """Display string for ``field`` from a StoreMetrics or a legacy form dict."""
+    if isinstance(entry, StoreMetrics):
+        return entry.display(field)
+    return entry.get(field, default) or default
+
+
+def available_hours(entry: Union[StoreMetrics, Dict], wtd: bool = False) -> float:
+    """Available (TimeAvailable) hours, exact for StoreMetrics, parsed for legacy dicts."""
+    if isinstance(entry, StoreMetrics):
+        source = entry.wtd if (wtd and entry.wtd is not None) else entry
+        return source.time_available_hours
+
+    api_data = entry.get('_api_data', {})
+    hours = api_data.get('time_available_hours_wtd' if wtd else 'time_available_hours', 0.0)
+    if hours:
+        return hours
+    # Fallback: parse from formatted time_available string (e.g., "3:45")
+    time_str = entry.get('time_available_WTD', entry.get('time_available', '0:00')) if wtd \
+        else entry.get('time_available', '0:00')
+    try:
+        parts = time_str.split(':')
+        if len(parts) == 2:
+            return int(parts[0]) + (int(parts[1]) / 60.0)
+    except (ValueError, IndexError, AttributeError):
+        pass
+    return 0.0
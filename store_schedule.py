@@ -0,0 +1,80 @@
+# =======================================================================================
+#                  STORE SCHEDULE MODULE - Longest-expected-first Store Ordering
+# =======================================================================================
+# Stores are picked up in queue order, so a slow store that starts last sets the length
+# of the whole run. Each run's per-store collection times are kept (smoothed across
+# runs) and the next run's queue is ordered slowest-first, leaving the quick stores to
+# fill the gaps at the end.
+# =======================================================================================
+
+import os
+from typing import Dict, List
+
+import codec
+
+DEFAULT_DURATIONS_PATH = os.path.join('output', 'store_durations.json')
+DEFAULT_SMOOTHING = 0.5  # weight of the latest run in the expected duration
+
+
+class StoreDurations:
+    """Expected collection time per store, persisted between runs.
+
+    Usage:
+        durations = StoreDurations.load()
+        stores = durations.longest_first(stores)
+        ...
+        durations.update(run_stats.store_breakdown())
+        durations.save()
+    """
+
+    def __init__(self, expected: Dict[str, float] = None, path: str = DEFAULT_DURATIONS_PATH,
+                 smoothing: float = DEFAULT_SMOOTHING):
+        self.expected = expected or {}
+        self.path = path
+        self.smoothing = smoothing
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_DURATIONS_PATH, smoothing: float = DEFAULT_SMOOTHING,
+             app_logger=None) -> 'StoreDurations':
+        """Load the history; a missing or unreadable file starts an empty one."""
+        expected = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    expected = codec.load(f)
+            except (OSError, ValueError) as e:
+                if app_logger:
+                    app_logger.warning(f"Ignoring unreadable store durations file {path}: {e}")
+        return cls(expected, path, smoothing)
+
+    def longest_first(self, stores: List[Dict]) -> List[Dict]:
+        """Stores ordered by expected duration, slowest first.
+
+        Stores with no history are given the median expectation so a new store
+        neither jumps the queue nor is left to the very end. The sort is stable,
+        so ties (and a run with no history at all) keep urls.csv order.
+        """
+        known = sorted(self.expected.values())
+        default = known[len(known) // 2] if known else 0.0
+        return sorted(stores, key=lambda store: self.expected.get(store.get('store_name'), default), reverse=True)
+
+    def update(self, breakdown: List[Dict], phase: str = 'collection'):
+        """Fold this run's per-store durations (``RunStats.store_breakdown()`` rows) in.
+
+        Stores that failed this run have no duration and keep their old estimate.
+        """
+        for row in breakdown:
+            seconds = row.get(phase)
+            if seconds is None:
+                continue
+            previous = self.expected.get(row['store'])
+            self.expected[row['store']] = (seconds if previous is None
+                                           else self.smoothing * seconds + (1 - self.smoothing) * previous)
+
+    def save(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(codec.dumps({store: round(seconds, 3) for store, seconds in self.expected.items()}, indent=2))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,141 @@
+# =======================================================================================
+#                  SUBMISSION LOG MODULE - Buffered Writer for the CSV/JSONL Logs
+# =======================================================================================
+# Every processed store used to take a global lock, check whether the CSV existed and
+# open both log files through aiofiles - two thread-pool hops and two open/close pairs
+# per record, with all data processors queued behind it. A single writer task now owns
+# both files: records arrive over a queue, are written in batches with one thread hop
+# per batch, and the files are flushed on an interval and when the writer is closed.
+# =======================================================================================
+
+import asyncio
+import csv
+import io
+import os
+import time
+from typing import Dict, List
+
+import codec
+
+SUBMISSION_FIELDS = ['timestamp', 'store', 'orders', 'units', 'fulfilled', 'uph', 'inf', 'found',
+                     'cancelled', 'lates', 'time_available']
+
+_CLOSE = object()  # queued by close() after the last record
+
+
+class SubmissionLogWriter:
+    """Appends submission records to ``log_file`` (CSV) and ``json_log_file`` (JSONL).
+
+    The CSV header is written once, when the CSV file is empty.
+
+    Usage:
+        writer = SubmissionLogWriter(LOG_FILE, JSON_LOG_FILE, app_logger=app_logger)
+        await writer.start()
+        writer.submit(log_entry)    # never blocks
+        await writer.close()        # write and flush what is left
+    """
+
+    def __init__(self, log_file: str, json_log_file: str, flush_interval: float = 1.0,
+                 batch_size: int = 500, app_logger=None):
+        self.log_file = log_file
+        self.json_log_file = json_log_file
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.app_logger = app_logger
+        self.stats = {'records': 0, 'batches': 0, 'flushes': 0}
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._csv_file = None
+        self._json_file = None
+        self._dirty = False
+        self._last_flush = 0.0
+
+    def _open(self):
+        for path in (self.log_file, self.json_log_file):
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._csv_file = open(self.log_file, 'a', newline='', encoding='utf-8')
+        self._json_file = open(self.json_log_file, 'a', encoding='utf-8')
+        if self._csv_file.tell() == 0:
+            csv.DictWriter(self._csv_file, fieldnames=SUBMISSION_FIELDS).writeheader()
+
+    async def start(self):
+        await asyncio.to_thread(self._open)
+        self._last_flush = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, record: Dict):
+        """Queue one record (a ``SUBMISSION_FIELDS`` dict) for writing."""
+        self._queue.put_nowait(record)
+
+    def _write(self, records: List[Dict]):
+        csv_buffer = io.StringIO()
+        writer = csv.DictWriter(csv_buffer, fieldnames=SUBMISSION_FIELDS, extrasaction='ignore')
+        writer.writerows(records)
+        try:
+            self._csv_file.write(csv_buffer.getvalue())
+        except OSError as e:
+            if self.app_logger:
+                self.app_logger.error(f"Error writing to CSV log file {self.log_file}: {e}")
+        try:
+            self._json_file.write(''.join(codec.dumps(record) + '\n' for record in records))
+        except OSError as e:
+            if self.app_logger:
+                self.app_logger.error(f"Error writing to JSON log file {self.json_log_file}: {e}")
+
+    def _flush(self):
+        for f in (self._csv_file, self._json_file):
+            try:
+                f.flush()
+            except OSError as e:
+                if self.app_logger:
+                    self.app_logger.error(f"Error flushing {f.name}: {e}")
+
+    async def _flush_now(self):
+        await asyncio.to_thread(self._flush)
+        self.stats['flushes'] += 1
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+    async def _run(self):
+        while True:
+            try:
+                if self._dirty:
+                    timeout = max(0.0, self._last_flush + self.flush_interval - time.monotonic())
+                    entry = await asyncio.wait_for(self._queue.get(), timeout)
+                else:
+                    entry = await self._queue.get()
+            except asyncio.TimeoutError:
+                await self._flush_now()
+                continue
+            entries = [entry]
+            while len(entries) < self.batch_size and not self._queue.empty():
+                entries.append(self._queue.get_nowait())
+            closing = _CLOSE in entries
+            records = [e for e in entries if e is not _CLOSE]
+            if records:
+                await asyncio.to_thread(self._write, records)
+                self.stats['records'] += len(records)
+                self.stats['batches'] += 1
+                self._dirty = True
+            if closing or time.monotonic() - self._last_flush >= self.flush_interval:
+                await self._flush_now()
+            if closing:
+                return
+
+    async def close(self):
+        """Write everything queued so far, flush and close both files."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(_CLOSE)
+        try:
+            await self._task
+        finally:
+            self._task = None
+            await asyncio.to_thread(self._close_files)
+
+    def _close_files(self):
+        for f in (self._csv_file, self._json_file):
+            if f:
+                f.close()
+        self._csv_file = self._json_file = None
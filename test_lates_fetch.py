@@ -32,6 +32,7 @@ async def main():
         success, data = await fetch_store_metrics_with_lates_browser(page, store)
         
         if success:
+            data = data.to_form_dict()
             print("\n✅ SUCCESS!")
             print("\nData:")
             for key, value in data.items():
@@ -0,0 +1,34 @@
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+from api_scraper import build_metrics_url, split_batched_summation
+
+IDS = ['amzn1.merchant.d.AAA', 'amzn1.merchant.d.BBB']
+
+
+def test_build_metrics_url_repeats_merchant_ids():
+    url = build_metrics_url(IDS, datetime(2025, 1, 6), datetime(2025, 1, 6, 12))
+    params = parse_qs(urlparse(url).query)
+    assert params['merchantIds[]'] == IDS
+
+
+def test_split_dict_keyed_by_merchant():
+    data = {IDS[0]: {'OrdersShopped_V2': 5}, IDS[1]: {'OrdersShopped_V2': 7}}
+    split = split_batched_summation(data, IDS)
+    assert split[IDS[1]]['OrdersShopped_V2'] == 7
+
+
+def test_split_list_of_records():
+    data = [
+        {'merchantId': IDS[0], 'metrics': {'OrdersShopped_V2': 5}},
+        {'merchantId': IDS[1], 'OrdersShopped_V2': 7},
+    ]
+    split = split_batched_summation(data, IDS)
+    assert split[IDS[0]]['OrdersShopped_V2'] == 5
+    assert split[IDS[1]]['OrdersShopped_V2'] == 7
+
+
+def test_aggregate_response_is_not_split():
+    data = {'OrdersShopped_V2': 12, 'AverageUPH_V2': 90.0}
+    assert split_batched_summation(data, IDS) is None
+    assert split_batched_summation(data, IDS[:1]) == {IDS[0]: data}
@@ -0,0 +1,32 @@
+from card_packer import CONTINUED, json_size, pack_sections, split_section
+
+
+def store_section(name, lines=5):
+    text = "\n".join(f"• <b>Item {i}</b> - <b>3</b> INF (SKU: {100000 + i})" for i in range(lines))
+    return {"header": name, "collapsible": True, "widgets": [{"textParagraph": {"text": text}}]}
+
+
+def test_cards_are_filled_up_to_the_size_limit():
+    sections = [store_section(f"Store {i}") for i in range(40)]
+    cards = pack_sections(sections, max_bytes=3000, overhead=500)
+    assert [s for card in cards for s in card] == sections
+    assert all(json_size(card) <= 2500 for card in cards)
+    # Every card but the last is too full to take the next section
+    for card, following in zip(cards, cards[1:]):
+        assert json_size(card + [following[0]]) > 2500
+
+
+def test_oversized_section_is_split_not_dropped():
+    section = store_section("Big Store", lines=200)
+    parts = split_section(section, 2000)
+    assert len(parts) > 1 and all(json_size(part) <= 2000 for part in parts)
+    assert parts[0]["header"] == "Big Store" and parts[1]["header"] == "Big Store" + CONTINUED
+    text = "\n".join(part["widgets"][0]["textParagraph"]["text"] for part in parts)
+    assert text == section["widgets"][0]["textParagraph"]["text"]
+
+
+def test_single_huge_line_is_cut():
+    section = {"header": "S", "widgets": [{"textParagraph": {"text": "x" * 5000}}]}
+    parts = split_section(section, 1000)
+    assert all(json_size(part) <= 1000 for part in parts)
+    assert "".join(part["widgets"][0]["textParagraph"]["text"] for part in parts) == "x" * 5000
@@ -0,0 +1,35 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from chat_client import ChatClient, TokenBucket, retry_after_seconds, same_space
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=1.0, capacity=2, clock=lambda: 100.0)
+    waits = [bucket.reserve(now=100.0) for _ in range(4)]
+    assert waits == [0.0, 0.0, 1.0, 2.0]
+
+
+def test_pause_holds_back_later_callers():
+    bucket = TokenBucket(rate=1.0, capacity=1, clock=lambda: 0.0)
+    assert bucket.reserve(now=0.0) == 0.0
+    bucket.pause(30, now=0.5)
+    assert bucket.reserve(now=0.5) == 30.0
+    assert retry_after_seconds("12") == 12.0 and retry_after_seconds(None, default=5) == 5
+
+
+def test_spaces_are_keyed_without_credentials():
+    a = "https://chat.googleapis.com/v1/spaces/AAA/messages?key=1&token=x"
+    assert same_space(a, "https://chat.googleapis.com/v1/spaces/AAA/messages?key=2&token=y")
+    assert not same_space(a, "https://chat.googleapis.com/v1/spaces/BBB/messages?key=1&token=x")
+    assert not same_space(a, None)
+
+
+async def test_throttled_post_is_retried_after_retry_after():
+    throttled = MagicMock(status=429, headers={'Retry-After': '0'}, text=AsyncMock(return_value="quota"))
+    accepted = MagicMock(status=200)
+    client = ChatClient(rate=1000.0, max_attempts=2)
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_post.return_value.__aenter__.side_effect = [throttled, accepted]
+        assert await client.post("https://chat.example/v1/spaces/A/messages", {"text": "hi"})
+    assert mock_post.call_count == 2 and client.stats['throttled'] == 1
+    await client.close()
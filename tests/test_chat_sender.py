@@ -0,0 +1,74 @@
+import asyncio
+
+from chat_sender import ChatSender
+
+
+async def test_entries_are_posted_in_batches_and_flushed_on_close():
+    posted = []
+
+    async def post_batch(entries, number):
+        posted.append((number, list(entries)))
+
+    sender = ChatSender(post_batch, batch_size=2)
+    sender.start()
+    for entry in range(5):
+        sender.submit(entry)
+    await sender.close(timeout=1)
+    assert posted == [(1, [0, 1]), (2, [2, 3]), (3, [4])]
+
+
+async def test_raised_post_is_retried_but_rejected_post_is_not():
+    attempts = []
+
+    async def post_batch(entries, number):
+        attempts.append(number)
+        if len(attempts) == 1:
+            raise ConnectionError("reset")
+        return False
+
+    sender = ChatSender(post_batch, batch_size=1, retries=2, retry_delay=0)
+    sender.start()
+    sender.submit('a')
+    await sender.close(timeout=1)
+    assert attempts == [1, 1]
+    assert sender.stats['retries'] == 1 and sender.stats['failed'] == 1
+
+
+async def test_sender_does_not_retry_by_default():
+    attempts = []
+
+    async def post_batch(entries, number):
+        attempts.append(number)
+        raise ConnectionError("reset")
+
+    sender = ChatSender(post_batch, batch_size=1, retry_delay=0)
+    sender.start()
+    sender.submit('a')
+    await sender.close(timeout=1)
+    assert attempts == [1] and sender.stats['failed'] == 1
+
+
+async def test_close_gives_up_after_timeout():
+    async def post_batch(entries, number):
+        await asyncio.sleep(10)
+
+    sender = ChatSender(post_batch, batch_size=2)
+    sender.start()
+    for entry in range(5):
+        sender.submit(entry)
+    await sender.close(timeout=0.05)
+    assert sender.stats['dropped'] == 5
+
+
+async def test_batches_are_capped_by_size():
+    posted = []
+
+    async def post_batch(entries, number):
+        posted.append(list(entries))
+
+    sender = ChatSender(post_batch, batch_size=100, entry_size=len, max_bytes=10)
+    sender.start()
+    for entry in ["aaaa", "bbbb", "cccc", "dd"]:
+        sender.submit(entry)
+    await sender.close(timeout=1)
+    assert posted == [["aaaa", "bbbb"], ["cccc", "dd"]]
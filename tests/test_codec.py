@@ -0,0 +1,29 @@
+import pytest
+
+import codec
+
+
+@pytest.fixture(autouse=True)
+def reset_profile():
+    yield
+    codec.configure(False)
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_round_trip_on_both_profiles(fast):
+    codec.configure(fast)
+    doc = {'performance': {'2025-01-06': [{'store': 'Leeds', 'lates': 1.5, 'name': 'Café'}]}}
+    assert codec.loads(codec.dumps(doc)) == doc
+    assert codec.loads(codec.dumps(doc, indent=2).encode('utf-8')) == doc
+
+
+def test_profile_reports_only_installed_libraries():
+    active = codec.configure(True)
+    assert active['orjson'] == (codec.orjson is not None)
+    assert active['uvloop'] == (codec.uvloop is not None)
+    assert codec.configure(False) == {'orjson': False, 'uvloop': False}
+
+
+def test_non_string_keys_fall_back_to_stdlib():
+    codec.configure(True)
+    assert codec.loads(codec.dumps({1: 'a'})) == {'1': 'a'}
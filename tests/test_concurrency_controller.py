@@ -0,0 +1,51 @@
+import asyncio
+
+from concurrency_controller import AIMDController, classify_request
+
+
+def make_controller(limit=10, **kwargs):
+    kwargs.setdefault('min_samples', 5)
+    kwargs.setdefault('cooldown', 0)
+    return AIMDController({'value': limit}, asyncio.Condition(), 1, 20, target_p95=1.0, **kwargs)
+
+
+def test_classify_request():
+    assert classify_request(200) == 'ok'
+    assert classify_request(429) == 'throttle'
+    assert classify_request(503) == 'throttle'
+    assert classify_request(500) == 'server'
+    assert classify_request(403) == 'client'
+    assert classify_request(error='TimeoutError') == 'timeout'
+    assert classify_request(error='ClientConnectorError') == 'network'
+
+
+def test_increases_additively_under_target():
+    controller = make_controller()
+    for _ in range(10):
+        controller.record(0.3, 200)
+    decision = controller.decide()
+    assert decision['action'] == 'increase'
+    assert controller.concurrency_limit_ref['value'] == 11
+
+
+def test_halves_on_throttle_once():
+    controller = make_controller(limit=16)
+    for _ in range(10):
+        controller.record(0.3, 200)
+    controller.record(0.1, 429)
+    assert controller.decide()['action'] == 'decrease'
+    assert controller.concurrency_limit_ref['value'] == 8
+    # The same 429 is not counted again after the change
+    assert controller.decide()['action'] == 'hold'
+    assert controller.concurrency_limit_ref['value'] == 8
+
+
+def test_holds_when_p95_over_target_or_too_few_samples():
+    controller = make_controller()
+    controller.record(0.2, 200)
+    assert controller.decide()['action'] == 'hold'
+    for _ in range(10):
+        controller.record(3.0, 200)
+    decision = controller.decide()
+    assert decision['action'] == 'hold' and 'over target' in decision['reason']
+    assert [d['new_limit'] for d in controller.decisions] == [10, 10]
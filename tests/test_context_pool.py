@@ -0,0 +1,54 @@
+from context_pool import BrowserContextPool
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    async def new_context(self, storage_state=None):
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+
+async def test_contexts_are_created_lazily_and_reused():
+    browser = FakeBrowser()
+    pool = BrowserContextPool(browser, {}, {'value': 4})
+    assert browser.contexts == []
+    async with pool.lease() as first:
+        pass
+    async with pool.lease() as second:
+        assert second is first
+    assert pool.stats['created'] == 1 and pool.stats['reused'] == 1
+
+
+async def test_idle_contexts_are_trimmed_when_limit_drops():
+    browser = FakeBrowser()
+    limit = {'value': 3}
+    pool = BrowserContextPool(browser, {}, limit)
+    leases = [await pool.acquire() for _ in range(3)]
+    limit['value'] = 1
+    for leased in leases:
+        await pool.release(leased)
+    assert pool.open_count == 1
+    assert sum(c.closed for c in browser.contexts) == 2
+
+
+async def test_context_is_recycled_after_max_uses():
+    browser = FakeBrowser()
+    pool = BrowserContextPool(browser, {}, {'value': 1}, max_uses=2)
+    for _ in range(3):
+        async with pool.lease():
+            pass
+    assert pool.stats['recycled'] == 1
+    assert browser.contexts[0].closed and not browser.contexts[1].closed
+    await pool.close()
+    assert browser.contexts[1].closed
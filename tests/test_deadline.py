@@ -0,0 +1,49 @@
+import pytest
+
+from deadline import DeadlineBudget, parse_deadline, SHED_WTD, SHED_LOW_INF_STORES, SHED_STOCK_ENRICHMENT
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_deadline():
+    assert parse_deadline('30', now=1000.0) == 2800.0
+    assert parse_deadline('@1760000000', now=1000.0) == 1760000000.0
+    with pytest.raises(ValueError):
+        parse_deadline('soon')
+
+
+def test_sheds_tiers_in_order_when_work_will_not_fit():
+    clock = Clock()
+    budget = DeadlineBudget(1000, tiers=(SHED_LOW_INF_STORES, SHED_STOCK_ENRICHMENT), reserve_seconds=100,
+                            min_samples=5, cooldown=60, clock=clock)
+    # 10 stores in 100s = 0.1/s; 200 stores left need 2000s but only 800s are left
+    shed = []
+    for _ in range(10):
+        clock.now += 10
+        shed.append(budget.store_done(200))
+    assert [tier for tier in shed if tier] == [SHED_STOCK_ENRICHMENT]
+    # Re-judged on throughput since the shed, after the cooldown
+    for _ in range(6):
+        clock.now += 10
+        budget.store_done(150)
+    assert budget.shed == [SHED_STOCK_ENRICHMENT, SHED_LOW_INF_STORES]
+    assert not budget.is_shed(SHED_WTD)
+
+
+def test_keeps_everything_when_on_track_and_expires_at_reserve():
+    clock = Clock()
+    budget = DeadlineBudget(1000, reserve_seconds=100, min_samples=5, cooldown=0, clock=clock)
+    for _ in range(10):
+        clock.now += 1
+        budget.store_done(20)
+    assert budget.shed == []
+    clock.now = 899
+    assert not budget.expired()
+    clock.now = 900
+    assert budget.expired()
@@ -0,0 +1,10 @@
+from logging.handlers import QueueHandler
+
+from utils import setup_logging
+
+
+def test_setup_logging_is_idempotent():
+    first = setup_logging()
+    second = setup_logging()
+    assert first is second
+    assert sum(isinstance(handler, QueueHandler) for handler in first.handlers) == 1
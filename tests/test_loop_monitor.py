@@ -0,0 +1,50 @@
+import asyncio
+import time
+import traceback
+
+from loop_monitor import LoopMonitor, PhaseStats, blocking_frame, phase
+
+
+def test_blocking_frame_skips_library_frames():
+    stack = [traceback.FrameSummary(__file__, 10, "push_report"),
+             traceback.FrameSummary("/usr/lib/python3.11/site-packages/requests/api.py", 59, "request")]
+    assert blocking_frame(stack) == "test_loop_monitor.py:10 push_report"
+
+
+def test_worst_offenders_ordered_by_time_blocked():
+    stats = PhaseStats()
+    stats.add_stall("a.py:1 short", 0.2)
+    stats.add_stall("b.py:2 long", 1.5)
+    stats.add_stall("a.py:1 short", 0.2)
+    assert [where for where, _ in stats.worst()] == ["b.py:2 long", "a.py:1 short"]
+    assert stats.stalls == 3 and stats.offenders["a.py:1 short"]['count'] == 2
+
+
+async def test_blocking_call_is_caught_in_its_phase():
+    monitor = LoopMonitor(interval=0.01, threshold=0.05, asyncio_debug=False)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    with monitor.phase("report"):
+        time.sleep(0.3)
+        await asyncio.sleep(0.05)
+    await monitor.stop()
+    report = monitor.phases["report"]
+    assert report.max_lag >= 0.25
+    assert any("test_blocking_call_is_caught_in_its_phase" in where for where in report.offenders)
+    assert monitor.current == "other"
+
+
+async def test_phase_without_monitor_is_a_no_op():
+    with phase("collect"):
+        await asyncio.sleep(0)
+
+
+def test_overlapping_phases_can_exit_in_any_order():
+    monitor = LoopMonitor()
+    summary, inf = monitor.phase("report"), monitor.phase("inf report")
+    summary.__enter__()
+    inf.__enter__()
+    summary.__exit__(None, None, None)
+    assert monitor.current == "inf report"
+    inf.__exit__(None, None, None)
+    assert monitor.current == "other"
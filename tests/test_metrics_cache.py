@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from api_scraper import DETAILED_METRICS_URL, _fetch_store_payloads, fetch_store_metrics
+from metrics_cache import MetricsCache, DETAILED_ENDPOINT, SUMMATION_ENDPOINT, is_closed_range
+from utils import LOCAL_TIMEZONE
+
+MID = 'amzn1.merchant.d.AAA'
+
+
+def test_closed_range_never_expires(tmp_path):
+    cache = MetricsCache(str(tmp_path / 'cache.sqlite3'), open_ttl=0)
+    midnight = datetime.now(LOCAL_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    start, end = midnight - timedelta(days=1), midnight - timedelta(seconds=1)
+    assert is_closed_range(end)
+
+    cache.put(SUMMATION_ENDPOINT, MID, start, end, {'OrdersShopped_V2': 5})
+    assert cache.get(SUMMATION_ENDPOINT, MID, start, end) == {'OrdersShopped_V2': 5}
+    assert cache.get(SUMMATION_ENDPOINT, 'other', start, end) is None
+
+
+def test_open_range_respects_ttl(tmp_path):
+    now = datetime.now(LOCAL_TIMEZONE)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    fresh = MetricsCache(str(tmp_path / 'fresh.sqlite3'), open_ttl=300)
+    fresh.put(SUMMATION_ENDPOINT, MID, start, now, {'OrdersShopped_V2': 1})
+    assert fresh.get(SUMMATION_ENDPOINT, MID, start, now) is not None
+
+    stale = MetricsCache(str(tmp_path / 'stale.sqlite3'), open_ttl=-1)
+    stale.put(SUMMATION_ENDPOINT, MID, start, now, {'OrdersShopped_V2': 1})
+    assert stale.get(SUMMATION_ENDPOINT, MID, start, now) is None
+    assert stale.stats == {'hits': 0, 'misses': 1, 'writes': 1}
+
+
+class FakeClient:
+    def __init__(self, detailed):
+        self.detailed = detailed
+
+    async def get_json(self, url, cookies):
+        if url.startswith(DETAILED_METRICS_URL):
+            return 200, self.detailed
+        return 200, {'OrdersShopped_V2': 3}
+
+
+def closed_day():
+    midnight = datetime.now(LOCAL_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight - timedelta(days=1), midnight - timedelta(seconds=1)
+
+
+async def test_wrong_store_records_are_not_cached(tmp_path):
+    cache = MetricsCache(str(tmp_path / 'cache.sqlite3'))
+    store = {'store_name': 'Morrisons - Leeds', 'merchant_id': MID, 'new_id': 'A1'}
+    start, end = closed_day()
+    wrong = [{'merchantName': 'Morrisons Bradford', 'LatePicks': 1}]
+
+    success, payloads = await _fetch_store_payloads(FakeClient(wrong), {}, store, start, end, cache=cache)
+    assert success and not payloads['context_ok']
+    assert cache.get(DETAILED_ENDPOINT, 'A1', start, end) is None
+    assert cache.get(SUMMATION_ENDPOINT, 'A1', start, end) == {'OrdersShopped_V2': 3}
+
+    right = [{'merchantName': 'Morrisons Leeds', 'LatePicks': 0}]
+    await _fetch_store_payloads(FakeClient(right), {}, store, start, end, cache=cache)
+    assert cache.get(DETAILED_ENDPOINT, 'A1', start, end) == right
+
+
+async def test_direct_api_path_shares_the_store_context_key(tmp_path):
+    cache = MetricsCache(str(tmp_path / 'cache.sqlite3'))
+    store = {'store_name': 'Morrisons - Leeds', 'merchant_id': MID, 'new_id': 'A1'}
+    start, end = closed_day()
+    cache.put(SUMMATION_ENDPOINT, 'A1', start, end, {'OrdersShopped_V2': 9})
+
+    success, form_data = await fetch_store_metrics(None, store, start, end, cache=cache)
+    assert success and form_data['orders'] == '9'
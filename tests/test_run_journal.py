@@ -0,0 +1,41 @@
+from run_journal import RunJournal, journal_key
+
+
+def test_journal_key_is_filesystem_safe():
+    key = journal_key({'start_date': '10/16/2026', 'start_time': '12:00 AM',
+                       'end_date': '10/16/2026', 'end_time': '11:59 PM'}, '20261016')
+    assert key == '10162026_1200AM_10162026_1159PM'
+    assert journal_key(None, '20261016') == 'default_20261016'
+
+
+def test_builtin_modes_are_keyed_by_mode_and_date():
+    today = {'mode': 'today', 'start_date': None, 'end_date': None, 'start_time': None, 'end_time': None}
+    yesterday = dict(today, mode='yesterday')
+    assert journal_key(today, '20261016') == 'today_20261016'
+    assert journal_key(today, '20261016') != journal_key(today, '20261017')
+    assert journal_key(today, '20261016') != journal_key(yesterday, '20261016')
+
+
+def test_resume_reads_records_and_skips_torn_line(tmp_path):
+    journal = RunJournal.open('perf', 'k', directory=str(tmp_path))
+    journal.append({'store': 'A'})
+    journal.append({'store': 'B'})
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"record": {"sto')  # killed mid-write
+
+    resumed = RunJournal.open('perf', 'k', resume=True, directory=str(tmp_path))
+    assert resumed.records == [{'store': 'A'}, {'store': 'B'}]
+    resumed.append({'store': 'C'})
+    resumed.close()
+    assert RunJournal.read(journal.path) == [{'store': 'A'}, {'store': 'B'}, {'store': 'C'}]
+
+
+def test_without_resume_starts_fresh_and_finish_removes(tmp_path):
+    journal = RunJournal.open('inf', 'k', directory=str(tmp_path))
+    journal.append(['Leeds', '123', [], 'N/A'])
+    journal.close()
+    fresh = RunJournal.open('inf', 'k', directory=str(tmp_path))
+    assert fresh.records == [] and RunJournal.read(fresh.path) == []
+    fresh.finish()
+    assert not (tmp_path / 'inf-k.jsonl').exists()
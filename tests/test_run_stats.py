@@ -0,0 +1,66 @@
+import pytest
+
+from run_stats import LatencyHistogram, RunStats, WindowedCounter
+
+
+def test_histogram_percentiles_are_close_and_bounded():
+    histogram = LatencyHistogram()
+    for i in range(1, 1001):
+        histogram.add(i / 100)  # 0.01s .. 10s
+    assert histogram.percentile(0.50) == pytest.approx(5.0, rel=0.05)
+    assert histogram.percentile(0.95) == pytest.approx(9.5, rel=0.05)
+    assert histogram.percentile(1.0) == 10.0
+    assert histogram.mean == pytest.approx(5.005)
+    assert len(histogram.buckets) < 200
+
+
+def test_single_sample_reports_exactly():
+    histogram = LatencyHistogram()
+    histogram.add(1.234)
+    assert histogram.percentile(0.95) == 1.234
+
+
+def test_windowed_counter_expires_old_buckets():
+    counter = WindowedCounter(window_seconds=60)
+    counter.add(now=0.5)
+    counter.add(now=30.2)
+    counter.add(2, now=59.9)
+    assert counter.count(now=60.0) == 4
+    assert counter.count(now=91.5) == 2
+    assert counter.count(now=91.5, since=59.0) == 2
+    assert counter.total == 4
+
+
+def test_request_snapshot_since_excludes_earlier_buckets():
+    stats = RunStats(request_window=30)
+    stats.record_request(0.5, 'ok', now=10.2)
+    stats.record_request(0.1, 'throttle', now=10.4)
+    stats.record_request(0.7, 'ok', now=12.1)
+    snapshot = stats.request_snapshot(now=12.5)
+    assert snapshot['samples'] == 3 and snapshot['counts']['throttle'] == 1
+    later = stats.request_snapshot(now=12.5, since=10.6)
+    assert later['counts'] == {'ok': 1, 'throttle': 0}
+    assert later['p95'] == 0.7
+
+
+def test_store_breakdown_and_extremes():
+    stats = RunStats()
+    stats.record_latency('collection', 1.0, store='Leeds')
+    stats.record_latency('collection', 4.0, store='York')
+    stats.record_failure('Hull', now=0)
+    assert stats.extremes('collection') == (('Leeds', 1.0), ('York', 4.0))
+    assert [row['store'] for row in stats.store_breakdown()] == ['York', 'Leeds', 'Hull']
+    assert stats.stores['Hull']['failures'] == 1
+
+
+def test_merge_combines_histograms_failures_and_stores():
+    first, second = RunStats(), RunStats()
+    first.record_latency('collection', 1.0, store='Leeds')
+    second.record_latency('collection', 3.0, store='York')
+    second.record_failure('York', now=0)
+    second.record_request(0.2, 'throttle', now=0)
+    first.merge(second)
+    assert first.latency('collection').count == 2
+    assert first.failures.total == 1
+    assert first.request_totals() == {'throttle': 1}
+    assert first.stores['York'] == {'failures': 1, 'collection': 3.0}
@@ -0,0 +1,46 @@
+import pytest
+
+from sharding import (partition_stores, parse_shard_spec, shard_artifact_path, write_shard_artifact,
+                      read_shard_artifacts, missing_shards)
+
+
+def test_partitions_cover_every_store_once():
+    stores = [{'store_name': f"Store {i}"} for i in range(10)]
+    shards = [partition_stores(stores, index, 3) for index in range(3)]
+    assert [len(shard) for shard in shards] == [4, 3, 3]
+    names = sorted(s['store_name'] for shard in shards for s in shard)
+    assert names == sorted(s['store_name'] for s in stores)
+
+
+def test_partition_is_deterministic():
+    stores = [{'store_name': f"Store {i}"} for i in range(7)]
+    assert partition_stores(stores, 1, 2) == partition_stores(list(stores), 1, 2)
+    assert partition_stores(stores, 0, 1) == stores
+
+
+def test_parse_shard_spec():
+    assert parse_shard_spec('1/4') == (0, 4)
+    assert parse_shard_spec('4/4') == (3, 4)
+    for spec in ('0/4', '5/4', '2', 'a/b', '1/0'):
+        with pytest.raises(ValueError):
+            parse_shard_spec(spec)
+
+
+def test_artifacts_round_trip_in_shard_order(tmp_path):
+    for index in (2, 0):
+        meta = {'kind': 'perf', 'shard': index, 'count': 3, 'config': {'date_range_mode': 'today'}}
+        write_shard_artifact(shard_artifact_path('perf', index, 3, str(tmp_path)), meta, [{'n': index}])
+    metas, records = read_shard_artifacts([str(tmp_path)], 'perf')
+    assert [meta['shard'] for meta in metas] == [0, 2]
+    assert records == [{'n': 0}, {'n': 2}]
+    assert missing_shards(metas) == [2]
+    with pytest.raises(ValueError):
+        read_shard_artifacts([str(tmp_path)], 'inf')
+
+
+def test_artifacts_from_different_date_ranges_are_rejected(tmp_path):
+    for index, mode in ((0, 'today'), (1, 'yesterday')):
+        meta = {'kind': 'inf', 'shard': index, 'count': 2, 'config': {'date_range_mode': mode}}
+        write_shard_artifact(shard_artifact_path('inf', index, 2, str(tmp_path)), meta, [])
+    with pytest.raises(ValueError):
+        read_shard_artifacts([str(tmp_path)], 'inf')
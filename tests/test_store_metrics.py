@@ -0,0 +1,55 @@
+import pytest
+
+from store_metrics import StoreMetrics, metric_value, metric_display, available_hours, entry_to_json, entry_from_json
+
+PAYLOAD = {
+    'OrdersShopped_V2': 42, 'RequestedQuantity_V2': 500, 'PickedUnits_V2': 480,
+    'AverageUPH_V2': 91.6, 'ItemNotFoundRate_V2': 1.64, 'ItemFoundRate_V2': 98.36,
+    'ShortedUnits_V2': 20, 'TimeAvailable_V2': 13500000,  # 3h45m
+}
+
+
+def test_form_dict_matches_legacy_strings():
+    record = StoreMetrics.from_summation('Morrisons - Leeds', PAYLOAD, lates_rate=2.25)
+    form = record.to_form_dict()
+    assert form['orders'] == '42'
+    assert form['uph'] == '92'
+    assert form['inf'] == '1.6 %'
+    assert form['lates'] == '2.2 %'
+    assert form['time_available'] == '3:45'
+    assert 'has_wtd' not in form
+
+
+def test_unknown_lates_renders_na():
+    record = StoreMetrics.from_summation('Leeds', PAYLOAD)
+    assert record.display('lates') == 'N/A'
+    assert metric_value(record, 'lates') == 0.0
+
+
+def test_wtd_values_and_hours_are_exact():
+    record = StoreMetrics.from_summation('Leeds', PAYLOAD, 2.0)
+    record.wtd = StoreMetrics.from_summation('Leeds', dict(PAYLOAD, TimeAvailable_V2=36_000_000, AverageUPH_V2=88.0), 3.0)
+    assert metric_value(record, 'uph', wtd=True) == 88.0
+    assert available_hours(record) == pytest.approx(3.75)
+    assert available_hours(record, wtd=True) == pytest.approx(10.0)
+    form = record.to_form_dict()
+    assert form['has_wtd'] and form['lates_WTD'] == '3.0 %'
+
+
+def test_accessors_accept_legacy_dicts():
+    legacy = {'store': 'Leeds', 'orders': '10', 'lates': '5.0 %', 'uph': '70', 'time_available': '2:30',
+              'has_wtd': True, 'lates_WTD': '4.0 %'}
+    assert metric_value(legacy, 'lates') == 5.0
+    assert metric_value(legacy, 'lates', wtd=True) == 4.0
+    assert metric_value(legacy, 'uph', wtd=True) == 0.0
+    assert metric_display(legacy, 'lates') == '5.0 %'
+    assert available_hours(legacy) == 2.5
+
+
+def test_json_round_trip_keeps_values_and_wtd():
+    record = StoreMetrics.from_summation('Leeds', PAYLOAD, 2.0)
+    record.wtd = StoreMetrics.from_summation('Leeds', PAYLOAD, 3.0)
+    restored = entry_from_json(entry_to_json(record))
+    assert restored.to_form_dict() == record.to_form_dict()
+    legacy = {'store': 'Leeds', 'orders': '10'}
+    assert entry_from_json(entry_to_json(legacy)) == legacy
@@ -0,0 +1,25 @@
+from store_schedule import StoreDurations
+
+
+def stores(*names):
+    return [{'store_name': name} for name in names]
+
+
+def test_orders_slowest_first_and_unknown_at_median():
+    durations = StoreDurations({'A': 1.0, 'B': 9.0, 'C': 4.0})
+    ordered = durations.longest_first(stores('A', 'B', 'New', 'C'))
+    assert [s['store_name'] for s in ordered] == ['B', 'New', 'C', 'A']
+
+
+def test_no_history_keeps_csv_order():
+    assert StoreDurations().longest_first(stores('A', 'B', 'C')) == stores('A', 'B', 'C')
+
+
+def test_update_smooths_and_round_trips(tmp_path):
+    path = str(tmp_path / 'durations.json')
+    durations = StoreDurations({'A': 10.0}, path=path)
+    durations.update([{'store': 'A', 'collection': 20.0}, {'store': 'B', 'collection': 3.0},
+                      {'store': 'Failed', 'failures': 1}])
+    durations.save()
+    loaded = StoreDurations.load(path)
+    assert loaded.expected == {'A': 15.0, 'B': 3.0}
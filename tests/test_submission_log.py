@@ -0,0 +1,35 @@
+import asyncio
+import json
+
+from submission_log import SubmissionLogWriter
+
+
+def record(store):
+    return {'timestamp': '2025-01-01 08:00:00', 'store': store, 'orders': '10', 'uph': '90'}
+
+
+async def test_records_are_written_with_one_header(tmp_path):
+    csv_path, json_path = tmp_path / 'submissions.log', tmp_path / 'submissions.jsonl'
+    for run in range(2):
+        writer = SubmissionLogWriter(str(csv_path), str(json_path))
+        await writer.start()
+        for store in ('Leeds', 'York'):
+            writer.submit(record(f"{store} {run}"))
+        await writer.close()
+
+    lines = csv_path.read_text(encoding='utf-8').splitlines()
+    assert lines[0].startswith('timestamp,store,orders')
+    assert len(lines) == 5 and sum(line.startswith('timestamp') for line in lines) == 1
+    stores = [json.loads(line)['store'] for line in json_path.read_text(encoding='utf-8').splitlines()]
+    assert stores == ['Leeds 0', 'York 0', 'Leeds 1', 'York 1']
+
+
+async def test_buffer_is_flushed_on_interval(tmp_path):
+    json_path = tmp_path / 'submissions.jsonl'
+    writer = SubmissionLogWriter(str(tmp_path / 'submissions.log'), str(json_path), flush_interval=0.05)
+    await writer.start()
+    writer.submit(record('Leeds'))
+    await asyncio.sleep(0.2)
+    assert 'Leeds' in json_path.read_text(encoding='utf-8')
+    await writer.close()
+    assert writer.stats['records'] == 1
@@ -2,6 +2,7 @@ import pytest
 import logging
 from unittest.mock import MagicMock, AsyncMock, patch
 from webhook import post_performance_highlights, post_to_chat_webhook, _format_metric_with_emoji
+from store_metrics import StoreMetrics
 
 # Mock logger
 logger = logging.getLogger("test_logger")
@@ -129,3 +130,37 @@ async def test_post_to_chat_webhook_filtering():
         
         assert "Store A" in payload_str
         assert "Store B" not in payload_str
+
+@pytest.mark.asyncio
+async def test_post_to_chat_webhook_accepts_store_metrics():
+    """StoreMetrics records are rendered without being stringified first."""
+    entries = [
+        StoreMetrics('Store A', orders=10, uph=95.4, lates=1.25, inf=0.5),
+        StoreMetrics('Store B', orders=0, uph=0.0, lates=None, inf=0.0),
+    ]
+    
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_post.return_value.__aenter__.return_value.status = 200
+        
+        await post_to_chat_webhook(
+            entries=entries,
+            chat_webhook_url="http://mock-url",
+            chat_batch_count=1,
+            get_date_range_func=lambda: None,
+            sanitize_func=sanitize,
+            uph_threshold=80,
+            lates_threshold=3.0,
+            inf_threshold=2.0,
+            emoji_green="✅",
+            emoji_red="❌",
+            local_timezone=None,
+            debug_mode=True,
+            app_logger=logger
+        )
+        
+        args, kwargs = mock_post.call_args
+        payload_str = str(kwargs['json'])
+        
+        assert "Store A" in payload_str
+        assert "✅95" in payload_str and "✅1.2" in payload_str
+        assert "Store B" not in payload_str
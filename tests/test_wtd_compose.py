@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import pytest
+
+from api_scraper import compose_summation, day_slices
+
+
+def test_compose_sums_additive_and_weights_rates():
+    monday = {'OrdersShopped_V2': 10, 'PickedUnits_V2': 100, 'TimeAvailable_V2': 3600000,
+              'AverageUPH_V2': 80.0, 'ItemNotFoundRate_V2': 1.0}
+    tuesday = {'OrdersShopped_V2': 30, 'PickedUnits_V2': 200, 'TimeAvailable_V2': 7200000,
+               'AverageUPH_V2': 120.0, 'ItemNotFoundRate_V2': 3.0}
+    composed = compose_summation([monday, tuesday])
+
+    assert composed['OrdersShopped_V2'] == 40
+    assert composed['PickedUnits_V2'] == 300
+    assert composed['TimeAvailable_V2'] == 10800000
+    assert composed['AverageUPH_V2'] == pytest.approx(110.0)
+    assert composed['ItemNotFoundRate_V2'] == pytest.approx(2.5)
+
+
+def test_compose_with_no_orders_has_zero_rates():
+    composed = compose_summation([{'OrdersShopped_V2': 0, 'AverageUPH_V2': 50.0}])
+    assert composed['AverageUPH_V2'] == 0.0
+
+
+def test_day_slices_cover_closed_days_only():
+    slices = day_slices(datetime(2025, 1, 6), datetime(2025, 1, 8, 14, 30))
+    assert [s.day for s, _ in slices] == [6, 7]
+    assert slices[0][1] == datetime(2025, 1, 6, 23, 59, 59)
+    assert day_slices(datetime(2025, 1, 6), datetime(2025, 1, 6, 9)) == []
@@ -2,20 +2,24 @@
 #                           UTILS MODULE - Logging & Utilities
 # =======================================================================================
 
+import atexit
 import logging
 import os
+import queue
 import csv
 import json
 import re
 from datetime import datetime
 from pytz import timezone
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from playwright.async_api import Page
 from typing import List, Dict
 
 # Use UK timezone for log timestamps
 LOCAL_TIMEZONE = timezone('Europe/London')
 
+_log_listener = None  # QueueListener writing app.log/console, started by setup_logging()
+
 
 class LocalTimeFormatter(logging.Formatter):
     """Formatter that converts timestamps to ``LOCAL_TIMEZONE``."""
@@ -28,15 +32,19 @@ class LocalTimeFormatter(logging.Formatter):
 def setup_logging():
     """Configure application logging to file and console.
 
+    Safe to call from every module: the handlers are set up once per process.
+    Records are put on a queue and written to ``app.log`` and the console by a
+    background thread, so logging never blocks the event loop on I/O.
+
     Returns:
         Logger: Configured logger instance used throughout the app.
     """
+    global _log_listener
     app_logger = logging.getLogger('app')
+    if _log_listener is not None:
+        return app_logger
     
-    # Clear existing handlers to prevent duplicates
-    if app_logger.handlers:
-        app_logger.handlers.clear()
-    
+    app_logger.handlers.clear()
     app_logger.setLevel(logging.INFO)
     app_logger.propagate = False  # Prevent logs from propagating to root logger
 
@@ -45,11 +53,26 @@ def setup_logging():
     app_file.setFormatter(fmt)
     console = logging.StreamHandler()
     console.setFormatter(fmt)
-    app_logger.addHandler(app_file)
-    app_logger.addHandler(console)
+
+    log_queue = queue.SimpleQueue()
+    app_logger.addHandler(QueueHandler(log_queue))
+    _log_listener = QueueListener(log_queue, app_file, console, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(stop_logging)
     return app_logger
 
 
+def stop_logging():
+    """Write out any queued records and stop the logging thread (registered with atexit)."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+        logging.getLogger('app').handlers.clear()
+
+
 def sanitize_store_name(name: str, store_prefix_re) -> str:
     """Trim standard prefix from store names for chat display."""
     return store_prefix_re.sub("", name).strip()
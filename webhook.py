@@ -3,28 +3,33 @@
 # =======================================================================================
 
 import re
-import json
-import asyncio
-import aiohttp
-import ssl
-import certifi
-import aiofiles
-import os
-import csv
-import io
 from datetime import datetime
 from typing import List, Dict
 import urllib.parse
 
+from store_metrics import StoreMetrics, metric_value, metric_display, store_name_of
+from chat_client import get_chat_client
+
+# Generous upper bound for a store batch card without its grid rows (header, subtitle
+# with date range, grid wrapper), used when packing rows up to the message size limit
+STORE_CARD_OVERHEAD = 2000
+
 # Google Chat Colors (Used for Performance Highlights)
 COLOR_RED = "#C62828"   # Dark Red
 
-def _format_metric_with_emoji(value_str: str, threshold: float, emoji_green: str, 
+def _format_metric_with_emoji(value_str, threshold: float, emoji_green: str, 
                               emoji_red: str, is_uph: bool = False) -> str:
     """
     Applies a pass/fail emoji.
     COMPACT MODE: Removes spaces and '%' symbols to save width on mobile.
+    Accepts a raw number (StoreMetrics) or a legacy display string ("1.6 %").
     """
+    if value_str is None:
+        return "N/A"
+    if isinstance(value_str, (int, float)):
+        is_good = (value_str >= threshold) if is_uph else (value_str <= threshold)
+        emoji = emoji_green if is_good else emoji_red
+        return f"{emoji}{value_str:.0f}" if is_uph else f"{emoji}{value_str:.1f}"
     try:
         # Clean string to just numbers and decimal point
         clean_str = re.sub(r'[^\d.]', '', value_str)
@@ -41,6 +46,43 @@ def _format_metric_with_emoji(value_str: str, threshold: float, emoji_green: str
         return value_str
 
 
+def store_grid_row(entry, sanitize_func, uph_threshold: float, lates_threshold: float, inf_threshold: float,
+                   emoji_green: str, emoji_red: str) -> List[Dict]:
+    """The five grid cells for one store in a batch card (also used to size batches)."""
+    if isinstance(entry, StoreMetrics):
+        orders_val = str(entry.orders)
+        uph_val, lates_val, inf_val = entry.uph, entry.lates, entry.inf
+    else:
+        # Clean up orders
+        orders_raw = entry.get("orders", "0")
+        try:
+            orders_val = str(int(float(orders_raw)))
+        except:
+            orders_val = orders_raw
+
+        uph_val = entry.get("uph", "N/A")
+        lates_val = entry.get("lates", "0.0 %") or "0.0 %"
+        inf_val = entry.get("inf", "0.0 %") or "0.0 %"
+
+    # Apply emoji formatting (Compacted)
+    formatted_uph = _format_metric_with_emoji(uph_val, uph_threshold, emoji_green, emoji_red, is_uph=True)
+    formatted_lates = _format_metric_with_emoji(lates_val, lates_threshold, emoji_green, emoji_red)
+    formatted_inf = _format_metric_with_emoji(inf_val, inf_threshold, emoji_green, emoji_red)
+
+    # Store Name: Truncate nicely if too long for mobile column
+    store_name = sanitize_func(store_name_of(entry))
+    # Optional: aggressive truncation for very long names if needed
+    # if len(store_name) > 15: store_name = store_name[:14] + "…"
+
+    return [
+        {"title": store_name, "textAlignment": "START"},
+        {"title": orders_val, "textAlignment": "CENTER"},
+        {"title": formatted_uph, "textAlignment": "CENTER"},
+        {"title": formatted_lates, "textAlignment": "CENTER"},
+        {"title": formatted_inf, "textAlignment": "CENTER"},
+    ]
+
+
 async def post_to_chat_webhook(entries: List[Dict[str, str]], chat_webhook_url: str,
                                chat_batch_count: int, get_date_range_func, sanitize_func,
                                uph_threshold: float, lates_threshold: float, inf_threshold: float,
@@ -50,9 +92,12 @@ async def post_to_chat_webhook(entries: List[Dict[str, str]], chat_webhook_url:
     - No Borders (Saves padding)
     - Short Headers
     - Compact Metrics
+
+    Returns:
+        False if the post failed (so the batch can be retried), else True
     """
     if not chat_webhook_url or not entries:
-        return
+        return True
     try:
         batch_header_text = datetime.now(local_timezone).strftime("%A %d %B, %H:%M")
         card_subtitle = f"{batch_header_text}  Batch {chat_batch_count} ({len(entries)} stores)"
@@ -65,16 +110,15 @@ async def post_to_chat_webhook(entries: List[Dict[str, str]], chat_webhook_url:
         filtered_entries = []
         for e in entries:
             try:
-                val = e.get('orders', '0')
-                if int(float(val)) > 0:
+                if int(metric_value(e, 'orders')) > 0:
                     filtered_entries.append(e)
             except (ValueError, TypeError):
                 continue
 
         if not filtered_entries:
-            return
+            return True
 
-        sorted_entries = sorted(filtered_entries, key=lambda e: sanitize_func(e.get("store", "")))
+        sorted_entries = sorted(filtered_entries, key=lambda e: sanitize_func(store_name_of(e)))
 
         # --- COMPACT GRID LAYOUT ---
         # Shortened titles for Mobile readability
@@ -87,34 +131,8 @@ async def post_to_chat_webhook(entries: List[Dict[str, str]], chat_webhook_url:
         ]
 
         for entry in sorted_entries:
-            # Clean up orders
-            orders_raw = entry.get("orders", "0")
-            try:
-                orders_val = str(int(float(orders_raw)))
-            except:
-                orders_val = orders_raw
-
-            uph_val = entry.get("uph", "N/A")
-            lates_val = entry.get("lates", "0.0 %") or "0.0 %"
-            inf_val = entry.get("inf", "0.0 %") or "0.0 %"
-
-            # Apply emoji formatting (Compacted)
-            formatted_uph = _format_metric_with_emoji(uph_val, uph_threshold, emoji_green, emoji_red, is_uph=True)
-            formatted_lates = _format_metric_with_emoji(lates_val, lates_threshold, emoji_green, emoji_red)
-            formatted_inf = _format_metric_with_emoji(inf_val, inf_threshold, emoji_green, emoji_red)
-
-            # Store Name: Truncate nicely if too long for mobile column
-            store_name = sanitize_func(entry.get("store", "N/A"))
-            # Optional: aggressive truncation for very long names if needed
-            # if len(store_name) > 15: store_name = store_name[:14] + "…"
-
-            grid_items.extend([
-                {"title": store_name, "textAlignment": "START"},
-                {"title": orders_val, "textAlignment": "CENTER"},
-                {"title": formatted_uph, "textAlignment": "CENTER"},
-                {"title": formatted_lates, "textAlignment": "CENTER"},
-                {"title": formatted_inf, "textAlignment": "CENTER"},
-            ])
+            grid_items.extend(store_grid_row(entry, sanitize_func, uph_threshold, lates_threshold, inf_threshold,
+                                             emoji_green, emoji_red))
         
         table_section = {
             "header": "Key Performance Indicators",
@@ -144,17 +162,11 @@ async def post_to_chat_webhook(entries: List[Dict[str, str]], chat_webhook_url:
             }]
         }
         
-        timeout = aiohttp.ClientTimeout(total=30)
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
-            async with session.post(chat_webhook_url, json=payload) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    app_logger.error(f"Chat webhook post failed: {resp.status} {error_text}")
+        return await get_chat_client().post(chat_webhook_url, payload, f"store batch {chat_batch_count}", app_logger)
 
     except Exception as e:
         app_logger.error(f"Error posting to chat webhook: {e}", exc_info=debug_mode)
+        return False
 
 
 async def post_job_summary(total: int, success: int, failures: List[str], duration: float,
@@ -171,19 +183,19 @@ async def post_job_summary(total: int, success: int, failures: List[str], durati
         throughput_spm = (success / (duration / 60)) if duration > 0 else 0
         
         async with metrics_lock:
-            coll_times = metrics["collection_times"]
-            sub_times = metrics["submission_times"]
+            run_stats = metrics["stats"]
             retries = metrics["retries"]
             retry_stores = len(metrics["retry_stores"])
             total_orders = metrics["total_orders"]
             total_units = metrics["total_units"]
+            http_stats = metrics.get("http_client")
+            concurrency_stats = metrics.get("concurrency")
+            deadline_stats = metrics.get("deadline")
             
-        avg_coll = sum(t[1] for t in coll_times) / len(coll_times) if coll_times else 0
-        avg_sub = sum(t[1] for t in sub_times) / len(sub_times) if sub_times else 0
-        sorted_coll = sorted([t[1] for t in coll_times])
-        p95_coll = sorted_coll[int(len(sorted_coll) * 0.95)] if sorted_coll else 0
-        fastest_store = min(coll_times, key=lambda x: x[1]) if coll_times else ("N/A", 0)
-        slowest_store = max(coll_times, key=lambda x: x[1]) if coll_times else ("N/A", 0)
+        collection = run_stats.latency('collection')
+        avg_coll = collection.mean
+        avg_sub = run_stats.latency('submission').mean
+        fastest_store, slowest_store = run_stats.extremes('collection')
         
         bottleneck_msg = "Balanced Flow"
         if avg_coll > 2.0: bottleneck_msg = "🐢 Slow Scraping (Browser Lag)"
@@ -209,12 +221,29 @@ async def post_job_summary(total: int, success: int, failures: List[str], durati
         detailed_widgets.append({"textParagraph": {"text": "<b>Resilience & Health 🏥</b>"}})
         detailed_widgets.append({"decoratedText": {"topLabel": "Total Retries", "text": str(retries), "startIcon": {"knownIcon": "MEMBERSHIP"}}})
         detailed_widgets.append({"decoratedText": {"topLabel": "Stores Retried", "text": str(retry_stores), "startIcon": {"knownIcon": "STORE"}}})
+        if http_stats:
+            conn_text = (f"{http_stats['connections_reused']} reused / {http_stats['connections_created']} new "
+                         f"({http_stats['reuse_ratio']:.0%})")
+            detailed_widgets.append({"decoratedText": {"topLabel": "API Connections", "text": conn_text, "startIcon": {"knownIcon": "DESCRIPTION"}}})
+        if concurrency_stats:
+            throttled = concurrency_stats['requests'].get('throttle', 0)
+            conc_text = (f"{concurrency_stats['final_limit']} final ({concurrency_stats['lowest_limit']}-"
+                         f"{concurrency_stats['peak_limit']}), {throttled} throttled")
+            detailed_widgets.append({"decoratedText": {"topLabel": "Concurrency (AIMD)", "text": conc_text, "startIcon": {"knownIcon": "CLOCK"}}})
+        if deadline_stats and (deadline_stats['shed'] or deadline_stats['skipped_stores']):
+            deadline_text = (f"Dropped {', '.join(deadline_stats['shed']) or 'nothing'}, "
+                             f"{deadline_stats['skipped_stores']} stores skipped")
+            detailed_widgets.append({"decoratedText": {"topLabel": "Deadline", "text": deadline_text, "startIcon": {"knownIcon": "CLOCK"}}})
         detailed_widgets.append({"divider": {}})
 
         # Extremes
         detailed_widgets.append({"textParagraph": {"text": "<b>Extremes 📉📈</b>"}})
         detailed_widgets.append({"decoratedText": {"topLabel": "Fastest Store", "text": f"{fastest_store[0]} ({fastest_store[1]:.2f}s)", "startIcon": {"knownIcon": "BOLT"}}})
         detailed_widgets.append({"decoratedText": {"topLabel": "Slowest Store", "text": f"{slowest_store[0]} ({slowest_store[1]:.2f}s)", "startIcon": {"knownIcon": "SNAIL"}}})
+        if collection.count:
+            latency_text = (f"p50 {collection.percentile(0.50):.2f}s · p95 {collection.percentile(0.95):.2f}s · "
+                            f"p99 {collection.percentile(0.99):.2f}s")
+            detailed_widgets.append({"decoratedText": {"topLabel": "Collection Latency", "text": latency_text, "startIcon": {"knownIcon": "CLOCK"}}})
 
         if failures:
             detailed_widgets.append({"divider": {}})
@@ -244,8 +273,7 @@ async def post_job_summary(total: int, success: int, failures: List[str], durati
             }]
         }
         
-        async with aiohttp.ClientSession() as session:
-            await session.post(chat_webhook_url, json=payload)
+        await get_chat_client().post(chat_webhook_url, payload, "job summary", app_logger)
 
     except Exception as e:
         app_logger.error(f"Error posting job summary: {e}", exc_info=debug_mode)
@@ -336,34 +364,7 @@ async def post_quick_actions_card(chat_webhook_url: str, apps_script_url: str, d
             }]
         }
 
-        max_attempts = 3
-        backoff_seconds = [1, 2, 4]
-
-        async with aiohttp.ClientSession() as session:
-            for attempt in range(1, max_attempts + 1):
-                try:
-                    async with session.post(chat_webhook_url, json=payload) as response:
-                        if response.status < 300:
-                            return
-
-                        response_body = await response.text()
-                        app_logger.warning(
-                            f"Quick actions card POST returned status {response.status} (attempt {attempt}/{max_attempts}). "
-                            f"Response: {response_body}"
-                        )
-                except Exception as request_error:
-                    app_logger.error(
-                        f"Error posting quick actions card (attempt {attempt}/{max_attempts}): {request_error}",
-                        exc_info=debug_mode,
-                    )
-
-                if attempt < max_attempts:
-                    sleep_seconds = backoff_seconds[attempt - 1]
-                    app_logger.info(
-                        f"Retrying quick actions card post in {sleep_seconds} seconds (attempt {attempt + 1}/{max_attempts})"
-                    )
-                    await asyncio.sleep(sleep_seconds)
-
+        if not await get_chat_client().post(chat_webhook_url, payload, "quick actions card", app_logger):
             raise RuntimeError("Failed to post quick actions card after retrying")
 
     except Exception as e:
@@ -388,17 +389,13 @@ async def post_performance_highlights(store_data: List[Dict[str, str]], chat_web
         parsed_stores = []
         for entry in store_data:
             try:
-                if int(float(entry.get('orders', '0'))) == 0: continue
-                
-                def parse_metric(key):
-                    clean = re.sub(r'[^0-9.]', '', entry.get(key, '0'))
-                    return float(clean) if clean else 0.0
+                if int(metric_value(entry, 'orders')) == 0: continue
 
                 parsed_stores.append({
-                    'store': entry.get('store', 'Unknown'),
-                    'lates': parse_metric('lates'), 'lates_str': entry.get('lates', '0%'),
-                    'inf': parse_metric('inf'), 'inf_str': entry.get('inf', '0%'),
-                    'uph': parse_metric('uph'), 'uph_str': entry.get('uph', '0')
+                    'store': store_name_of(entry),
+                    'lates': metric_value(entry, 'lates'), 'lates_str': metric_display(entry, 'lates', '0%'),
+                    'inf': metric_value(entry, 'inf'), 'inf_str': metric_display(entry, 'inf', '0%'),
+                    'uph': metric_value(entry, 'uph'), 'uph_str': metric_display(entry, 'uph', '0')
                 })
             except: continue
         
@@ -470,9 +467,6 @@ async def post_performance_highlights(store_data: List[Dict[str, str]], chat_web
                     ]
                 })
 
-            import ssl
-            import certifi
-            
             payload = {
                 "cardsV2": [{
                     "cardId": f"perf-high-{int(datetime.now().timestamp())}",
@@ -487,14 +481,8 @@ async def post_performance_highlights(store_data: List[Dict[str, str]], chat_web
                     },
                 }]
             }
-            ssl_context = ssl.create_default_context(cafile=certifi.where())
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
-            async with aiohttp.ClientSession(connector=connector) as session:
-                resp = await session.post(chat_webhook_url, json=payload)
-                if resp.status == 200:
-                    app_logger.info("Performance highlights sent successfully")
-                else:
-                    app_logger.error(f"Failed to send performance highlights: {resp.status}")
+            if await get_chat_client().post(chat_webhook_url, payload, "performance highlights", app_logger):
+                app_logger.info("Performance highlights sent successfully")
         else:
             app_logger.warning("No sections to send in performance highlights")
 
@@ -502,54 +490,20 @@ async def post_performance_highlights(store_data: List[Dict[str, str]], chat_web
         app_logger.error(f"Error posting highlights: {e}", exc_info=debug_mode)
 
 
-async def add_to_pending_chat(entry: Dict[str, str], chat_webhook_url: str, pending_chat_lock,
-                              pending_chat_entries: List, chat_batch_size: int, post_webhook_func):
-    if not chat_webhook_url:
-        return
-    async with pending_chat_lock:
-        pending_chat_entries.append(entry)
-        if len(pending_chat_entries) >= chat_batch_size:
-            entries_to_send = pending_chat_entries[:chat_batch_size]
-            del pending_chat_entries[:chat_batch_size]
-            await post_webhook_func(entries_to_send)
-
-
-async def flush_pending_chat_entries(chat_webhook_url: str, pending_chat_lock,
-                                     pending_chat_entries: List, post_webhook_func):
-    if not chat_webhook_url:
-        return
-    async with pending_chat_lock:
-        if pending_chat_entries:
-            entries = pending_chat_entries[:]
-            pending_chat_entries.clear()
-            await post_webhook_func(entries)
-
-
-async def log_submission(data: Dict[str,str], log_lock, log_file: str, json_log_file: str,
-                        submitted_data_lock, submitted_store_data: List, 
-                        add_to_chat_func, local_timezone, app_logger):
-    async with log_lock:
-        current_timestamp = datetime.now(local_timezone).strftime('%Y-%m-%d %H:%M:%S')
-        log_entry = {'timestamp': current_timestamp, **data}
-        fieldnames = ['timestamp','store','orders','units','fulfilled','uph','inf','found','cancelled','lates','time_available']
-        new_csv = not os.path.exists(log_file)
-        try:
-            csv_buffer = io.StringIO()
-            writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames, extrasaction='ignore')
-            if new_csv:
-                writer.writeheader()
-            writer.writerow(log_entry)
-            async with aiofiles.open(log_file, 'a', newline='', encoding='utf-8') as f:
-                await f.write(csv_buffer.getvalue())
-        except IOError as e:
-            app_logger.error(f"Error writing to CSV log file {log_file}: {e}")
-        try:
-            async with aiofiles.open(json_log_file, 'a', encoding='utf-8') as f:
-                await f.write(json.dumps(log_entry) + '\n')
-        except IOError as e:
-            app_logger.error(f"Error writing to JSON log file {json_log_file}: {e}")
-        
-        async with submitted_data_lock:
-            submitted_store_data.append(data)
-        
-        await add_to_chat_func(log_entry)
\ No newline at end of file
+async def log_submission(data, log_writer, submitted_data_lock, submitted_store_data: List,
+                         add_to_chat_func, local_timezone):
+    """Queue a store result for the CSV/JSONL logs, chat and the report.
+    
+    ``data`` is a StoreMetrics (API path) or a legacy form dict (browser path);
+    the logs always get the formatted strings, consumers get ``data`` itself.
+    The logs are written by ``log_writer`` (a SubmissionLogWriter) in the background.
+    """
+    current_timestamp = datetime.now(local_timezone).strftime('%Y-%m-%d %H:%M:%S')
+    form_dict = data.to_form_dict() if isinstance(data, StoreMetrics) else data
+    log_entry = {'timestamp': current_timestamp, **form_dict}
+    log_writer.submit(log_entry)
+    
+    async with submitted_data_lock:
+        submitted_store_data.append(data)
+    
+    await add_to_chat_func(data if isinstance(data, StoreMetrics) else log_entry)
@@ -7,6 +7,7 @@ import aiohttp
 import ssl
 import certifi
 import re
+import time
 import psutil
 from asyncio import Queue
 from playwright.async_api import BrowserContext, Browser, Page, TimeoutError, expect
@@ -14,14 +15,24 @@ from typing import Dict
 from datetime import datetime
 
 # Import API-first scraper for optimized data collection
-from api_scraper import fetch_store_metrics_with_lates_browser
+from api_scraper import (StoreContext, cached_range_results, compose_range_from_cache, day_slices,
+                         missing_day_slices, cookies_from_storage_state, SellerCentralClient)
+from store_metrics import store_name_of
+from run_stats import RunStats
+from context_pool import BrowserContextPool
+from deadline import DeadlineBudget, SHED_WTD
+
+# Back-off before each retry of a failed store (10s, 30s, 60s) to give the APIs time to recover
+STORE_RETRY_DELAYS = [10, 30, 60]
+# With the metrics cache, WTD is composed from cached days; with more uncached days than
+# this, a single live WTD fetch is cheaper than backfilling them
+MAX_WTD_BACKFILL_DAYS = 1
 
 
 async def auto_concurrency_manager(concurrency_limit_ref: dict, last_change_ref: dict,
                                    auto_enabled: bool, auto_min: int, auto_max: int,
                                    cpu_upper: float, cpu_lower: float, mem_upper: float,
-                                   check_interval: int, cooldown: int,
-                                   failure_lock, failure_timestamps: list,
+                                   check_interval: int, cooldown: int, run_stats: RunStats,
                                    concurrency_condition, app_logger):
     """Manages automatic concurrency scaling based on system resources and failure rate."""
     if not auto_enabled:
@@ -31,11 +42,8 @@ async def auto_concurrency_manager(concurrency_limit_ref: dict, last_change_ref:
     while True:
         now = asyncio.get_event_loop().time()
         
-        # 1. Check Failure Rate (Error-Aware Scaling)
-        async with failure_lock:
-            while failure_timestamps and now - failure_timestamps[0] > 60:
-                failure_timestamps.pop(0)
-            recent_failure_count = len(failure_timestamps)
+        # 1. Check Failure Rate (Error-Aware Scaling) - failures in the last minute
+        recent_failure_count = run_stats.recent_failures()
         
         estimated_throughput = concurrency_limit_ref['value'] * 30 
         failure_rate = recent_failure_count / max(estimated_throughput, 1)
@@ -86,29 +94,26 @@ async def data_processor_worker(queue: Queue, worker_id: int,
         form_data = None
         try:
             form_data = await queue.get()
-            store_name = form_data.get('store', 'Unknown')
+            store_name = store_name_of(form_data)
             
             # Log submission internally (Critical for Dashboard & Chat)
-            # This appends to submitted_store_data_list strings which generates the report
+            # This appends the StoreMetrics (or legacy dict) to submitted_store_data, which generates the report
+            submit_start = time.monotonic()
             await log_submission_func(form_data)
+            metrics["stats"].record_latency('submission', time.monotonic() - submit_start, store=store_name)
             
             # Update Progress
             with progress_lock:
                 progress["current"] += 1
                 progress["lastUpdate"] = datetime.now(local_timezone).strftime("%H:%M:%S")
             
-            # Update Metrics
-            async with metrics_lock:
-                # We don't have a submission time anymore, so just mark it as processed
-                metrics["submission_times"].append((store_name, 0.0))
-                
             # Log success
             # app_logger.info(f"{log_prefix} Processed {store_name}") # Optional: reduce noise by commenting out
             
         except asyncio.CancelledError:
             break
         except Exception as e:
-            failed_store = form_data.get('store', 'Unknown') if form_data else "Unknown"
+            failed_store = store_name_of(form_data) if form_data else "Unknown"
             app_logger.error(f"{log_prefix} Unhandled exception for {failed_store}: {e}", exc_info=debug_mode)
             run_failures.append(f"{failed_store} (Processing Exception)")
         finally:
@@ -122,7 +127,6 @@ async def process_single_store(context: BrowserContext, store_info: Dict[str,str
                                worker_retry_count: int, resource_blocklist: list,
                                apply_date_range_func, wait_timeout: int, action_timeout: int,
                                metrics_lock, metrics: dict, run_failures: list,
-                               failure_lock, failure_timestamps: list,
                                debug_mode: bool, app_logger):
     """Process a single store: navigate, scrape metrics, queue for form submission."""
     start_ts = asyncio.get_event_loop().time()
@@ -209,8 +213,8 @@ async def process_single_store(context: BrowserContext, store_info: Dict[str,str
             await queue.put(form_data)
             
             duration = asyncio.get_event_loop().time() - start_ts
+            metrics["stats"].record_latency('collection', duration, store=store_name)
             async with metrics_lock:
-                metrics["collection_times"].append((store_name, duration))
                 metrics["total_orders"] += int(api_data.get('OrdersShopped_V2', 0))
                 metrics["total_units"] += int(api_data.get('RequestedQuantity_V2', 0))
             
@@ -224,14 +228,12 @@ async def process_single_store(context: BrowserContext, store_info: Dict[str,str
                     metrics["retries"] += 1
                     metrics["retry_stores"].add(store_name)
                 # Longer delays to give Amazon APIs time to recover
-                sleep_times = [10, 30, 60]  # 10s, 30s, 60s instead of 2s, 4s, 8s
-                sleep_time = sleep_times[attempt] if attempt < len(sleep_times) else 60
+                sleep_time = STORE_RETRY_DELAYS[min(attempt, len(STORE_RETRY_DELAYS) - 1)]
                 app_logger.info(f"[{store_name}] Retrying in {sleep_time}s (giving APIs recovery time)...")
                 await asyncio.sleep(sleep_time)
             else:
                 run_failures.append(f"{store_name} (Fail)")
-                async with failure_lock:
-                    failure_timestamps.append(asyncio.get_event_loop().time())
+                metrics["stats"].record_failure(store_name)
         finally:
             if page: await page.close()
 
@@ -239,16 +241,22 @@ async def process_single_store(context: BrowserContext, store_info: Dict[str,str
 async def worker_task(worker_id: int, browser: Browser, storage_template: Dict, job_queue: Queue, 
                      submission_queue: Queue, page_timeout: int, action_timeout: int,
                      process_store_func, active_workers_ref: dict, concurrency_limit_ref: dict,
-                     concurrency_condition, app_logger):
-    """Main worker task that processes stores from the job queue."""
+                     concurrency_condition, app_logger, context_pool: BrowserContextPool = None,
+                     deadline: DeadlineBudget = None):
+    """Main worker task that processes stores from the job queue.
+
+    A browser context is leased from ``context_pool`` per store (a private
+    single-context pool is used if none is given). With a ``deadline`` the
+    worker stops taking stores once only the reporting reserve is left.
+    """
     app_logger.info(f"[Worker-{worker_id}] Starting up.")
-    context = None
+    owns_pool = context_pool is None
+    if owns_pool:
+        context_pool = BrowserContextPool(browser, storage_template, {'value': 1}, page_timeout, action_timeout)
     try:
-        context = await browser.new_context(storage_state=storage_template)
-        context.set_default_navigation_timeout(page_timeout)
-        context.set_default_timeout(action_timeout)
-        
         while True:
+            if deadline and deadline.expired():
+                break  # the rest of the queue is left for reporting time
             try:
                 store_item = job_queue.get_nowait()
             except asyncio.QueueEmpty:
@@ -261,29 +269,38 @@ async def worker_task(worker_id: int, browser: Browser, storage_template: Dict,
                 active_workers_ref['value'] += 1
 
             try:
-                await process_store_func(context, store_item, submission_queue)
+                async with context_pool.lease() as leased:
+                    await process_store_func(leased.context, store_item, submission_queue)
             finally:
                 async with concurrency_condition:
                     active_workers_ref['value'] -= 1
                     concurrency_condition.notify_all()
                 job_queue.task_done()
+                if deadline:
+                    deadline.store_done(job_queue.qsize())
             
     except Exception as e:
         app_logger.error(f"[Worker-{worker_id}] Crashed: {e}")
     finally:
-        if context: await context.close()
+        if owns_pool: await context_pool.close()
         app_logger.info(f"[Worker-{worker_id}] Shutting down.")
 
 
 async def api_worker_task(worker_id: int, browser, storage_template: Dict, job_queue: Queue,
                           submission_queue: Queue, page_timeout: int, action_timeout: int,
                           active_workers_ref: dict, concurrency_limit_ref: dict,
-                          concurrency_condition, get_date_range_func, app_logger):
+                          concurrency_condition, get_date_range_func, app_logger,
+                          http_client: SellerCentralClient = None, http_context_switch: bool = False,
+                          metrics_cache=None, intraday_accumulator=None, run_stats: RunStats = None,
+                          context_pool: BrowserContextPool = None, retry_attempts: int = 1,
+                          metrics_lock=None, metrics: dict = None, deadline: DeadlineBudget = None,
+                          max_wtd_backfill_days: int = MAX_WTD_BACKFILL_DAYS):
     """API-first worker task that uses direct API calls with browser context switching.
     
     This worker:
-    1. Creates a browser context for session management
-    2. For each store, navigates to set context then calls APIs directly
+    1. Switches store context over plain HTTP when enabled, otherwise (or when
+       the HTTP handshake fails) navigates a browser page to set context
+    2. Calls the metrics APIs directly with the resulting session cookies
     3. Gets all metrics including accurate Lates via API
     4. Is significantly faster than full browser scraping
     
@@ -300,18 +317,113 @@ async def api_worker_task(worker_id: int, browser, storage_template: Dict, job_q
         concurrency_condition: Asyncio Condition for concurrency control
         get_date_range_func: Function to get date range config
         app_logger: Logger instance
+        http_client: Run-scoped SellerCentralClient shared by all workers. If
+            omitted, the worker creates its own pooled client for its lifetime.
+        http_context_switch: Try the browser-free context switch first. The
+            browser context and page are then only created on fallback.
+        metrics_cache: Optional MetricsCache. Stores whose ranges are all
+            cached are served without entering their context.
+        intraday_accumulator: Optional IntradayAccumulator. Today-so-far
+            ranges then only fetch the hours since the previous run.
+        run_stats: Optional RunStats for collection latency and failures.
+        context_pool: Shared BrowserContextPool. A context is leased per store,
+            and only when the store needs the browser. If omitted, the worker
+            uses a private single-context pool.
+        retry_attempts: Attempts per store. A failed store is put back at the end
+            of ``job_queue`` with a back-off (``STORE_RETRY_DELAYS``) instead of
+            being retried in place, so other stores keep the worker busy meanwhile.
+        metrics_lock: Lock for ``metrics``
+        metrics: Run metrics; ``retries`` and ``retry_stores`` are updated on retry
+        deadline: Optional DeadlineBudget. WTD is skipped once it sheds ``SHED_WTD``,
+            and no new stores are taken once only the reporting reserve is left.
+        max_wtd_backfill_days: Most uncached closed days of the week fetched to
+            compose WTD from the cache; with more, WTD is fetched live.
     """
     log_prefix = f"[API-Worker-{worker_id}]"
     app_logger.info(f"{log_prefix} Starting up (API-first mode).")
-    context = None
-    page = None
+    leased = None
+    owns_client = http_client is None
+    if owns_client:
+        http_client = SellerCentralClient(limit=4)
+    owns_pool = context_pool is None
+    if owns_pool:
+        context_pool = BrowserContextPool(browser, storage_template, {'value': 1}, page_timeout, action_timeout)
     
-    try:
-        context = await browser.new_context(storage_state=storage_template)
-        context.set_default_navigation_timeout(page_timeout)
-        context.set_default_timeout(action_timeout)
-        page = await context.new_page()
+    # Session cookies for the HTTP context switch (updated after every handshake)
+    http_cookies = cookies_from_storage_state(storage_template) if http_context_switch else {}
+    http_failures_in_row = 0
+    MAX_HTTP_FAILURES_IN_ROW = 3
+    deferred, soonest = 0, float('inf')  # retries put back in a row because their back-off hadn't run out
+    
+    async def get_page():
+        """Lease a browser context for the current store (once) and return its page."""
+        nonlocal leased
+        if leased is None:
+            leased = await context_pool.acquire()
+        return await leased.get_page()
+    
+    def note_http_failure(store_name, reason):
+        nonlocal http_failures_in_row, http_context_switch
+        http_failures_in_row += 1
+        app_logger.warning(f"{log_prefix} [{store_name}] HTTP context switch failed "
+                           f"({reason}), falling back to browser navigation")
+        if http_failures_in_row >= MAX_HTTP_FAILURES_IN_ROW:
+            app_logger.warning(f"{log_prefix} HTTP context switch failed {http_failures_in_row} times in a row, "
+                               f"using the browser for the rest of this run")
+            http_context_switch = False
+    
+    async def enter_store(store_item):
+        """Enter the store's context once, preferring the HTTP handshake."""
+        nonlocal http_cookies
+        if http_context_switch:
+            store_ctx = await StoreContext.enter_http(http_client, http_cookies, store_item,
+                                                      cache=metrics_cache, accumulator=intraday_accumulator)
+            if store_ctx:
+                http_cookies = store_ctx.cookies
+                return store_ctx
+            note_http_failure(store_item.get('store_name'), 'handshake_failed')
+        return await StoreContext.enter_browser(await get_page(), http_client, store_item,
+                                                cache=metrics_cache, accumulator=intraday_accumulator)
+    
+    async def retry_later(store_item) -> bool:
+        """Re-queue a failed store behind the rest of the queue; False once out of attempts."""
+        attempt = store_item.get('attempt', 1)
+        if attempt >= retry_attempts:
+            return False
+        delay = STORE_RETRY_DELAYS[min(attempt - 1, len(STORE_RETRY_DELAYS) - 1)]
+        job_queue.put_nowait(dict(store_item, attempt=attempt + 1, retry_at=time.monotonic() + delay))
+        if metrics is not None:
+            async with metrics_lock:
+                metrics["retries"] += 1
+                metrics["retry_stores"].add(store_item.get('store_name', 'Unknown'))
+        app_logger.info(f"{log_prefix} [{store_item.get('store_name')}] Re-queued for attempt "
+                        f"{attempt + 1}/{retry_attempts} in {delay}s")
+        return True
+    
+    async def fetch_store_ranges(store_item, ranges):
+        """Enter the store once and fetch every range from that single visit.
         
+        Returns (results, store_ctx); store_ctx is None when every range was
+        served from the cache, otherwise the entered context, for follow-up fetches.
+        """
+        nonlocal http_failures_in_row
+        cached = cached_range_results(metrics_cache, store_item, ranges)
+        if cached is not None:
+            app_logger.debug("%s [%s] All ranges served from cache", log_prefix, store_item.get('store_name'))
+            return cached, None
+        store_ctx = await enter_store(store_item)
+        results = await store_ctx.fetch_ranges(ranges)
+        if store_ctx.via == 'http':
+            if any(not ok and data.get('error') == 'context_mismatch' for ok, data in results.values()):
+                note_http_failure(store_item.get('store_name'), 'context_mismatch')
+                store_ctx = await StoreContext.enter_browser(await get_page(), http_client, store_item,
+                                                             cache=metrics_cache, accumulator=intraday_accumulator)
+                results = await store_ctx.fetch_ranges(ranges)
+            else:
+                http_failures_in_row = 0
+        return results, store_ctx
+    
+    try:
         # Get date range configuration
         date_range = get_date_range_func()
         start_date = None
@@ -375,7 +487,13 @@ async def api_worker_task(worker_id: int, browser, storage_template: Dict, job_q
                 wtd_end = end_date  # End of yesterday
                 app_logger.info(f"{log_prefix} fetching WTD from {wtd_start.strftime('%Y-%m-%d')} to {wtd_end.strftime('%Y-%m-%d')}")
         
+        # With the metrics cache, WTD is composed from the week's closed days plus the
+        # report day instead of refetching Monday-to-date for every store on every run
+        wtd_closed_days = day_slices(wtd_start, start_date) if (fetch_wtd and wtd_start and metrics_cache) else None
+        
         while True:
+            if deadline and deadline.expired():
+                break  # the rest of the queue is left for reporting time
             try:
                 store_item = job_queue.get_nowait()
             except asyncio.QueueEmpty:
@@ -383,57 +501,97 @@ async def api_worker_task(worker_id: int, browser, storage_template: Dict, job_q
             
             store_name = store_item.get('store_name', 'Unknown')
             
+            # A re-queued store still in its back-off goes back behind the others, so ready
+            # stores keep the worker busy. Only once everything queued is waiting does the
+            # worker sleep, until the first back-off ends and never into the reporting reserve.
+            backoff = store_item.get('retry_at', 0) - time.monotonic()
+            if backoff > 0:
+                job_queue.put_nowait(store_item)
+                job_queue.task_done()
+                deferred, soonest = deferred + 1, min(soonest, backoff)
+                if deferred >= job_queue.qsize():
+                    await asyncio.sleep(min(soonest, deadline.remaining()) if deadline else soonest)
+                    deferred, soonest = 0, float('inf')
+                continue  # the deadline is checked again before the next store
+            deferred, soonest = 0, float('inf')
+            
             # Enforce Concurrency Limit
             async with concurrency_condition:
                 while active_workers_ref['value'] >= concurrency_limit_ref['value']:
                     await concurrency_condition.wait()
                 active_workers_ref['value'] += 1
 
+            store_start = time.monotonic()
             try:
-                # Use API-first approach with browser context switching
-                # Fetch primary date range (Yesterday/Custom)
-                success, form_data = await fetch_store_metrics_with_lates_browser(
-                    page, store_item, start_date, end_date
-                )
+                # Use API-first approach with HTTP (or browser) context switching.
+                # One store visit serves the primary range (Today/Yesterday/Custom) and WTD.
+                ranges = {'primary': (start_date, end_date)}
+                compose_wtd = False
+                if fetch_wtd and wtd_start and not (deadline and deadline.is_shed(SHED_WTD)):
+                    missing_days = (missing_day_slices(metrics_cache, store_item, wtd_closed_days)
+                                    if wtd_closed_days is not None else None)
+                    if missing_days is not None and len(missing_days) <= max_wtd_backfill_days:
+                        # Fetch the missing day(s) alongside the primary range; they are closed
+                        # ranges, so they stay cached for the rest of the week
+                        compose_wtd = True
+                        for day_start, day_end in missing_days:
+                            ranges[f"day_{day_start.strftime('%Y-%m-%d')}"] = (day_start, day_end)
+                    else:
+                        ranges['wtd'] = (wtd_start, wtd_end)
+                results, store_ctx = await fetch_store_ranges(store_item, ranges)
+                success, form_data = results['primary']
                 
-                # Fetch WTD if reliable and separate
-                if success and fetch_wtd and wtd_start:
-                    # Reuse connection/context - no need to navigate again as context is set!
-                    # We need a way to call API without navigation. 
-                    # fetch_store_metrics_with_lates_browser does nav first.
-                    # Ideally we refactor api_scraper to separate nav from fetch.
-                    # For now, we'll just call it again - it's fast enough.
-                    success_wtd, wtd_data = await fetch_store_metrics_with_lates_browser(
-                        page, store_item, wtd_start, wtd_end
-                    )
-                    
+                if success and compose_wtd:
+                    composed = compose_range_from_cache(metrics_cache, store_item,
+                                                        wtd_closed_days + [(start_date, end_date)])
+                    if composed is None:
+                        app_logger.info(f"{log_prefix} [{store_name}] WTD day slice missing, fetching WTD live")
+                        wtd_range = {'wtd': (wtd_start, wtd_end)}
+                        if store_ctx is not None:
+                            # Still in the store's context from the visit above - don't enter it again
+                            results.update(await store_ctx.fetch_ranges(wtd_range))
+                        else:
+                            results.update((await fetch_store_ranges(store_item, wtd_range))[0])
+                    else:
+                        results['wtd'] = composed
+                
+                if success and 'wtd' in results:
+                    success_wtd, wtd_metrics = results['wtd']
                     if success_wtd:
-                        # Merge WTD data into form_data with _WTD suffix
-                        for k, v in wtd_data.items():
-                            if k not in ['store', 'date_range']: # Skip meta that duplicates
-                                form_data[f"{k}_WTD"] = v
-                        form_data['has_wtd'] = True
+                        form_data.wtd = wtd_metrics
                 
                 if success:
-                    # Submit to form queue
+                    # Submit the raw StoreMetrics; formatting happens at render time
                     await submission_queue.put(form_data)
-                    app_logger.info(f"{log_prefix} [{store_name}] API fetch complete: Orders={form_data['orders']}, Lates={form_data['lates']}")
+                    if run_stats:
+                        run_stats.record_latency('collection', time.monotonic() - store_start, store=store_name)
+                    app_logger.info(f"{log_prefix} [{store_name}] API fetch complete: Orders={form_data.orders}, Lates={form_data.display('lates')}")
                 else:
                     error = form_data.get('error', 'Unknown error')
                     app_logger.warning(f"{log_prefix} [{store_name}] API fetch failed: {error}")
+                    if not await retry_later(store_item) and run_stats:
+                        run_stats.record_failure(store_name)
                     
             except Exception as e:
                 app_logger.error(f"{log_prefix} [{store_name}] Error: {e}")
+                if not await retry_later(store_item) and run_stats:
+                    run_stats.record_failure(store_name)
             finally:
+                if leased is not None:
+                    await context_pool.release(leased)
+                    leased = None
                 async with concurrency_condition:
                     active_workers_ref['value'] -= 1
                     concurrency_condition.notify_all()
                 job_queue.task_done()
+                if deadline:
+                    deadline.store_done(job_queue.qsize())
             
     except Exception as e:
         app_logger.error(f"{log_prefix} Crashed: {e}")
     finally:
-        if page: await page.close()
-        if context: await context.close()
+        if leased is not None: await context_pool.release(leased, discard=True)
+        if owns_pool: await context_pool.close()
+        if owns_client: await http_client.close()
         app_logger.info(f"{log_prefix} Shutting down.")
 